@@ -2,7 +2,7 @@ import asyncio
 import os
 import sys
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from loguru import logger
 
@@ -10,14 +10,17 @@ from WebUI.utils.singleton import Singleton
 # 引入键值数据库
 from database.keyvalDB import KeyvalDB
 from utils.plugin_manager import PluginManager
+from utils.stats_counter import StatsCounter
 
 # 确保可以导入根目录模块
 ROOT_DIR = Path(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 sys.path.insert(0, str(ROOT_DIR))
 
 # 键值数据库键名常量
-KEY_MESSAGE_COUNT = "bot:stats:message_count"
-KEY_USER_COUNT = "bot:stats:user_count"
+
+# 统计计数器名称，保存在键值数据库的 bot:stats:<名称> 中
+STAT_MESSAGE_COUNT = "message_count"
+STAT_USER_COUNT = "user_count"
 KEY_LOG_POSITION = "bot:logs:last_position"
 
 
@@ -57,6 +60,9 @@ class BotBridge(metaclass=Singleton):
         # 存储正在运行的任务
         self._tasks = []
 
+        # 运行统计，名称 -> 返回统计字典的函数
+        self._metrics: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
         # 初始化插件管理器
         self.plugin_manager = PluginManager()
 
@@ -65,6 +71,7 @@ class BotBridge(metaclass=Singleton):
 
         # 初始化数据库
         self._db = KeyvalDB()
+        self._stats = StatsCounter()
 
         # 异步初始化数据库
         loop = get_or_create_eventloop()
@@ -75,10 +82,8 @@ class BotBridge(metaclass=Singleton):
         获取接收消息数量
         """
         try:
-            result = await self._db.get(KEY_MESSAGE_COUNT)
-            count = int(result) if result is not None else 0
-
-            return count
+            # 计数器在内存中，只有第一次读取时访问数据库
+            return await self._stats.get(STAT_MESSAGE_COUNT)
         except Exception as e:
             logger.log('WEBUI', f"获取消息计数失败: {str(e)}")
             return 0
@@ -88,10 +93,7 @@ class BotBridge(metaclass=Singleton):
         增加消息计数
         """
         try:
-            current = await self.get_message_count()
-            new_count = current + amount
-            await self._db.set(KEY_MESSAGE_COUNT, str(new_count))
-
+            self._stats.incr(STAT_MESSAGE_COUNT, amount)
             return True
         except Exception as e:
             logger.log('WEBUI', f"增加消息计数失败: {str(e)}")
@@ -102,10 +104,7 @@ class BotBridge(metaclass=Singleton):
         获取用户数量
         """
         try:
-            result = await self._db.get(KEY_USER_COUNT)
-            count = int(result) if result is not None else 0
-
-            return count
+            return await self._stats.get(STAT_USER_COUNT)
         except Exception as e:
             logger.log('WEBUI', f"获取用户计数失败: {str(e)}")
             return 0
@@ -115,15 +114,22 @@ class BotBridge(metaclass=Singleton):
         增加用户计数
         """
         try:
-            current = await self.get_user_count()
-            new_count = current + amount
-            await self._db.set(KEY_USER_COUNT, str(new_count))
-
+            self._stats.incr(STAT_USER_COUNT, amount)
             return True
         except Exception as e:
             logger.log('WEBUI', f"增加用户计数失败: {str(e)}")
             return False
 
+    def get_message_counts(self, kind: str = "type") -> Dict[str, int]:
+        """
+        获取分类消息计数，不访问数据库
+
+        参数:
+            kind: "type" 按消息类型统计，"chat" 按会话统计
+        """
+        prefix = f"{STAT_MESSAGE_COUNT}:{kind}:"
+        return {name[len(prefix):]: count for name, count in self._stats.get_loaded(prefix).items()}
+
     async def get_start_time(self):
         """
         获取机器人启动时间
@@ -180,6 +186,20 @@ class BotBridge(metaclass=Singleton):
                 "alias": ""
             }
 
+    def register_metrics(self, name: str, getter: Callable[[], Dict[str, Any]]):
+        """登记一组运行统计，WebUI获取机器人状态时一起返回"""
+        self._metrics[name] = getter
+
+    def get_runtime_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有登记的运行统计"""
+        metrics = {}
+        for name, getter in self._metrics.items():
+            try:
+                metrics[name] = getter()
+            except Exception as e:
+                logger.log('WEBUI', f"获取运行统计 {name} 出错: {str(e)}")
+        return metrics
+
     def _create_task(self, coro):
         loop = get_or_create_eventloop()
         task = loop.create_task(coro)
@@ -233,7 +253,8 @@ class BotBridge(metaclass=Singleton):
                     "author": plugin["author"],
                     "version": plugin["version"],
                     "enabled": plugin["enabled"],
-                    "directory": rel_path
+                    "directory": rel_path,
+                    "handlers": self.plugin_manager.get_handler_stats(plugin["name"])
                 }
                 formatted_plugins.append(formatted_plugin)
 
@@ -263,12 +284,21 @@ class BotBridge(metaclass=Singleton):
                 "author": plugin_info["author"],
                 "version": plugin_info["version"],
                 "enabled": plugin_info["enabled"],
-                "directory": rel_path
+                "directory": rel_path,
+                "handlers": self.plugin_manager.get_handler_stats(plugin_name)
             }
         except Exception as e:
             logger.log('WEBUI', f"获取插件详情出错: {str(e)}")
             return None
 
+    def get_handler_stats(self, plugin_name: str = None) -> List[Dict[str, Any]]:
+        """获取事件处理函数的耗时统计"""
+        try:
+            return self.plugin_manager.get_handler_stats(plugin_name)
+        except Exception as e:
+            logger.log('WEBUI', f"获取处理函数统计出错: {str(e)}")
+            return []
+
     async def enable_plugin(self, plugin_name: str) -> bool:
         """启用插件"""
         if not self.is_running:
@@ -68,6 +68,34 @@ def get_plugin_detail(plugin_name: str):
     })
 
 
+@plugin_bp.route('/api/stats', methods=['GET'])
+@login_required
+def get_handler_stats():
+    """
+    获取事件处理函数的耗时统计
+
+    参数:
+        plugin (str, 可选): 插件名称，不传时返回所有处理函数
+
+    返回:
+        JSON: 处理函数统计列表
+    """
+    try:
+        stats = plugin_service.get_handler_stats(request.args.get('plugin'))
+        return jsonify({
+            "code": 0,
+            "msg": "成功",
+            "data": stats
+        })
+    except Exception as e:
+        logger.log("WEBUI", f"获取处理函数统计失败: {str(e)}")
+        return jsonify({
+            "code": 500,
+            "msg": f"获取处理函数统计失败: {str(e)}",
+            "data": []
+        })
+
+
 @plugin_bp.route('/api/enable/<plugin_name>', methods=['POST'])
 @login_required
 def enable_plugin(plugin_name: str):
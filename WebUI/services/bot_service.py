@@ -196,6 +196,7 @@ class BotService(metaclass=Singleton):
             'running': running,
             'pid': os.getpid(),
             'start_time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self._start_time)) if running else 0,
+            'metrics': bot_bridge.get_runtime_metrics() if running else {},
         }
 
         return status
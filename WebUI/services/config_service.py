@@ -45,11 +45,77 @@ class ConfigService(metaclass=Singleton):
                 "XYBotDB-url": "sqlite:///database/xybot.db",
                 "msgDB-url": "sqlite+aiosqlite:///database/message.db",
                 "keyvalDB-url": "sqlite+aiosqlite:///database/keyval.db",
+                "XYBotDB-readers": 4,
+                "XYBotDB-cache": True,
+                "XYBotDB-cache-size": 10000,
+                "keyvalDB-cache-size": 10000,
+                "keyvalDB-cleanup-interval": 60,
+                "keyvalDB-cleanup-batch": 500,
+                "msgDB-batch-size": 200,
+                "msgDB-flush-interval": 500,
+                "msgDB-buffer-limit": 10000,
+                "msgDB-overflow": "block",
+                "msgDB-fts": True,
+                "stats-flush-interval": 10,
                 "admins": ["admin-wxid"],
                 "disabled-plugins": ["ExamplePlugin"],
                 "timezone": "Asia/Shanghai",
                 "ignore-mode": "None"
             },
+            "Dispatcher": {
+                "workers": 8,
+                "queue-high-water": 1000,
+                "queue-low-water": 500,
+                "shutdown-timeout": 10,
+                "poll-min-interval": 0.1,
+                "poll-max-interval": 2.0,
+                "poll-backoff": 2.0,
+                "handler-timeout": 0,
+                "latency-budget": 0,
+                "budget-action": "disable",
+                "disable-seconds": 300,
+                "budget-min-samples": 20,
+                "budget-window": 100
+            },
+            "Sender": {
+                "global-rate": 3,
+                "global-burst": 5,
+                "recipient-rate": 1,
+                "recipient-burst": 1
+            },
+            "SQLite": {
+                "enable": True,
+                "journal-mode": "WAL",
+                "synchronous": "NORMAL",
+                "mmap-size": 268435456,
+                "cache-size": -65536,
+                "temp-store": "MEMORY",
+                "busy-timeout": 5000,
+                "checkpoint-interval": 300
+            },
+            "MessageRetention": {
+                "enable": True,
+                "default-days": 3,
+                "chat-rules": [],
+                "type-rules": [],
+                "interval": 60,
+                "batch-size": 2000,
+                "max-batches": 50,
+                "incremental-vacuum": False,
+                "vacuum-pages": 1000
+            },
+            "MediaCache": {
+                "enable": True,
+                "path": "resource/media_cache",
+                "max-size-mb": 1024
+            },
+            "Download": {
+                "segmented": True,
+                "segment-size-kb": 1024,
+                "concurrency": 4,
+                "retries": 3,
+                "min-size-mb": 4
+            },
             "WebUI": {
                 "admin-username": "admin",
                 "admin-password": "admin123",
@@ -60,7 +126,12 @@ class ConfigService(metaclass=Singleton):
         # 字段选项（用于表单下拉选择）
         self.field_options = {
             "WechatAPIServer.mode": ["release", "debug"],
-            "XYBot.ignore-mode": ["None", "Whitelist", "Blacklist"]
+            "XYBot.ignore-mode": ["None", "Whitelist", "Blacklist"],
+            "XYBot.msgDB-overflow": ["block", "drop"],
+            "Dispatcher.budget-action": ["disable", "demote"],
+            "SQLite.journal-mode": ["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"],
+            "SQLite.synchronous": ["NORMAL", "FULL", "EXTRA", "OFF"],
+            "SQLite.temp-store": ["MEMORY", "DEFAULT", "FILE"]
         }
 
         # 字段验证规则
@@ -50,6 +50,10 @@ class PluginService(metaclass=Singleton):
         """获取指定插件的详细信息"""
         return bot_bridge.get_plugin_details(plugin_name)
 
+    def get_handler_stats(self, plugin_name: str = None) -> List[Dict[str, Any]]:
+        """获取事件处理函数的耗时统计"""
+        return bot_bridge.get_handler_stats(plugin_name)
+
     async def enable_plugin(self, plugin_name: str) -> bool:
         """启用插件"""
         return await bot_bridge.enable_plugin(plugin_name)
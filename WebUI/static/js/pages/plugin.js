@@ -126,6 +126,7 @@ function renderPluginList(plugins) {
                         </div>
                         
                         <p class="plugin-description mb-0">${plugin.description || '无描述信息'}</p>
+                        ${renderHandlerStats(plugin.handlers)}
                     </div>
 
                     <div class="d-flex align-items-center gap-3 me-3">
@@ -159,6 +160,33 @@ function renderPluginList(plugins) {
     });
 }
 
+// 渲染插件事件处理函数的耗时统计
+function renderHandlerStats(handlers) {
+    if (!handlers || handlers.length === 0) {
+        return '';
+    }
+
+    const rows = handlers.map(handler => {
+        const method = handler.name.split('.').pop();
+        let badge = '';
+        if (handler.disabled) {
+            badge = `<span class="badge bg-red-100 text-red-800 ms-1">已暂停 ${handler.disabled_remaining}s</span>`;
+        } else if (handler.demoted) {
+            badge = '<span class="badge bg-yellow-100 text-yellow-800 ms-1">已降级</span>';
+        }
+        return `
+            <div class="small text-gray-500">
+                <i class="fas fa-tachometer-alt mr-1"></i>${method}${badge}
+                <span class="mx-1 text-gray-300">|</span>调用 ${handler.calls}
+                <span class="mx-1 text-gray-300">|</span>错误 ${handler.errors}
+                <span class="mx-1 text-gray-300">|</span>超时 ${handler.timeouts}
+                <span class="mx-1 text-gray-300">|</span>p50 ${handler.p50_ms}ms / p95 ${handler.p95_ms}ms / p99 ${handler.p99_ms}ms
+            </div>`;
+    }).join('');
+
+    return `<div class="plugin-handler-stats mt-2">${rows}</div>`;
+}
+
 // 处理插件操作按钮点击
 function handlePluginActionClick() {
     const pluginId = $(this).data('id');
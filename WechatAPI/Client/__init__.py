@@ -4,9 +4,13 @@ from .chatroom import ChatroomMixin
 from .friend import FriendMixin
 from .hongbao import HongBaoMixin
 from .login import LoginMixin
+from .media_store import MediaStore, media_keys
+from .media_stream import MediaFile
+from .segmented_download import SegmentError, SegmentedDownloader
 from .message import MessageMixin
 from .protect import protector
 from .protect import protector
+from .send_scheduler import send_priority, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
 from .tool import ToolMixin
 from .user import UserMixin
 
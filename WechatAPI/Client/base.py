@@ -1,7 +1,25 @@
+import asyncio
 from dataclasses import dataclass
 
+import aiohttp
+
 from WechatAPI.errors import *
 
+# 默认的请求超时，连接本地的WechatAPI服务应当很快
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=60, sock_connect=5)
+
+# 按接口设置的超时，上传下载媒体文件的接口需要更长时间
+ENDPOINT_TIMEOUTS = {
+    "Sync": aiohttp.ClientTimeout(total=10, sock_connect=5),
+    "IsRunning": aiohttp.ClientTimeout(total=5, sock_connect=5),
+    "CheckDatabaseOK": aiohttp.ClientTimeout(total=5, sock_connect=5),
+    **{endpoint: aiohttp.ClientTimeout(total=300, sock_connect=5) for endpoint in (
+        "SendImageMsg", "SendVideoMsg", "SendVoiceMsg", "SendEmojiMsg",
+        "SendCDNFileMsg", "SendCDNImgMsg", "SendCDNVideoMsg",
+        "CdnDownloadImg", "DownloadVoice", "DownloadAttach", "DownloadVideo",
+    )},
+}
+
 
 @dataclass
 class Proxy:
@@ -31,12 +49,44 @@ class Section:
     start_pos: int
 
 
+class SharedSession:
+    """共享 aiohttp 会话的包装
+
+    可以像 aiohttp.ClientSession 一样用 async with 获取，但退出时不会关闭连接，连接留在连接池中给下一个请求复用。
+    请求没有指定 timeout 时按接口名使用 ENDPOINT_TIMEOUTS 中的超时。
+    """
+
+    __slots__ = ("session",)
+
+    def __init__(self, session: aiohttp.ClientSession):
+        self.session = session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    @staticmethod
+    def _timeout_for(url: str) -> aiohttp.ClientTimeout:
+        return ENDPOINT_TIMEOUTS.get(url.rsplit("/", 1)[-1], DEFAULT_TIMEOUT)
+
+    def get(self, url: str, **kwargs):
+        kwargs.setdefault("timeout", self._timeout_for(url))
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        kwargs.setdefault("timeout", self._timeout_for(url))
+        return self.session.post(url, **kwargs)
+
+
 class WechatAPIClientBase:
     """微信API客户端基类
 
     Args:
         ip (str): 服务器IP地址
         port (int): 服务器端口
+        connection_limit (int): 连接池的最大连接数
 
     Attributes:
         wxid (str): 微信ID
@@ -45,10 +95,14 @@ class WechatAPIClientBase:
         phone (str): 手机号
         ignore_protect (bool): 是否忽略保护机制
     """
-    def __init__(self, ip: str, port: int):
+    def __init__(self, ip: str, port: int, connection_limit: int = 100):
         self.ip = ip
         self.port = port
 
+        self.connection_limit = connection_limit
+        self._session: aiohttp.ClientSession = None
+        self._session_loop: asyncio.AbstractEventLoop = None
+
         self.wxid = ""
         self.nickname = ""
         self.alias = ""
@@ -59,6 +113,39 @@ class WechatAPIClientBase:
         # 调用所有 Mixin 的初始化方法
         super().__init__()
 
+    def _http_session(self) -> SharedSession:
+        """获取共享的HTTP会话，第一次使用时创建，所有请求复用同一个连接池"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            # 机器人重启后会在新的事件循环中运行，旧会话不能再用
+            self._discard_session()
+            connector = aiohttp.TCPConnector(limit=self.connection_limit, keepalive_timeout=60,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=DEFAULT_TIMEOUT)
+            self._session_loop = loop
+        return SharedSession(self._session)
+
+    def _discard_session(self):
+        """关闭属于其他事件循环的旧会话，不然每次重启都会留下一个没关闭的连接池"""
+        session, loop = self._session, self._session_loop
+        self._session = None
+        self._session_loop = None
+        if session is None or session.closed:
+            return
+        if loop is not None and loop.is_running():
+            # 旧事件循环还在运行，在它自己的线程中关闭
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        else:
+            # 旧事件循环已经结束，不能再 await，直接关闭连接
+            session.connector._close()
+
+    async def close(self):
+        """关闭共享的HTTP会话，机器人退出时调用"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
     @staticmethod
     def error_handler(json_resp):
         """处理API响应中的错误码
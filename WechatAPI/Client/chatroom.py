@@ -1,6 +1,5 @@
 from typing import Union, Any
 
-import aiohttp
 
 from .base import *
 from .protect import protector
@@ -23,7 +22,7 @@ class ChatroomMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "Chatroom": chatroom, "InviteWxids": wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/AddChatroomMember', json=json_param)
             json_resp = await response.json()
@@ -45,7 +44,7 @@ class ChatroomMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "Chatroom": chatroom}
             response = await session.post(f'http://{self.ip}:{self.port}/GetChatroomInfo', json=json_param)
             json_resp = await response.json()
@@ -71,7 +70,7 @@ class ChatroomMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "Chatroom": chatroom}
             response = await session.post(f'http://{self.ip}:{self.port}/GetChatroomInfoNoAnnounce', json=json_param)
             json_resp = await response.json()
@@ -93,7 +92,7 @@ class ChatroomMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "Chatroom": chatroom}
             response = await session.post(f'http://{self.ip}:{self.port}/GetChatroomMemberDetail', json=json_param)
             json_resp = await response.json()
@@ -117,7 +116,7 @@ class ChatroomMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(86400):
             raise BanProtection("获取二维码需要在登录后24小时才可使用")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "Chatroom": chatroom}
             response = await session.post(f'http://{self.ip}:{self.port}/GetChatroomQRCode', json=json_param)
             json_resp = await response.json()
@@ -146,7 +145,7 @@ class ChatroomMixin(WechatAPIClientBase):
         if isinstance(wxid, list):
             wxid = ",".join(wxid)
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "Chatroom": chatroom, "InviteWxids": wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/InviteChatroomMember', json=json_param)
             json_resp = await response.json()
@@ -1,5 +1,3 @@
-import aiohttp
-
 from .base import *
 from ..errors import *
 
@@ -19,7 +17,7 @@ class HongBaoMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "Xml": xml, "EncryptKey": encrypt_key, "EncryptUserinfo": encrypt_userinfo}
             response = await session.post(f'http://{self.ip}:{self.port}/GetHongBaoDetail', json=json_param)
             json_resp = await response.json()
@@ -20,7 +20,7 @@ class LoginMixin(WechatAPIClientBase):
             bool: 如果WechatAPI正在运行返回True，否则返回False。
         """
         try:
-            async with aiohttp.ClientSession() as session:
+            async with self._http_session() as session:
                 response = await session.get(f'http://{self.ip}:{self.port}/IsRunning')
                 return await response.text() == 'OK'
         except aiohttp.client_exceptions.ClientConnectorError:
@@ -41,7 +41,7 @@ class LoginMixin(WechatAPIClientBase):
         Raises:
             根据error_handler处理错误
         """
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {'DeviceName': device_name, 'DeviceID': device_id}
             if proxy:
                 json_param['ProxyInfo'] = {'ProxyIp': f'{proxy.ip}:{proxy.port}',
@@ -80,7 +80,7 @@ class LoginMixin(WechatAPIClientBase):
         Raises:
             根据error_handler处理错误
         """
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Uuid": uuid}
             response = await session.post(f'http://{self.ip}:{self.port}/CheckUuid', json=json_param)
             json_resp = await response.json()
@@ -109,7 +109,7 @@ class LoginMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/Logout', json=json_param)
             json_resp = await response.json()
@@ -141,7 +141,7 @@ class LoginMixin(WechatAPIClientBase):
         if not wxid and self.wxid:
             wxid = self.wxid
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/AwakenLogin', json=json_param)
             json_resp = await response.json()
@@ -168,7 +168,7 @@ class LoginMixin(WechatAPIClientBase):
         if not wxid:
             return {}
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/GetCachedInfo', json=json_param)
             json_resp = await response.json()
@@ -191,7 +191,7 @@ class LoginMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/Heartbeat', json=json_param)
             json_resp = await response.json()
@@ -214,7 +214,7 @@ class LoginMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/AutoHeartbeatStart', json=json_param)
             json_resp = await response.json()
@@ -237,7 +237,7 @@ class LoginMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/AutoHeartbeatStop', json=json_param)
             json_resp = await response.json()
@@ -260,7 +260,7 @@ class LoginMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/AutoHeartbeatStatus', json=json_param)
             json_resp = await response.json()
@@ -0,0 +1,396 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import mmap
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from loguru import logger
+
+from .media_stream import MediaFile
+
+_KEY_LOG = "keys.log"
+_OBJECTS = "objects"
+
+
+class MediaStore:
+    """按内容寻址的媒体文件缓存
+
+    下载的图片、视频和附件按内容的 sha256 保存在磁盘上，同一个文件只存一份。
+    aeskey、CDN 地址、附件ID、md5 等标识作为键指向文件，转发的消息带着相同的标识，再次出现时直接从磁盘读取，不再下载。
+
+    文件总大小超过 max_size 时按最近最少使用的顺序删除。命中时通过 mmap 读取文件。
+    键和文件的对应关系追加写入 keys.log，重启后按文件的修改时间恢复使用顺序。
+
+    所有方法都在事件循环中调用，读写文件在线程池中执行。被淘汰的文件可能正在被读取，
+    通过 path 拿到路径的调用方要自己处理文件已经不存在的情况。
+
+    Args:
+        directory (str): 缓存目录
+        max_size (int): 缓存文件的总大小上限（字节）
+        enabled (bool): 是否启用，未启用时所有读取都不命中，fetch 直接下载
+    """
+
+    def __init__(self, directory: str = "resource/media_cache", max_size: int = 1 << 30, enabled: bool = False):
+        self.directory = directory
+        self.max_size = max_size
+        self.enabled = False
+
+        self._files: OrderedDict[str, int] = OrderedDict()  # sha256 -> 文件大小，按使用顺序排列
+        self._keys: Dict[str, str] = {}  # 键 -> sha256
+        self._digest_keys: Dict[str, Set[str]] = {}  # sha256 -> 指向它的键
+        self._total = 0
+        self._log = None
+        self._log_lines = 0
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.bytes_saved = 0
+        self.stored = 0
+        self.evictions = 0
+
+        if enabled:
+            self.configure(directory, max_size, enabled)
+
+    def configure(self, directory: str, max_size: int, enabled: bool = True):
+        """设置缓存目录和大小上限，并读取目录中已有的缓存"""
+        self.close()
+        self.directory = directory
+        self.max_size = max(max_size, 0)
+        self.enabled = enabled
+        self._files.clear()
+        self._keys.clear()
+        self._digest_keys.clear()
+        self._total = 0
+        if enabled:
+            os.makedirs(os.path.join(directory, _OBJECTS), exist_ok=True)
+            self._load()
+            self._evict()
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    # 读取
+
+    def lookup(self, keys: Iterable[Optional[str]]) -> Optional[str]:
+        """返回第一个已缓存的键对应的 sha256，不计入统计"""
+        if not self.enabled:
+            return None
+        for key in keys:
+            digest = self._keys.get(_clean_key(key)) if key else None
+            if digest is not None:
+                return digest
+        return None
+
+    def path(self, keys: Iterable[Optional[str]]) -> Optional[str]:
+        """已缓存文件的路径，没有缓存时返回 None"""
+        digest = self.lookup(keys)
+        return self._object_path(digest) if digest is not None else None
+
+    async def read(self, keys: Iterable[Optional[str]]) -> Optional[bytes]:
+        """读取已缓存的文件内容，没有缓存时返回 None"""
+        return await self._read(keys, encode=False)
+
+    async def read_base64(self, keys: Iterable[Optional[str]]) -> Optional[str]:
+        """读取已缓存的文件内容并转换为 base64 字符串，没有缓存时返回 None"""
+        return await self._read(keys, encode=True)
+
+    async def open(self, keys: Iterable[Optional[str]]) -> Optional[MediaFile]:
+        """打开已缓存的文件，返回 MediaFile，没有缓存时返回 None。打开后文件被淘汰也可以继续读取"""
+        return await self._read(keys, encode=None)
+
+    async def _read(self, keys: Iterable[Optional[str]], encode: Optional[bool]):
+        digest = self.lookup(keys)
+        if digest is None:
+            if self.enabled:
+                self.misses += 1
+            return None
+
+        try:
+            path = self._object_path(digest)
+            if encode is None:
+                data = MediaFile.open(path)
+            else:
+                data = await asyncio.to_thread(self._read_file, path, encode)
+        except FileNotFoundError:
+            # 文件被手动删除了
+            self._forget(digest)
+            self.misses += 1
+            return None
+
+        self._touch(digest)
+        self.hits += 1
+        self.bytes_saved += self._files.get(digest, 0)
+        return data
+
+    @staticmethod
+    def _read_file(path: str, encode: bool):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return "" if encode else b""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                # 直接从映射的内存编码，不用先把整个文件读成 bytes
+                return base64.b64encode(mapped).decode() if encode else mapped[:]
+
+    # 写入
+
+    async def put(self, data: bytes, keys: Iterable[Optional[str]] = ()) -> Optional[str]:
+        """保存文件内容，让 keys 指向它，返回 sha256。未启用或内容超过大小上限时不保存，返回 None"""
+        if not self.enabled or len(data) > self.max_size:
+            return None
+        digest = await asyncio.to_thread(self._write_file, data)
+        self._register(digest, len(data), keys)
+        return digest
+
+    async def put_base64(self, data: str, keys: Iterable[Optional[str]] = ()) -> Optional[str]:
+        """保存 base64 编码的文件内容，返回 sha256"""
+        if not self.enabled or len(data) * 3 // 4 > self.max_size:
+            return None
+        try:
+            raw = await asyncio.to_thread(base64.b64decode, data)
+        except (binascii.Error, ValueError):
+            return None
+        return await self.put(raw, keys)
+
+    async def put_file(self, media: MediaFile, keys: Iterable[Optional[str]] = ()) -> Optional[str]:
+        """逐块复制 MediaFile 的内容保存，返回 sha256"""
+        if not self.enabled or media.size > self.max_size:
+            return None
+        digest = await asyncio.to_thread(self._write_chunks, media)
+        self._register(digest, media.size, keys)
+        return digest
+
+    async def fetch_base64(self, keys: Iterable[Optional[str]], download: Callable[[], Awaitable[str]]) -> str:
+        """读取缓存，没有时调用 download 下载 base64 编码的文件并保存
+
+        同一个文件同时只下载一次，后来的调用等待第一次下载的结果，某个调用被取消不会中断下载。
+        """
+        return await self._fetch("base64", keys, download, self.read_base64, self.put_base64)
+
+    async def fetch_file(self, keys: Iterable[Optional[str]], download: Callable[[], Awaitable[MediaFile]]) -> MediaFile:
+        """和 fetch_base64 一样，但是下载和返回的都是 MediaFile，命中时直接打开缓存文件"""
+        return await self._fetch("file", keys, download, self.open, self.put_file)
+
+    async def _fetch(self, mode: str, keys: Iterable[Optional[str]], download: Callable[[], Awaitable[Any]],
+                     read: Callable, put: Callable) -> Any:
+        keys = [_clean_key(key) for key in keys if key]
+        if not self.enabled or not keys:
+            return await download()
+
+        cached = await read(keys)
+        if cached is not None:
+            return cached
+
+        task = next((self._inflight[(mode, key)] for key in keys if (mode, key) in self._inflight), None)
+        if task is not None:
+            self.shared += 1
+        else:
+            task = asyncio.ensure_future(self._download(keys, download, put))
+            for key in keys:
+                self._inflight[(mode, key)] = task
+            task.add_done_callback(lambda done: self._download_done(mode, keys, done))
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def _download(keys: list, download: Callable[[], Awaitable[Any]], put: Callable) -> Any:
+        data = await download()
+        if data:
+            try:
+                await put(data, keys)
+            except OSError as error:
+                logger.warning("保存媒体缓存失败: {}", error)
+        return data
+
+    def _download_done(self, mode: str, keys: list, task: asyncio.Task):
+        for key in keys:
+            if self._inflight.get((mode, key)) is task:
+                del self._inflight[(mode, key)]
+
+    def _write_file(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 内容相同的两个文件可能同时在两个线程中写入，每次写入用不同的临时文件
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return digest
+
+    def _write_chunks(self, media: MediaFile) -> str:
+        sha256 = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.join(self.directory, _OBJECTS))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for data in media.chunks():
+                    sha256.update(data)
+                    f.write(data)
+            digest = sha256.hexdigest()
+            path = self._object_path(digest)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def _register(self, digest: str, size: int, keys: Iterable[Optional[str]]):
+        if digest not in self._files:
+            self._files[digest] = size
+            self._total += size
+            self.stored += 1
+        self._files.move_to_end(digest)
+
+        new_keys = [f"sha256:{digest}"]
+        new_keys.extend(_clean_key(key) for key in keys if key)
+        for key in new_keys:
+            old = self._keys.get(key)
+            if old == digest:
+                continue
+            if old is not None:
+                self._digest_keys.get(old, set()).discard(key)
+            self._keys[key] = digest
+            self._digest_keys.setdefault(digest, set()).add(key)
+            self._append_log(key, digest)
+        self._evict()
+
+    # 淘汰
+
+    def _touch(self, digest: str):
+        if digest in self._files:
+            self._files.move_to_end(digest)
+            try:
+                # 重启后按修改时间恢复使用顺序
+                os.utime(self._object_path(digest))
+            except OSError:
+                pass
+
+    def _evict(self):
+        while self._total > self.max_size and self._files:
+            digest = next(iter(self._files))
+            self._forget(digest)
+            try:
+                os.remove(self._object_path(digest))
+            except OSError:
+                pass
+            self.evictions += 1
+
+    def _forget(self, digest: str):
+        size = self._files.pop(digest, None)
+        if size is not None:
+            self._total -= size
+        for key in self._digest_keys.pop(digest, ()):
+            if self._keys.get(key) == digest:
+                del self._keys[key]
+
+    # 索引
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.directory, _OBJECTS, digest[:2], digest)
+
+    def _load(self):
+        objects_dir = os.path.join(self.directory, _OBJECTS)
+        found = []
+        for prefix in os.listdir(objects_dir):
+            prefix_dir = os.path.join(objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                if prefix.endswith(".tmp"):
+                    os.remove(prefix_dir)  # 写到一半的文件
+                continue
+            for name in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, name)
+                if name.endswith(".tmp"):
+                    os.remove(path)  # 写到一半的文件
+                    continue
+                stat = os.stat(path)
+                found.append((stat.st_mtime, name, stat.st_size))
+        for _, digest, size in sorted(found):
+            self._files[digest] = size
+            self._total += size
+
+        lines = 0
+        log_path = os.path.join(self.directory, _KEY_LOG)
+        if os.path.exists(log_path):
+            with open(log_path, encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    key, _, digest = line.rstrip("\n").rpartition("\t")
+                    if key and digest in self._files:
+                        old = self._keys.get(key)
+                        if old is not None:
+                            self._digest_keys[old].discard(key)
+                        self._keys[key] = digest
+                        self._digest_keys.setdefault(digest, set()).add(key)
+
+        if lines > 2 * len(self._keys) + 1000:
+            self._compact_log()
+        else:
+            self._log = open(log_path, "a", encoding="utf-8")
+            self._log_lines = lines
+        logger.debug("媒体缓存: {} 个文件，{} 个键，共 {:.1f} MB", len(self._files), len(self._keys),
+                     self._total / 1024 / 1024)
+
+    def _append_log(self, key: str, digest: str):
+        if self._log is None:
+            return
+        self._log.write(f"{key}\t{digest}\n")
+        self._log.flush()
+        self._log_lines += 1
+        if self._log_lines > 2 * len(self._keys) + 1000:
+            self._compact_log()
+
+    def _compact_log(self):
+        """只保留还有效的键，重写 keys.log"""
+        self.close()
+        log_path = os.path.join(self.directory, _KEY_LOG)
+        tmp_path = log_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key, digest in self._keys.items():
+                f.write(f"{key}\t{digest}\n")
+        os.replace(tmp_path, log_path)
+        self._log = open(log_path, "a", encoding="utf-8")
+        self._log_lines = len(self._keys)
+
+    def get_metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "files": len(self._files),
+            "keys": len(self._keys),
+            "size": self._total,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "shared_downloads": self.shared,
+            "bytes_saved": self.bytes_saved,
+            "stored": self.stored,
+            "evictions": self.evictions,
+        }
+
+
+def _clean_key(key: str) -> str:
+    return key.replace("\t", " ").replace("\n", " ")
+
+
+def media_keys(**identifiers: Optional[str]) -> Tuple[str, ...]:
+    """把标识转换为缓存的键，例如 media_keys(aeskey="...", image_md5="...") -> ("aeskey:...", "image_md5:...")，忽略空值"""
+    return tuple(f"{name}:{value}" for name, value in identifiers.items() if value)
@@ -0,0 +1,299 @@
+import asyncio
+import base64
+import binascii
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import AsyncIterator, BinaryIO, Iterator, Optional, Union
+
+import aiohttp
+
+# 每块的字节数，是 3 的倍数，这样每块单独编码的 base64 拼起来和整体编码一样
+CHUNK_SIZE = 3 * 256 * 1024
+
+# 媒体文件小于这个大小时放在内存中，超过后写入临时文件
+SPOOL_SIZE = 4 * 1024 * 1024
+
+
+class MediaFile:
+    """文件形式的媒体内容，下载的视频和附件以这种形式交给插件，不用把整个文件放在内存里
+
+    小文件放在内存中，大文件在临时文件中，从媒体缓存读取时直接打开缓存文件。
+    同一个 MediaFile 会被多个插件共享，所有读取方法都从指定位置读，互不影响，也不要关闭它。
+
+    Args:
+        file: 二进制文件对象，为 None 时创建一个空的 SpooledTemporaryFile 用于写入
+        path: 文件路径，file 是打开的普通文件时提供
+        spool_size: 新建的文件超过多少字节时写入磁盘
+    """
+
+    def __init__(self, file: Optional[BinaryIO] = None, path: Optional[str] = None, spool_size: int = SPOOL_SIZE):
+        self.file = file if file is not None else tempfile.SpooledTemporaryFile(max_size=spool_size)
+        self.path = path
+        self._lock = threading.Lock()
+        self._size = None
+
+    @classmethod
+    def open(cls, path: Union[str, os.PathLike]) -> "MediaFile":
+        """打开磁盘上的文件"""
+        return cls(open(path, "rb"), path=os.fspath(path))
+
+    def write(self, data: bytes):
+        with self._lock:
+            self.file.seek(0, io.SEEK_END)
+            self.file.write(data)
+            self._size = None
+
+    def write_at(self, offset: int, data: bytes):
+        """在 offset 处写入，用于分段下载时按位置写入各个数据段"""
+        with self._lock:
+            self.file.seek(offset)
+            self.file.write(data)
+            self._size = None
+
+    @property
+    def size(self) -> int:
+        """文件大小（字节）"""
+        if self._size is None:
+            with self._lock:
+                self._size = self.file.seek(0, io.SEEK_END)
+        return self._size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def read_at(self, offset: int, size: int = -1) -> bytes:
+        """从 offset 开始读取 size 个字节，size 为 -1 时读到结尾"""
+        with self._lock:
+            self.file.seek(offset)
+            return self.file.read(size)
+
+    def head(self, size: int = 8192) -> bytes:
+        """文件开头的 size 个字节，可以用来判断文件类型"""
+        return self.read_at(0, size)
+
+    def read(self) -> bytes:
+        """读取整个文件，大文件请用 chunks 或 reader"""
+        return self.read_at(0)
+
+    def chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """逐块读取"""
+        offset = 0
+        while True:
+            data = self.read_at(offset, chunk_size)
+            if not data:
+                return
+            offset += len(data)
+            yield data
+
+    def base64_chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+        """逐块转换为 base64，拼起来就是整个文件的 base64"""
+        chunk_size -= chunk_size % 3
+        for data in self.chunks(max(chunk_size, 3)):
+            yield base64.b64encode(data).decode()
+
+    def to_base64(self) -> str:
+        """整个文件的 base64 字符串，兼容需要字符串的旧接口"""
+        return "".join(self.base64_chunks())
+
+    def reader(self) -> "MediaReader":
+        """一个独立的只读文件对象，有自己的读取位置，可以交给 aiohttp、pymediainfo 等需要文件对象的库"""
+        return MediaReader(self)
+
+    def save(self, path: Union[str, os.PathLike]):
+        """保存到 path"""
+        with open(path, "wb") as f:
+            for data in self.chunks():
+                f.write(data)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f"MediaFile(size={self.size}, path={self.path!r})"
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class MediaReader(io.RawIOBase):
+    """MediaFile 的只读文件对象，每个对象有自己的读取位置"""
+
+    def __init__(self, media: MediaFile):
+        super().__init__()
+        self.media = media
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.media.read_at(self.position, len(buffer))
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.media.size
+        self.position = max(offset, 0)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+
+class Base64Decoder:
+    """逐块解码 base64，块的边界可以在任意位置"""
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, data: bytes) -> bytes:
+        # JSON 中的 "/" 可能被转义为 "\/"
+        data = self._pending + data.replace(b"\\", b"")
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return base64.b64decode(data[:usable]) if usable else b""
+
+    def finish(self) -> bytes:
+        pending, self._pending = self._pending, b""
+        if not pending:
+            return b""
+        return base64.b64decode(pending + b"=" * (-len(pending) % 4))
+
+
+async def read_json_media(response: aiohttp.ClientResponse, field: str = "buffer",
+                          spool_size: int = SPOOL_SIZE) -> tuple[Optional[MediaFile], Optional[dict]]:
+    """从 WechatAPI 的 JSON 响应中流式读取一个 base64 字段，边下载边解码写入 MediaFile
+
+    WechatAPI 把文件放在 JSON 的一个字符串字段中，整个响应读进内存再 json 解析、base64 解码，
+    100MB 的文件要占用好几百MB内存。这里只在字段前面的部分找到字段名，之后的内容逐块解码。
+
+    Returns:
+        (MediaFile, None)：找到了字段；(None, 响应的JSON)：没有这个字段，通常是请求失败
+    """
+    marker = re.compile(rb'"' + re.escape(field.encode()) + rb'"\s*:\s*"')
+    head = b""
+    media = None
+    decoder = None
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        if media is None:
+            head += chunk
+            found = marker.search(head)
+            if found is None:
+                continue
+            media = MediaFile(spool_size=spool_size)
+            decoder = Base64Decoder()
+            chunk = head[found.end():]
+            head = b""
+        elif decoder is None:
+            continue  # 字段之后的内容不需要
+
+        end = chunk.find(b'"')
+        if end >= 0:
+            chunk = chunk[:end]
+        try:
+            media.write(decoder.feed(chunk))
+            if end >= 0:
+                media.write(decoder.finish())
+        except (binascii.Error, ValueError) as error:
+            media.close()
+            raise ValueError(f"媒体数据不是有效的 base64: {error}") from error
+        if end >= 0:
+            decoder = None
+
+    if media is None:
+        return None, json.loads(head) if head else {}
+    if decoder is not None:
+        media.close()
+        raise ValueError("媒体数据不完整")
+    return media, None
+
+
+Media = Union[str, bytes, os.PathLike, MediaFile, BinaryIO]
+
+
+def _base64_pieces(value: Media, chunk_size: int) -> Iterator[str]:
+    if isinstance(value, str):
+        # 已经是 base64，分段发送，不需要 json.dumps 复制一遍
+        for start in range(0, len(value), chunk_size):
+            yield value[start:start + chunk_size]
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        view = memoryview(value)
+        for start in range(0, len(view), chunk_size):
+            yield base64.b64encode(view[start:start + chunk_size]).decode()
+    elif isinstance(value, MediaFile):
+        yield from value.base64_chunks(chunk_size)
+    elif isinstance(value, os.PathLike):
+        with open(value, "rb") as f:
+            yield from _base64_pieces(f, chunk_size)
+    else:
+        while True:
+            data = value.read(chunk_size)
+            if not data:
+                return
+            # 文件对象的 read 可能返回不足 chunk_size 的字节，凑齐 3 的倍数再编码
+            remainder = len(data) % 3
+            while remainder:
+                more = value.read(3 - remainder)
+                if not more:
+                    break
+                data += more
+                remainder = len(data) % 3
+            yield base64.b64encode(data).decode()
+
+
+async def json_media_body(params: dict, chunk_size: int = CHUNK_SIZE, **media: Media) -> AsyncIterator[bytes]:
+    """生成 JSON 请求体，media 中的字段逐块编码为 base64，不用先把整个文件编码成一个字符串
+
+    例子:
+        data=json_media_body({"Wxid": wxid}, Base64=Path(path))
+    """
+    chunk_size -= chunk_size % 3
+    prefix = json.dumps(params, ensure_ascii=False)[:-1]
+    separator = ", " if params else ""
+    yield prefix.encode()
+    for name, value in media.items():
+        yield f'{separator}{json.dumps(name)}: "'.encode()
+        separator = ", "
+        pieces = _base64_pieces(value, chunk_size)
+        while True:
+            # 读文件和编码在线程池中执行，不阻塞事件循环
+            piece = await asyncio.to_thread(next, pieces, None)
+            if piece is None:
+                break
+            yield piece.encode()
+        yield b'"'
+    yield b"}"
+
+
+def media_size(value: Media) -> int:
+    """媒体内容的字节数，base64 字符串按解码后的大小估算"""
+    if isinstance(value, str):
+        return len(value) * 3 // 4
+    if isinstance(value, (bytes, bytearray, memoryview, MediaFile)):
+        return len(value)
+    if isinstance(value, os.PathLike):
+        return os.path.getsize(value)
+    try:
+        return os.fstat(value.fileno()).st_size - value.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return 0
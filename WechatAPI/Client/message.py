@@ -1,64 +1,37 @@
-import asyncio
 import base64
 import os
-from asyncio import Future
-from asyncio import Queue, sleep
 from io import BytesIO
 from pathlib import Path
 from typing import Union
 
-import aiohttp
 import pysilk
 from loguru import logger
 from pydub import AudioSegment
 from pymediainfo import MediaInfo
 
 from .base import *
+from .media_stream import MediaFile, json_media_body, media_size
 from .protect import protector
+from .send_scheduler import PRIORITY_HIGH, SendScheduler
 from ..errors import *
 
 
 class MessageMixin(WechatAPIClientBase):
     def __init__(self, ip: str, port: int):
-        # 初始化消息队列
+        # 初始化发送消息调度器
         super().__init__(ip, port)
-        self._message_queue = Queue()
-        self._is_processing = False
+        self.send_scheduler = SendScheduler()
 
-    async def _process_message_queue(self):
+    async def _queue_message(self, func, wxid: str, *args, priority: int = None, **kwargs):
         """
-        处理消息队列的异步方法
+        将消息交给发送调度器，按全局和接收人的发送速度限制排队发送
         """
-        if self._is_processing:
-            return
-
-        self._is_processing = True
-        while True:
-            if self._message_queue.empty():
-                self._is_processing = False
-                break
-
-            func, args, kwargs, future = await self._message_queue.get()
-            try:
-                result = await func(*args, **kwargs)
-                future.set_result(result)
-            except Exception as e:
-                future.set_exception(e)
-            finally:
-                self._message_queue.task_done()
-                await sleep(1)  # 消息发送间隔1秒
-
-    async def _queue_message(self, func, *args, **kwargs):
-        """
-        将消息添加到队列
-        """
-        future = Future()
-        await self._message_queue.put((func, args, kwargs, future))
+        return await self.send_scheduler.submit(wxid, func, (wxid, *args), kwargs, priority)
 
-        if not self._is_processing:
-            asyncio.create_task(self._process_message_queue())
-
-        return await future
+    async def close(self):
+        # 先停止发送调度器，正在发送的消息还要用到HTTP会话
+        await self.send_scheduler.stop()
+        await super().close()
 
     async def revoke_message(self, wxid: str, client_msg_id: int, create_time: int, new_msg_id: int) -> bool:
         """撤回消息。
@@ -82,7 +55,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "ClientMsgId": client_msg_id, "CreateTime": create_time,
                           "NewMsgId": new_msg_id}
             response = await session.post(f'http://{self.ip}:{self.port}/RevokeMsg', json=json_param)
@@ -113,7 +86,9 @@ class MessageMixin(WechatAPIClientBase):
             BanProtection: 登录新设备后4小时内操作
             根据error_handler处理错误
         """
-        return await self._queue_message(self._send_text_message, wxid, content, at)
+        # @消息是在和群成员互动，优先发送
+        return await self._queue_message(self._send_text_message, wxid, content, at,
+                                         priority=PRIORITY_HIGH if at else None)
 
     async def _send_text_message(self, wxid: str, content: str, at: list[str] = None) -> tuple[int, int, int]:
         """
@@ -133,7 +108,7 @@ class MessageMixin(WechatAPIClientBase):
         else:
             raise ValueError("Argument 'at' should be str or list")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Content": content, "Type": 1, "At": at_str}
             response = await session.post(f'http://{self.ip}:{self.port}/SendTextMsg', json=json_param)
             json_resp = await response.json()
@@ -145,12 +120,13 @@ class MessageMixin(WechatAPIClientBase):
             else:
                 self.error_handler(json_resp)
 
-    async def send_image_message(self, wxid: str, image: Union[str, bytes, os.PathLike]) -> tuple[int, int, int]:
+    async def send_image_message(self, wxid: str, image: Union[str, bytes, os.PathLike, MediaFile]) -> tuple[
+        int, int, int]:
         """发送图片消息。
 
         Args:
             wxid (str): 接收人wxid
-            image (str, byte, os.PathLike): 图片，支持base64字符串，图片byte，图片路径
+            image (str, byte, os.PathLike, MediaFile): 图片，支持base64字符串，图片byte，图片路径，MediaFile
 
         Returns:
             tuple[int, int, int]: 返回(ClientImgId, CreateTime, NewMsgId)
@@ -163,44 +139,39 @@ class MessageMixin(WechatAPIClientBase):
         """
         return await self._queue_message(self._send_image_message, wxid, image)
 
-    async def _send_image_message(self, wxid: str, image: Union[str, bytes, os.PathLike]) -> tuple[
+    async def _send_image_message(self, wxid: str, image: Union[str, bytes, os.PathLike, MediaFile]) -> tuple[
         int, int, int]:
         if not self.wxid:
             raise UserLoggedOut("请先登录")
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        if isinstance(image, str):
-            pass
-        elif isinstance(image, bytes):
-            image = base64.b64encode(image).decode()
-        elif isinstance(image, os.PathLike):
-            with open(image, 'rb') as f:
-                image = base64.b64encode(f.read()).decode()
-        else:
-            raise ValueError("Argument 'image' can only be str, bytes, or os.PathLike")
+        if not isinstance(image, (str, bytes, os.PathLike, MediaFile)):
+            raise ValueError("Argument 'image' can only be str, bytes, os.PathLike or MediaFile")
 
-        async with aiohttp.ClientSession() as session:
-            json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Base64": image}
-            response = await session.post(f'http://{self.ip}:{self.port}/SendImageMsg', json=json_param)
+        async with self._http_session() as session:
+            # 请求体逐块编码，不用先把整张图片编码成一个字符串
+            json_param = {"Wxid": self.wxid, "ToWxid": wxid}
+            response = await session.post(f'http://{self.ip}:{self.port}/SendImageMsg',
+                                          data=json_media_body(json_param, Base64=image),
+                                          headers={"Content-Type": "application/json"})
             json_resp = await response.json()
 
             if json_resp.get("Success"):
-                json_param.pop('Base64')
                 logger.info("发送图片消息: 对方wxid:{} 图片base64略", wxid)
                 data = json_resp.get("Data")
                 return data.get("ClientImgId").get("string"), data.get("CreateTime"), data.get("Newmsgid")
             else:
                 self.error_handler(json_resp)
 
-    async def send_video_message(self, wxid: str, video: Union[str, bytes, os.PathLike],
-                                 image: [str, bytes, os.PathLike] = None):
+    async def send_video_message(self, wxid: str, video: Union[str, bytes, os.PathLike, MediaFile],
+                                 image: [str, bytes, os.PathLike, MediaFile] = None):
         """发送视频消息。不推荐使用，上传速度很慢300KB/s。如要使用，可压缩视频，或者发送链接卡片而不是视频。
 
                 Args:
                     wxid (str): 接收人wxid
-                    video (str, bytes, os.PathLike): 视频 接受base64字符串，字节，文件路径
-                    image (str, bytes, os.PathLike): 视频封面图片 接受base64字符串，字节，文件路径
+                    video (str, bytes, os.PathLike, MediaFile): 视频 接受base64字符串，字节，文件路径，MediaFile
+                    image (str, bytes, os.PathLike, MediaFile): 视频封面图片 接受base64字符串，字节，文件路径，MediaFile
 
                 Returns:
                     tuple[int, int]: 返回(ClientMsgid, NewMsgId)
@@ -213,49 +184,35 @@ class MessageMixin(WechatAPIClientBase):
                 """
         if not image:
             image = Path(os.path.join(Path(__file__).resolve().parent, "fallback.png"))
-        # get video base64 and duration
+        # get video duration，文件路径和 MediaFile 不读进内存，上传时逐块编码
         if isinstance(video, str):
-            vid_base64 = video
-            video = base64.b64decode(video)
-            file_len = len(video)
-            media_info = MediaInfo.parse(BytesIO(video))
+            media_info = MediaInfo.parse(BytesIO(base64.b64decode(video)))
         elif isinstance(video, bytes):
-            vid_base64 = base64.b64encode(video).decode()
-            file_len = len(video)
             media_info = MediaInfo.parse(BytesIO(video))
         elif isinstance(video, os.PathLike):
-            with open(video, "rb") as f:
-                file_len = len(f.read())
-                vid_base64 = base64.b64encode(f.read()).decode()
             media_info = MediaInfo.parse(video)
+        elif isinstance(video, MediaFile):
+            media_info = MediaInfo.parse(video.reader())
         else:
-            raise ValueError("video should be str, bytes, or path")
+            raise ValueError("video should be str, bytes, path or MediaFile")
         duration = media_info.tracks[0].duration
+        file_len = media_size(video)
 
-        # get image base64
-        if isinstance(image, str):
-            image_base64 = image
-        elif isinstance(image, bytes):
-            image_base64 = base64.b64encode(image).decode()
-        elif isinstance(image, os.PathLike):
-            with open(image, "rb") as f:
-                image_base64 = base64.b64encode(f.read()).decode()
-        else:
-            raise ValueError("image should be str, bytes, or path")
+        if not isinstance(image, (str, bytes, os.PathLike, MediaFile)):
+            raise ValueError("image should be str, bytes, path or MediaFile")
 
         # 打印预估时间，300KB/s
         predict_time = int(file_len / 1024 / 300)
         logger.info("开始发送视频: 对方wxid:{} 视频base64略 图片base64略 预计耗时:{}秒", wxid, predict_time)
 
-        async with aiohttp.ClientSession() as session:
-            json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Base64": vid_base64, "ImageBase64": image_base64,
-                          "PlayLength": duration}
-            async with session.post(f'http://{self.ip}:{self.port}/SendVideoMsg', json=json_param) as resp:
+        async with self._http_session() as session:
+            json_param = {"Wxid": self.wxid, "ToWxid": wxid, "PlayLength": duration}
+            async with session.post(f'http://{self.ip}:{self.port}/SendVideoMsg',
+                                    data=json_media_body(json_param, Base64=video, ImageBase64=image),
+                                    headers={"Content-Type": "application/json"}) as resp:
                 json_resp = await resp.json()
 
         if json_resp.get("Success"):
-            json_param.pop('Base64')
-            json_param.pop('ImageBase64')
             logger.info("发送视频成功: 对方wxid:{} 时长:{} 视频base64略 图片base64略", wxid, duration)
             data = json_resp.get("Data")
             return data.get("clientMsgId"), data.get("newMsgId")
@@ -323,7 +280,7 @@ class MessageMixin(WechatAPIClientBase):
 
         format_dict = {"amr": 0, "wav": 4, "mp3": 4}
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Base64": voice_base64, "VoiceTime": duration,
                           "Type": format_dict[format]}
             response = await session.post(f'http://{self.ip}:{self.port}/SendVoiceMsg', json=json_param)
@@ -378,7 +335,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Url": url, "Title": title, "Desc": description,
                           "ThumbUrl": thumb_url}
             response = await session.post(f'http://{self.ip}:{self.port}/SendShareLink', json=json_param)
@@ -420,7 +377,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Md5": md5, "TotalLen": total_length}
             response = await session.post(f'http://{self.ip}:{self.port}/SendEmojiMsg', json=json_param)
             json_resp = await response.json()
@@ -458,7 +415,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "CardWxid": card_wxid, "CardAlias": card_alias,
                           "CardNickname": card_nickname}
             response = await session.post(f'http://{self.ip}:{self.port}/SendCardMsg', json=json_param)
@@ -499,7 +456,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Xml": xml, "Type": type}
             response = await session.post(f'http://{self.ip}:{self.port}/SendAppMsg', json=json_param)
             json_resp = await response.json()
@@ -535,7 +492,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Content": xml}
             response = await session.post(f'http://{self.ip}:{self.port}/SendCDNFileMsg', json=json_param)
             json_resp = await response.json()
@@ -570,7 +527,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Content": xml}
             response = await session.post(f'http://{self.ip}:{self.port}/SendCDNImgMsg', json=json_param)
             json_resp = await response.json()
@@ -605,7 +562,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Content": xml}
             response = await session.post(f'http://{self.ip}:{self.port}/SendCDNVideoMsg', json=json_param)
             json_resp = await response.json()
@@ -630,7 +587,7 @@ class MessageMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "Scene": 0, "Synckey": ""}
             response = await session.post(f'http://{self.ip}:{self.port}/Sync', json=json_param)
             json_resp = await response.json()
@@ -0,0 +1,235 @@
+import asyncio
+import inspect
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+from loguru import logger
+
+from .base import Section, WechatAPIClientBase
+from .media_stream import MediaFile, read_json_media
+from ..errors import UserLoggedOut
+
+# 下载进度回调，参数是 (已下载字节数, 总字节数)，可以是普通函数也可以是协程函数
+ProgressCallback = Callable[[int, int], Optional[Awaitable[None]]]
+
+
+async def report_progress(progress: Optional[ProgressCallback], done: int, total: int):
+    if progress is not None:
+        result = progress(done, total)
+        if inspect.isawaitable(result):
+            await result
+
+
+class SegmentError(Exception):
+    """分段下载有数据段在重试后仍然失败"""
+
+    def __init__(self, failed: List[Section], error: BaseException):
+        self.failed = failed
+        super().__init__(f"{len(failed)} 个数据段下载失败: {error!r}")
+
+
+def plan_sections(total_len: int, segment_size: int) -> List[Section]:
+    """把 total_len 字节按 segment_size 切分为数据段"""
+    segment_size = max(segment_size, 1)
+    return [Section(data_len=min(segment_size, total_len - start), start_pos=start)
+            for start in range(0, total_len, segment_size)]
+
+
+async def fetch_section(session, url: str, json_param: dict, total_len: int, section: Section) -> bytes:
+    """请求一个数据段，请求参数中加上 DataLen（文件总长度）和 Section，返回这一段的字节"""
+    param = {**json_param, "DataLen": total_len,
+             "Section": {"DataLen": section.data_len, "StartPos": section.start_pos}}
+    async with session.post(url, json=param) as response:
+        media, json_resp = await read_json_media(response, "buffer")
+    if media is None:
+        # 已退出登录等错误直接抛出，不再重试
+        WechatAPIClientBase.error_handler(json_resp or {})
+        raise ValueError(f"下载数据段失败: {json_resp.get('Message') if json_resp else '空响应'}")
+    with media:
+        return media.read()
+
+
+class SegmentedDownloader:
+    """把大文件切分为数据段（Section）并发下载，再按位置写入同一个文件
+
+    第一个数据段单独请求，用来确认服务端支持分段：返回的长度和请求的一样才并发下载剩下的数据段；
+    返回了整个文件说明服务端忽略了 Section，直接使用这个结果，之后这个接口都不再分段。
+    还没确认过的接口第一个数据段请求失败时，说明服务端可能不接受 Section，改为一次请求整个文件，之后也不再分段。
+    失败的数据段单独重试，已经下载好的数据段不会重新下载。
+
+    Args:
+        segment_size (int): 每个数据段的字节数
+        concurrency (int): 同时下载的数据段数
+        retries (int): 每个数据段失败后最多重试几次
+        min_size (int): 文件小于这个大小时不分段，一次请求下载
+        enabled (bool): 是否启用分段下载
+    """
+
+    def __init__(self, segment_size: int = 1 << 20, concurrency: int = 4, retries: int = 3,
+                 min_size: int = 4 << 20, enabled: bool = True):
+        self.configure(segment_size, concurrency, retries, min_size, enabled)
+        self._ranged: Dict[str, bool] = {}  # 接口 -> 服务端是否支持分段
+
+        # 统计
+        self.downloads = 0
+        self.segments = 0
+        self.retried = 0
+        self.failures = 0
+        self.fallbacks = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def configure(self, segment_size: int, concurrency: int, retries: int, min_size: int, enabled: bool = True):
+        self.segment_size = max(segment_size, 1)
+        self.concurrency = max(concurrency, 1)
+        self.retries = max(retries, 0)
+        self.min_size = max(min_size, self.segment_size)
+        self.enabled = enabled
+
+    def should_split(self, endpoint: str, total_len: int) -> bool:
+        """这个文件是否分段下载"""
+        return self.enabled and total_len >= self.min_size and self._ranged.get(endpoint, True)
+
+    async def download(self, endpoint: str, total_len: int, fetch: Callable[[Section], Awaitable[bytes]],
+                       progress: Optional[ProgressCallback] = None,
+                       fetch_whole: Optional[Callable[[], Awaitable[Optional[MediaFile]]]] = None) -> MediaFile:
+        """分段下载 total_len 字节，fetch 下载一个数据段并返回它的字节，fetch_whole 不带 Section 下载整个文件
+
+        Raises:
+            SegmentError: 有数据段重试后仍然失败
+        """
+        start = time.perf_counter()
+        sections = plan_sections(total_len, self.segment_size)
+        # 还没确认过服务端支持分段时，第一个数据段失败不重试，直接改为一次请求整个文件
+        probing = endpoint not in self._ranged and fetch_whole is not None
+        media = MediaFile(tempfile.TemporaryFile())
+        done = 0
+
+        async def store(section: Section, data: bytes):
+            nonlocal done
+            await asyncio.to_thread(media.write_at, section.start_pos, data)
+            done += len(data)
+            await report_progress(progress, done, total_len)
+
+        try:
+            # 第一个数据段确认服务端是否支持分段
+            try:
+                data = await self._fetch_section(sections[0], fetch, whole_len=total_len,
+                                                 retries=0 if probing else None)
+            except SegmentError as error:
+                if not probing:
+                    raise
+                media.close()
+                self._ranged[endpoint] = False
+                self.fallbacks += 1
+                logger.warning("{} 分段请求失败，已改为一次下载整个文件: {!r}", endpoint, error.__cause__)
+                media = await fetch_whole()
+                if media is not None:
+                    await report_progress(progress, media.size, media.size)
+                return media
+            if len(data) == total_len and len(sections) > 1:
+                self._ranged[endpoint] = False
+                self.fallbacks += 1
+                logger.info("{} 不支持分段下载，已改为一次下载整个文件", endpoint)
+                await store(Section(data_len=total_len, start_pos=0), data)
+            else:
+                self._ranged[endpoint] = True
+                await store(sections[0], data)
+                await self._fetch_rest(sections[1:], fetch, store)
+        except BaseException:
+            media.close()
+            raise
+
+        self.downloads += 1
+        self.bytes += total_len
+        self.seconds += time.perf_counter() - start
+        return media
+
+    async def _fetch_section(self, section: Section, fetch: Callable[[Section], Awaitable[bytes]],
+                             whole_len: int = 0, retries: Optional[int] = None) -> bytes:
+        """下载一个数据段，失败时只重试这一段。whole_len 不为 0 时也接受整个文件"""
+        retries = self.retries if retries is None else retries
+        attempt = 0
+        while True:
+            try:
+                data = await fetch(section)
+                if len(data) != section.data_len and len(data) != whole_len:
+                    raise ValueError(f"数据段长度为 {len(data)}，应为 {section.data_len}")
+                self.segments += 1
+                return data
+            except (UserLoggedOut, asyncio.CancelledError):
+                raise
+            except Exception as error:
+                if attempt >= retries:
+                    self.failures += 1
+                    raise SegmentError([section], error) from error
+                attempt += 1
+                self.retried += 1
+                logger.debug("数据段 {} 下载失败，第 {} 次重试: {}", section, attempt, error)
+                await asyncio.sleep(min(0.5 * 2 ** (attempt - 1), 5))
+
+    async def _fetch_rest(self, sections: List[Section], fetch: Callable[[Section], Awaitable[bytes]],
+                          store: Callable[[Section, bytes], Awaitable[None]]):
+        """最多 concurrency 个数据段同时下载，一个数据段最终失败时其他数据段继续下载，最后一起报告"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        failed: List[Section] = []
+        errors: List[BaseException] = []
+
+        async def run(section: Section):
+            async with semaphore:
+                try:
+                    data = await self._fetch_section(section, fetch)
+                except SegmentError as error:
+                    failed.extend(error.failed)
+                    errors.append(error.__cause__)
+                    return
+                await store(section, data)
+
+        tasks = [asyncio.create_task(run(section)) for section in sections]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        if failed:
+            raise SegmentError(sorted(failed, key=lambda section: section.start_pos), errors[-1])
+
+    def get_metrics(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "segment_size": self.segment_size,
+            "concurrency": self.concurrency,
+            "downloads": self.downloads,
+            "segments": self.segments,
+            "retried": self.retried,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+            "bytes": self.bytes,
+            "throughput_mb_s": round(self.bytes / self.seconds / 1024 / 1024, 2) if self.seconds else 0.0,
+        }
+
+
+async def fetch_whole(session, url: str, json_param: dict) -> MediaFile:
+    """不带 Section 请求整个文件"""
+    async with session.post(url, json=json_param) as response:
+        media, json_resp = await read_json_media(response, "buffer")
+    if media is None:
+        WechatAPIClientBase.error_handler(json_resp or {})
+        raise ValueError(f"下载失败: {json_resp.get('Message') if json_resp else '空响应'}")
+    return media
+
+
+async def download_sections(session: aiohttp.ClientSession, url: str, json_param: dict, total_len: int,
+                            downloader: SegmentedDownloader, progress: Optional[ProgressCallback] = None,
+                            fetch_whole_file: Optional[Callable[[], Awaitable[Optional[MediaFile]]]] = None
+                            ) -> MediaFile:
+    """用 downloader 分段请求 url，endpoint 取 url 的最后一段。服务端不接受分段时用 fetch_whole_file 一次下载，
+    默认用 fetch_whole"""
+    endpoint = url.rsplit("/", 1)[-1]
+    if fetch_whole_file is None:
+        fetch_whole_file = lambda: fetch_whole(session, url, json_param)  # noqa: E731
+    return await downloader.download(endpoint, total_len,
+                                     lambda section: fetch_section(session, url, json_param, total_len, section),
+                                     progress, fetch_whole_file)
@@ -0,0 +1,268 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+from loguru import logger
+
+# 发送优先级，数字越小越先发送
+PRIORITY_HIGH = 0  # @回复
+PRIORITY_NORMAL = 1  # 普通的消息回复
+PRIORITY_LOW = 2  # 定时任务、群发等
+
+_LANE_NAMES = ("high", "normal", "low")
+
+# 当前上下文发送消息使用的优先级，定时任务中默认为 PRIORITY_LOW
+_current_priority: ContextVar[int] = ContextVar("send_priority", default=PRIORITY_NORMAL)
+
+
+@contextmanager
+def send_priority(priority: int):
+    """在 with 块中发送的消息使用指定的优先级
+
+    例子:
+        with send_priority(PRIORITY_LOW):
+            await bot.send_text_message(wxid, "每日新闻")
+    """
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class TokenBucket:
+    """令牌桶，每秒补充 rate 个令牌，最多存 burst 个
+
+    Args:
+        rate (float): 每秒补充的令牌数
+        burst (float): 令牌桶容量
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """距离有一个令牌还要等多久（秒）"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+@dataclass
+class _Outgoing:
+    recipient: str
+    func: Callable
+    args: tuple
+    kwargs: dict
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class _WaitStats:
+    """单条优先级通道的排队等待时间统计"""
+
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: Deque[float] = deque(maxlen=1000)
+
+    def record(self, wait: float):
+        self.count += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+        self.recent.append(wait)
+
+    def to_dict(self) -> dict:
+        ordered = sorted(self.recent)
+
+        def percentile(q: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 1) if ordered else 0.0
+
+        return {
+            "sent": self.count,
+            "avg_wait_ms": round(self.total / self.count * 1000, 1) if self.count else 0.0,
+            "p50_wait_ms": percentile(0.50),
+            "p95_wait_ms": percentile(0.95),
+            "max_wait_ms": round(self.max * 1000, 1),
+        }
+
+
+class SendScheduler:
+    """发送消息调度器
+
+    发送速度同时受全局令牌桶和每个接收人各自的令牌桶限制，给不同的群回复消息时不需要互相等待。
+    高优先级通道（@回复、普通回复）的消息总是排在低优先级通道（定时任务、群发）前面。
+    同一个接收人的消息在同一条通道里按顺序发送。
+
+    Args:
+        global_rate (float): 全局每秒最多发送的消息数
+        global_burst (float): 全局最多连续发送的消息数
+        recipient_rate (float): 每个接收人每秒最多发送的消息数
+        recipient_burst (float): 每个接收人最多连续发送的消息数
+    """
+
+    def __init__(self, global_rate: float = 3, global_burst: float = 5,
+                 recipient_rate: float = 1, recipient_burst: float = 1):
+        self.configure(global_rate, global_burst, recipient_rate, recipient_burst)
+        self._lanes: List[Deque[_Outgoing]] = [deque() for _ in _LANE_NAMES]
+        self._recipient_buckets: Dict[str, TokenBucket] = {}
+        self._in_flight: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sends: Set[asyncio.Task] = set()  # 正在发送的任务，保留引用防止被垃圾回收
+        self._wait_stats = [_WaitStats() for _ in _LANE_NAMES]
+
+    def configure(self, global_rate: float, global_burst: float, recipient_rate: float, recipient_burst: float):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self._recipient_buckets = {}
+
+    async def submit(self, recipient: str, func: Callable, args: tuple, kwargs: dict,
+                     priority: int = None) -> Any:
+        """把发送任务放入队列，等待发送完成并返回结果"""
+        if priority is None:
+            priority = _current_priority.get()
+        priority = min(max(priority, PRIORITY_HIGH), PRIORITY_LOW)
+
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[priority].append(_Outgoing(recipient, func, args, kwargs, future))
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch())
+            self._task.add_done_callback(self._on_dispatch_done)
+        else:
+            self._wakeup.set()
+
+        return await future
+
+    async def stop(self):
+        """停止调度器，等正在发送的消息发完，还在排队的消息取消"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+        for lane in self._lanes:
+            while lane:
+                lane.popleft().future.cancel()
+        self._in_flight.clear()
+
+    def _on_dispatch_done(self, task: asyncio.Task):
+        if task.cancelled() or task.exception() is None:
+            return
+        logger.error("发送消息调度器出错: {}", task.exception())
+        # 调度器异常退出时让还在排队的调用方收到异常，而不是一直等待
+        for lane in self._lanes:
+            while lane:
+                item = lane.popleft()
+                if not item.future.done():
+                    item.future.set_exception(task.exception())
+
+    def _recipient_bucket(self, recipient: str) -> TokenBucket:
+        bucket = self._recipient_buckets.get(recipient)
+        if bucket is None:
+            bucket = self._recipient_buckets[recipient] = TokenBucket(self.recipient_rate, self.recipient_burst)
+        return bucket
+
+    def _pick(self, now: float):
+        """找出下一条可以发送的消息，返回 (通道, 消息, 需要等待的秒数)"""
+        shortest_wait = None
+        for lane_index, lane in enumerate(self._lanes):
+            blocked = set()
+            for item in lane:
+                if item.recipient in blocked or item.recipient in self._in_flight:
+                    # 同一个接收人的消息要按顺序发送，前一条还没发出去后面的也不能发
+                    blocked.add(item.recipient)
+                    continue
+                wait = self._recipient_bucket(item.recipient).wait_time(now)
+                if wait == 0:
+                    return lane_index, item, 0.0
+                blocked.add(item.recipient)
+                if shortest_wait is None or wait < shortest_wait:
+                    shortest_wait = wait
+        return None, None, shortest_wait
+
+    async def _dispatch(self):
+        while any(self._lanes) or self._in_flight:
+            now = time.monotonic()
+            global_wait = self.global_bucket.wait_time(now)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+
+            lane_index, item, wait = self._pick(now)
+            if item is None:
+                # 没有能立即发送的消息，等到最早有令牌的接收人或者有新消息进来
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._lanes[lane_index].remove(item)
+            self.global_bucket.consume(now)
+            self._recipient_bucket(item.recipient).consume(now)
+            self._wait_stats[lane_index].record(now - item.enqueued)
+            self._in_flight.add(item.recipient)
+            task = asyncio.create_task(self._send(item))
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+
+            self._prune(now)
+
+    async def _send(self, item: _Outgoing):
+        try:
+            result = await item.func(*item.args, **item.kwargs)
+            if not item.future.done():
+                item.future.set_result(result)
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+        finally:
+            self._in_flight.discard(item.recipient)
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def _prune(self, now: float):
+        # 令牌已经补满的接收人和新建一个桶没有区别，删掉防止字典无限增长
+        if len(self._recipient_buckets) > 1024:
+            waiting = {item.recipient for lane in self._lanes for item in lane} | self._in_flight
+            for recipient in [r for r, bucket in self._recipient_buckets.items()
+                              if r not in waiting and bucket.is_full(now)]:
+                del self._recipient_buckets[recipient]
+
+    def get_metrics(self) -> dict:
+        """各优先级通道的队列长度和排队等待时间"""
+        metrics = {"in_flight": len(self._in_flight)}
+        for name, lane, stats in zip(_LANE_NAMES, self._lanes, self._wait_stats):
+            metrics[name] = {"queued": len(lane), **stats.to_dict()}
+        return metrics
@@ -1,23 +1,39 @@
+import asyncio
 import base64
 import io
 import os
+from typing import Optional
 
-import aiohttp
 import pysilk
 from pydub import AudioSegment
 
 from .base import *
+from .media_store import MediaStore, media_keys
+from .media_stream import MediaFile, read_json_media
+from .segmented_download import ProgressCallback, SegmentedDownloader, download_sections, report_progress
 from .protect import protector
 from ..errors import *
 
 
 class ToolMixin(WechatAPIClientBase):
-    async def download_image(self, aeskey: str, cdnmidimgurl: str) -> str:
-        """CDN下载高清图片。
+    def __init__(self, ip: str, port: int):
+        # 初始化媒体文件缓存，默认不启用，需要调用 media_store.configure
+        super().__init__(ip, port)
+        self.media_store = MediaStore()
+        # 大附件和视频分段并发下载
+        self.segmented_downloader = SegmentedDownloader()
+
+    async def close(self):
+        await super().close()
+        self.media_store.close()
+
+    async def download_image(self, aeskey: str, cdnmidimgurl: str, md5: str = "") -> str:
+        """CDN下载高清图片。启用媒体缓存时，aeskey、CDN URL 或 md5 相同的图片只下载一次。
 
         Args:
             aeskey (str): 图片的AES密钥
             cdnmidimgurl (str): 图片的CDN URL
+            md5 (str, optional): 图片的md5，从xml获取
 
         Returns:
             str: 图片的base64编码字符串
@@ -29,15 +45,20 @@ class ToolMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
-            json_param = {"Wxid": self.wxid, "AesKey": aeskey, "Cdnmidimgurl": cdnmidimgurl}
-            response = await session.post(f'http://{self.ip}:{self.port}/CdnDownloadImg', json=json_param)
-            json_resp = await response.json()
+        async def download():
+            async with self._http_session() as session:
+                json_param = {"Wxid": self.wxid, "AesKey": aeskey, "Cdnmidimgurl": cdnmidimgurl}
+                response = await session.post(f'http://{self.ip}:{self.port}/CdnDownloadImg', json=json_param)
+                json_resp = await response.json()
 
-            if json_resp.get("Success"):
-                return json_resp.get("Data")
-            else:
-                self.error_handler(json_resp)
+                if json_resp.get("Success"):
+                    return json_resp.get("Data")
+                else:
+                    self.error_handler(json_resp)
+
+        # 下载的是中等清晰度的图片，不是 md5 对应的原图，键和附件、视频的 md5 分开
+        return await self.media_store.fetch_base64(
+            media_keys(aeskey=aeskey, cdnurl=cdnmidimgurl, image_md5=md5), download)
 
     async def download_voice(self, msg_id: str, voiceurl: str, length: int) -> str:
         """下载语音文件。
@@ -57,7 +78,7 @@ class ToolMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "MsgId": msg_id, "Voiceurl": voiceurl, "Length": length}
             response = await session.post(f'http://{self.ip}:{self.port}/DownloadVoice', json=json_param)
             json_resp = await response.json()
@@ -67,14 +88,36 @@ class ToolMixin(WechatAPIClientBase):
             else:
                 self.error_handler(json_resp)
 
-    async def download_attach(self, attach_id: str) -> dict:
-        """下载附件。
+    async def download_attach(self, attach_id: str, md5: str = "") -> str:
+        """下载附件。启用媒体缓存时，附件ID或md5相同的附件只下载一次。大附件请用 download_attach_file。
 
         Args:
             attach_id (str): 附件ID
+            md5 (str, optional): 附件的md5，从xml获取
 
         Returns:
-            dict: 附件数据
+            str: 附件的base64编码字符串
+
+        Raises:
+            UserLoggedOut: 未登录时调用
+            根据error_handler处理错误
+        """
+        media = await self.download_attach_file(attach_id, md5)
+        return await asyncio.to_thread(media.to_base64) if media is not None else None
+
+    async def download_attach_file(self, attach_id: str, md5: str = "", total_len: int = 0,
+                                   progress: ProgressCallback = None) -> MediaFile:
+        """流式下载附件，边下载边解码写入临时文件，不会把整个附件放在内存里。
+        知道附件大小并且足够大时，分段并发下载。
+
+        Args:
+            attach_id (str): 附件ID
+            md5 (str, optional): 附件的md5，从xml获取
+            total_len (int, optional): 附件大小（字节），从xml的totallen获取，为0时不分段
+            progress (Callable[[int, int], Any], optional): 进度回调，参数是(已下载字节数, 总字节数)，可以是协程函数
+
+        Returns:
+            MediaFile: 附件内容，可以逐块读取、转换为base64或保存到文件
 
         Raises:
             UserLoggedOut: 未登录时调用
@@ -83,25 +126,41 @@ class ToolMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
-            json_param = {"Wxid": self.wxid, "AttachId": attach_id}
-            response = await session.post(f'http://{self.ip}:{self.port}/DownloadAttach', json=json_param)
-            json_resp = await response.json()
+        json_param = {"Wxid": self.wxid, "AttachId": attach_id}
+        return await self._fetch_media_file(media_keys(attachid=attach_id, attach_md5=md5),
+                                            "DownloadAttach", json_param, total_len, progress)
 
-            if json_resp.get("Success"):
-                return json_resp.get("Data").get("data").get("buffer")
-            else:
-                self.error_handler(json_resp)
-
-    async def download_video(self, msg_id) -> str:
-        """下载视频。
+    async def download_video(self, msg_id, md5: str = "") -> str:
+        """下载视频。启用媒体缓存时，md5相同的视频只下载一次。大视频请用 download_video_file。
 
         Args:
             msg_id (str): 消息的msg_id
+            md5 (str, optional): 视频的md5，从xml获取
 
         Returns:
             str: 视频的base64编码字符串
 
+        Raises:
+            UserLoggedOut: 未登录时调用
+            根据error_handler处理错误
+        """
+        media = await self.download_video_file(msg_id, md5)
+        return await asyncio.to_thread(media.to_base64) if media is not None else None
+
+    async def download_video_file(self, msg_id, md5: str = "", total_len: int = 0,
+                                  progress: ProgressCallback = None) -> MediaFile:
+        """流式下载视频，边下载边解码写入临时文件，不会把整个视频放在内存里。
+        知道视频大小并且足够大时，分段并发下载。
+
+        Args:
+            msg_id (str): 消息的msg_id
+            md5 (str, optional): 视频的md5，从xml获取
+            total_len (int, optional): 视频大小（字节），从xml的length获取，为0时不分段
+            progress (Callable[[int, int], Any], optional): 进度回调，参数是(已下载字节数, 总字节数)，可以是协程函数
+
+        Returns:
+            MediaFile: 视频内容，可以逐块读取、转换为base64或保存到文件
+
         Raises:
             UserLoggedOut: 未登录时调用
             根据error_handler处理错误
@@ -109,15 +168,48 @@ class ToolMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
-            json_param = {"Wxid": self.wxid, "MsgId": msg_id}
-            response = await session.post(f'http://{self.ip}:{self.port}/DownloadVideo', json=json_param)
-            json_resp = await response.json()
-
-            if json_resp.get("Success"):
-                return json_resp.get("Data").get("data").get("buffer")
-            else:
-                self.error_handler(json_resp)
+        json_param = {"Wxid": self.wxid, "MsgId": msg_id}
+        # msg_id 每条消息都不同，只有 md5 能认出转发的同一个视频
+        return await self._fetch_media_file(media_keys(video=f"{msg_id}", video_md5=md5),
+                                            "DownloadVideo", json_param, total_len, progress)
+
+    async def _fetch_media_file(self, keys, endpoint: str, json_param: dict, total_len: int,
+                                progress: ProgressCallback) -> Optional[MediaFile]:
+        """先查媒体缓存，没有时下载"""
+        downloaded = False
+
+        async def download():
+            nonlocal downloaded
+            downloaded = True
+            return await self._download_media_file(endpoint, json_param, total_len, progress)
+
+        media = await self.media_store.fetch_file(keys, download)
+        if media is not None and not downloaded:
+            # 命中缓存或者等待了其他调用的下载，进度回调还没有被调用过
+            await report_progress(progress, media.size, media.size)
+        return media
+
+    async def _download_media_file(self, endpoint: str, json_param: dict, total_len: int = 0,
+                                   progress: ProgressCallback = None) -> Optional[MediaFile]:
+        """请求下载接口，把响应中 Data.data.buffer 的 base64 逐块解码写入 MediaFile，大文件分段下载"""
+        url = f'http://{self.ip}:{self.port}/{endpoint}'
+        async with self._http_session() as session:
+            async def download_whole() -> Optional[MediaFile]:
+                async with session.post(url, json=json_param) as response:
+                    whole, json_resp = await read_json_media(response, "buffer")
+                if whole is None and not json_resp.get("Success"):
+                    self.error_handler(json_resp)
+                return whole
+
+            if self.segmented_downloader.should_split(endpoint, total_len):
+                # 服务端不接受分段参数时改用 download_whole
+                return await download_sections(session, url, json_param, total_len, self.segmented_downloader,
+                                               progress, download_whole)
+            media = await download_whole()
+
+        if media is not None:
+            await report_progress(progress, media.size, media.size)
+        return media
 
     async def set_step(self, count: int) -> bool:
         """设置步数。
@@ -138,7 +230,7 @@ class ToolMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid, "StepCount": count}
             response = await session.post(f'http://{self.ip}:{self.port}/SetStep', json=json_param)
             json_resp = await response.json()
@@ -164,7 +256,7 @@ class ToolMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             json_param = {"Wxid": self.wxid,
                           "Proxy": {"ProxyIp": f"{proxy.ip}:{proxy.port}",
                                     "ProxyUser": proxy.username,
@@ -183,7 +275,7 @@ class ToolMixin(WechatAPIClientBase):
         Returns:
             bool: 数据库正常返回True，否则返回False
         """
-        async with aiohttp.ClientSession() as session:
+        async with self._http_session() as session:
             response = await session.get(f'http://{self.ip}:{self.port}/CheckDatabaseOK')
             json_resp = await response.json()
 
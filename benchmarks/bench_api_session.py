@@ -0,0 +1,79 @@
+"""WechatAPI 客户端 HTTP 会话基准测试
+
+在本地启动一个模拟 WechatAPI 的 aiohttp 服务器，对比每个请求新建 ClientSession（旧实现）和共享连接池会话的每秒请求数。
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_api_session.py --requests 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WechatAPI.Client import WechatAPIClient  # noqa: E402
+
+
+async def handle_check_database(request: web.Request):
+    return web.json_response({"Running": True})
+
+
+async def start_stub_server() -> tuple[web.AppRunner, int]:
+    app = web.Application()
+    app.router.add_get("/CheckDatabaseOK", handle_check_database)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, port
+
+
+async def fresh_session_request(port: int):
+    # 旧实现：每个请求新建并关闭一个 ClientSession
+    async with aiohttp.ClientSession() as session:
+        response = await session.get(f'http://127.0.0.1:{port}/CheckDatabaseOK')
+        json_resp = await response.json()
+        return json_resp.get("Running")
+
+
+async def run(request_func, total: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            assert await request_func()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    runner, port = await start_stub_server()
+    client = WechatAPIClient("127.0.0.1", port)
+    try:
+        before = await run(lambda: fresh_session_request(port), args.requests, args.concurrency)
+        after = await run(client.check_database, args.requests, args.concurrency)
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+    print(f"请求数: {args.requests}  并发: {args.concurrency}")
+    print(f"每个请求新建会话: {before:10.1f} 请求/秒")
+    print(f"    共享连接池会话: {after:10.1f} 请求/秒")
+    print(f"提升 {after / before:.2f} 倍")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
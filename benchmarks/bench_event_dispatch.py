@@ -0,0 +1,89 @@
+"""EventManager.emit 消息分发基准测试
+
+对比旧的逐处理函数深拷贝和写时复制消息视图，分发一条带几MB base64内容的图片消息时的耗时和内存峰值。
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_event_dispatch.py --handlers 10 --size-mb 5
+"""
+import argparse
+import asyncio
+import base64
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.event_manager import EventManager  # noqa: E402
+
+
+class DummyPlugin:
+    def __init__(self, deepcopy_message: bool, mutate: bool):
+        self.deepcopy_message = deepcopy_message
+        self.mutate = mutate
+
+    async def handle_image(self, bot, message):
+        if self.mutate:
+            message["Handled"] = True
+        return len(message["Content"]) > 0
+
+
+def build_message(size_mb: float) -> dict:
+    raw = os.urandom(int(size_mb * 1024 * 1024))
+    return {
+        "MsgId": 123456789,
+        "ToWxid": "wxid_00000000000000",
+        "MsgType": 3,
+        "Content": base64.b64encode(raw).decode(),
+        "ImgBuf": {"iLen": 0},
+        "MsgSource": "<msgsource></msgsource>",
+        "FromWxid": "123456789@chatroom",
+        "SenderWxid": "wxid_11111111111111",
+        "IsGroup": True,
+    }
+
+
+def setup_handlers(count: int, deepcopy_message: bool):
+    EventManager._handlers.clear()
+    for i in range(count):
+        plugin = DummyPlugin(deepcopy_message, mutate=i % 2 == 0)
+        setattr(plugin.handle_image.__func__, "_event_type", "image_message")
+        EventManager.bind_instance(plugin)
+
+
+async def measure(message: dict, rounds: int):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await EventManager.emit("image_message", None, message)
+    elapsed = (time.perf_counter() - start) / rounds
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--handlers", type=int, default=10)
+    parser.add_argument("--size-mb", type=float, default=5)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    message = build_message(args.size_mb)
+    print(f"图片消息 Content 长度: {len(message['Content']) / 1024 / 1024:.1f}MB  处理函数数量: {args.handlers}")
+
+    results = {}
+    for name, deepcopy_message in (("deepcopy", True), ("view", False)):
+        setup_handlers(args.handlers, deepcopy_message)
+        results[name] = await measure(message, args.rounds)
+        elapsed, peak = results[name]
+        print(f"{name:>8}: 每条消息 {elapsed * 1000:8.2f}ms  内存峰值 {peak / 1024 / 1024:8.2f}MB")
+
+    (old_time, old_peak), (new_time, new_peak) = results["deepcopy"], results["view"]
+    print(f"每条消息节省 {(old_time - new_time) * 1000:.2f}ms, 内存峰值节省 {(old_peak - new_peak) / 1024 / 1024:.2f}MB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""群积分排行榜查询基准测试
+
+对比群排行榜逐个成员查询积分（旧实现）和 get_points_many 批量查询所需的时间。测试时关闭用户缓存，只比较数据库查询。
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_group_points.py --sizes 500 2000 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger  # noqa: E402
+
+from database.XYBotDB import User, XYBotDB  # noqa: E402
+
+
+def seed(db: XYBotDB, count: int):
+    # 一半成员有积分，另一半不在数据库中
+    with db.DBSession() as session:
+        session.add_all(User(wxid=f"wxid_{index}", points=index) for index in range(0, count, 2))
+        session.commit()
+
+
+async def per_member_sync(db: XYBotDB, wxids: list) -> dict:
+    # 旧实现：每个成员调用一次同步的 get_points
+    return {wxid: db.get_points(wxid) for wxid in wxids}
+
+
+async def per_member_async(db: XYBotDB, wxids: list) -> dict:
+    return {wxid: await db.get_points_async(wxid) for wxid in wxids}
+
+
+async def bulk_async(db: XYBotDB, wxids: list) -> dict:
+    return await db.get_points_many_async(wxids)
+
+
+async def measure(query, db: XYBotDB, wxids: list, rounds: int) -> float:
+    """返回平均每次查询整个群所需的毫秒数"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await query(db, wxids)
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000], help="群成员数")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    logger.remove()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # XYBotDB 从当前目录的 main_config.toml 读取设置，在临时目录中使用临时数据库
+        os.chdir(workdir)
+        with open("main_config.toml", "w", encoding="utf-8") as f:
+            f.write("[XYBot]\n"
+                    f'XYBotDB-url = "sqlite:///{workdir}/xybot.db"\n'
+                    "XYBotDB-cache = false\n")
+
+        db = XYBotDB()
+        seed(db, max(args.sizes))
+        try:
+            for size in args.sizes:
+                wxids = [f"wxid_{index}" for index in range(size)]
+                assert await bulk_async(db, wxids) == await per_member_sync(db, wxids)
+
+                sync_ms = await measure(per_member_sync, db, wxids, args.rounds)
+                async_ms = await measure(per_member_async, db, wxids, args.rounds)
+                bulk_ms = await measure(bulk_async, db, wxids, args.rounds)
+                print(f"群成员 {size}:")
+                print(f"  逐个查询（同步）: {sync_ms:10.1f} 毫秒")
+                print(f"  逐个查询（异步）: {async_ms:10.1f} 毫秒")
+                print(f"  批量查询:         {bulk_ms:10.1f} 毫秒  比逐个查询（同步）快 {sync_ms / bulk_ms:.1f} 倍")
+        finally:
+            await db.close()
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""KeyvalDB 计数器基准测试
+
+多个协程同时给同一个计数器加1，对比三种写法的吞吐量和最终结果是否正确：
+
+- get + set: 旧写法，先读出来加1再写回去，并发时会丢失计数
+- incr: 一条 INSERT ... ON CONFLICT DO UPDATE 语句原子地加1
+- pipeline: 每个协程把多次 incr 放在一个事务中执行
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_keyval_counter.py --concurrency 20 --increments 50
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.keyvalDB import KeyvalDB  # noqa: E402
+
+
+async def get_then_set(db: KeyvalDB, key: str, increments: int):
+    for _ in range(increments):
+        value = await db.get(key)
+        await db.set(key, str(int(value or 0) + 1))
+
+
+async def atomic_incr(db: KeyvalDB, key: str, increments: int):
+    for _ in range(increments):
+        await db.incr(key)
+
+
+async def pipelined_incr(db: KeyvalDB, key: str, increments: int):
+    async with db.pipeline() as pipe:
+        for _ in range(increments):
+            pipe.incr(key)
+
+
+async def measure(counter, db: KeyvalDB, key: str, concurrency: int, increments: int) -> tuple[float, int]:
+    start = time.perf_counter()
+    await asyncio.gather(*(counter(db, key, increments) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return concurrency * increments / elapsed, int(await db.get(key) or 0)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--increments", type=int, default=50, help="每个协程加1的次数")
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)  # get + set 并发写入时会打印大量“数据库被锁定”的错误
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # KeyvalDB 从当前目录的 main_config.toml 读取设置，在临时目录中使用临时数据库
+        os.chdir(workdir)
+        with open("main_config.toml", "w", encoding="utf-8") as f:
+            f.write("[XYBot]\n"
+                    f'keyvalDB-url = "sqlite+aiosqlite:///{workdir}/keyval.db"\n')
+
+        db = KeyvalDB()
+        await db.initialize()
+        try:
+            results = [(name, *await measure(counter, db, name, args.concurrency, args.increments))
+                       for name, counter in (("get + set", get_then_set),
+                                             ("incr", atomic_incr),
+                                             ("pipeline", pipelined_incr))]
+        finally:
+            await db.close()
+
+    expected = args.concurrency * args.increments
+    print(f"并发: {args.concurrency}  每个协程加1: {args.increments} 次  期望结果: {expected}")
+    for name, ops, value in results:
+        print(f"{name:>10}: {ops:10.1f} 次/秒  结果 {value:6d}  丢失 {expected - value} 次")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""媒体缓存基准测试
+
+模拟群里反复转发的图片：每条消息从一批图片中按热度随机挑一张，下载函数按延迟和带宽模拟 WechatAPI 的 CdnDownloadImg。
+对比不用缓存每次都下载和 MediaStore 命中时从磁盘 mmap 读取的总耗时、下载次数和下载量。
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_media_store.py --messages 2000 --images 200 --size-kb 300 --latency-ms 150
+"""
+import argparse
+import asyncio
+import base64
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WechatAPI.Client.media_store import MediaStore, media_keys  # noqa: E402
+
+
+class FakeCdn:
+    """模拟下载接口，返回 base64 字符串"""
+
+    def __init__(self, images: int, size: int, latency: float, bandwidth: float):
+        rng = random.Random(1)
+        self.images = [base64.b64encode(rng.randbytes(size)).decode() for _ in range(images)]
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.downloads = 0
+        self.bytes = 0
+
+    async def download(self, index: int) -> str:
+        data = self.images[index]
+        await asyncio.sleep(self.latency + len(data) / self.bandwidth)
+        self.downloads += 1
+        self.bytes += len(data)
+        return data
+
+
+async def run(cdn: FakeCdn, picks: list, concurrency: int, store: MediaStore = None) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def handle(index: int):
+        async with semaphore:
+            if store is None:
+                return await cdn.download(index)
+            # 转发的图片 aeskey 相同
+            return await store.fetch_base64(media_keys(aeskey=f"key{index}"), lambda: cdn.download(index))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(handle(index) for index in picks))
+    elapsed = time.perf_counter() - start
+    assert all(result == cdn.images[index] for result, index in zip(results, picks))
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--bandwidth-mb", type=float, default=20, help="模拟下载带宽（MB/秒）")
+    parser.add_argument("--concurrency", type=int, default=16, help="同时处理的消息数")
+    parser.add_argument("--cache-mb", type=int, default=1024)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    # 少数热门图片被转发得最多
+    weights = [1 / (rank + 1) for rank in range(args.images)]
+    picks = rng.choices(range(args.images), weights=weights, k=args.messages)
+
+    print(f"消息数: {args.messages}  图片数: {args.images}  每张: {args.size_kb} KB  "
+          f"延迟: {args.latency_ms} ms  带宽: {args.bandwidth_mb} MB/s")
+    print(f"{'':<10}{'总耗时 秒':>10}{'下载次数':>10}{'下载 MB':>10}{'命中率':>8}")
+
+    cdn = FakeCdn(args.images, args.size_kb * 1024, args.latency_ms / 1000, args.bandwidth_mb * 1024 * 1024)
+    elapsed = await run(cdn, picks, args.concurrency)
+    print(f"{'不用缓存':<10}{elapsed:10.2f}{cdn.downloads:10}{cdn.bytes / 1024 / 1024:10.1f}{'-':>8}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = MediaStore()
+        store.configure(workdir, args.cache_mb * 1024 * 1024)
+        cdn.downloads = cdn.bytes = 0
+        elapsed = await run(cdn, picks, args.concurrency, store)
+        metrics = store.get_metrics()
+        print(f"{'媒体缓存':<10}{elapsed:10.2f}{cdn.downloads:10}{cdn.bytes / 1024 / 1024:10.1f}"
+              f"{metrics['hit_rate']:8.1%}")
+        print(f"命中 {metrics['hits']} 次，省下 {metrics['bytes_saved'] / 1024 / 1024:.1f} MB，"
+              f"共享同时进行的下载 {metrics['shared_downloads']} 次")
+        store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
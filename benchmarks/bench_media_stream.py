@@ -0,0 +1,133 @@
+"""大文件下载上传内存基准测试
+
+启动一个本地的 WechatAPI 替身服务，像 DownloadAttach 一样把文件以 base64 放在 JSON 中返回，上传接口接收 JSON 后丢弃。
+每种方式在单独的子进程中运行，对比峰值内存（RSS）的增长：
+
+- 旧的下载：response.json() 后取出 base64 字符串，再 base64_to_byte
+- 流式下载：read_json_media 边下载边解码写入 MediaFile
+- 旧的上传：整个文件读进内存编码为 base64，json= 发送
+- 流式上传：json_media_body 从文件逐块编码发送
+
+用法（在项目根目录运行，只支持 Linux/macOS）:
+    python benchmarks/bench_media_stream.py --size-mb 100
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from WechatAPI.Client.media_stream import json_media_body, read_json_media  # noqa: E402
+
+PORT = 18765
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是 KB，macOS 上是字节
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+async def serve(path: str):
+    """替身服务，从文件逐块编码返回，服务进程自己的内存不影响测试"""
+
+    async def download(request):
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await response.prepare(request)
+        await response.write(b'{"Code":0,"Success":true,"Message":"","Data":{"data":{"buffer":"')
+        with open(path, "rb") as f:
+            while data := f.read(3 * 256 * 1024):
+                await response.write(base64.b64encode(data))
+        await response.write(b'"}}}')
+        return response
+
+    async def upload(request):
+        size = 0
+        async for data in request.content.iter_chunked(1 << 20):
+            size += len(data)
+        return web.json_response({"Success": True, "Data": {"size": size}})
+
+    app = web.Application()
+    app.router.add_post("/DownloadAttach", download)
+    app.router.add_post("/SendVideoMsg", upload)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+    print("ready", flush=True)
+    await asyncio.Event().wait()
+
+
+async def client(mode: str, path: str) -> dict:
+    url = f"http://127.0.0.1:{PORT}"
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        if mode == "download-old":
+            async with session.post(f"{url}/DownloadAttach", json={"AttachId": "x"}) as response:
+                json_resp = await response.json()
+            data = base64.b64decode(json_resp.get("Data").get("data").get("buffer"))
+            size = len(data)
+        elif mode == "download-new":
+            async with session.post(f"{url}/DownloadAttach", json={"AttachId": "x"}) as response:
+                media, _ = await read_json_media(response)
+            size = sum(len(chunk) for chunk in media.chunks())
+        elif mode == "upload-old":
+            with open(path, "rb") as f:
+                vid_base64 = base64.b64encode(f.read()).decode()
+            async with session.post(f"{url}/SendVideoMsg", json={"Wxid": "x", "Base64": vid_base64}) as response:
+                size = (await response.json())["Data"]["size"]
+        else:
+            async with session.post(f"{url}/SendVideoMsg", data=json_media_body({"Wxid": "x"}, Base64=Path(path)),
+                                    headers={"Content-Type": "application/json"}) as response:
+                size = (await response.json())["Data"]["size"]
+    return {"mode": mode, "seconds": time.perf_counter() - start, "peak_mb": peak_rss_mb() - baseline, "size": size}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=100)
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--client", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        asyncio.run(serve(args.serve))
+        return
+    if args.client:
+        print(json.dumps(asyncio.run(client(*args.client))))
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "attachment.bin")
+        with open(path, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        server = subprocess.Popen([sys.executable, __file__, "--serve", path], stdout=subprocess.PIPE, text=True)
+        try:
+            server.stdout.readline()
+            print(f"文件大小: {args.size_mb} MB")
+            print(f"{'方式':<16}{'耗时 秒':>10}{'峰值内存增长 MB':>18}")
+            for mode in ("download-old", "download-new", "upload-old", "upload-new"):
+                output = subprocess.run([sys.executable, __file__, "--client", mode, path],
+                                        capture_output=True, text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{mode:<16}{result['seconds']:10.2f}{result['peak_mb']:18.1f}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
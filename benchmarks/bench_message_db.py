@@ -0,0 +1,80 @@
+"""MessageDB 写入基准测试
+
+对比旧的每条消息一个事务（一次提交）和写缓冲批量写入，每秒能保存多少条消息。
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_message_db.py --messages 5000 --batch-size 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.messsagDB import Message, MessageDB  # noqa: E402
+
+
+async def save_per_row(db: MessageDB, index: int):
+    # 旧实现：每条消息打开一个会话，插入一行并提交
+    async with db._async_session_factory() as session:
+        session.add(Message(
+            msg_id=index,
+            sender_wxid="wxid_sender",
+            from_wxid="123456@chatroom",
+            msg_type=1,
+            content=f"测试消息 {index}",
+            is_group=True,
+            timestamp=datetime.now(),
+        ))
+        await session.commit()
+
+
+async def save_buffered(db: MessageDB, index: int):
+    await db.save_message(msg_id=index, sender_wxid="wxid_sender", from_wxid="123456@chatroom",
+                          msg_type=1, content=f"测试消息 {index}", is_group=True)
+
+
+async def measure(save, db: MessageDB, count: int) -> float:
+    start = time.perf_counter()
+    for index in range(count):
+        await save(db, index)
+    await db.flush()
+    return count / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--flush-interval", type=int, default=500, help="毫秒")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # MessageDB 从当前目录的 main_config.toml 读取设置，在临时目录中使用临时数据库
+        os.chdir(workdir)
+        with open("main_config.toml", "w", encoding="utf-8") as f:
+            f.write("[XYBot]\n"
+                    f'msgDB-url = "sqlite+aiosqlite:///{workdir}/message.db"\n'
+                    f"msgDB-batch-size = {args.batch_size}\n"
+                    f"msgDB-flush-interval = {args.flush_interval}\n")
+
+        db = MessageDB()
+        await db.initialize()
+        try:
+            per_row = await measure(save_per_row, db, args.messages)
+            buffered = await measure(save_buffered, db, args.messages)
+        finally:
+            await db.close()
+
+    print(f"消息数: {args.messages}  每批: {args.batch_size}")
+    print(f"逐条提交: {per_row:10.1f} 条/秒")
+    print(f"批量写入: {buffered:10.1f} 条/秒")
+    print(f"提升 {buffered / per_row:.1f} 倍")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""消息记录分页基准测试
+
+读取一个会话不同深度的一页消息记录，对比旧的单列索引 + LIMIT/OFFSET、组合索引 + LIMIT/OFFSET
+和组合索引 + get_message_page 按 before_id 翻页的耗时。
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_message_history.py --messages 1000000 --chats 5 --page-size 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from database.messsagDB import Message, MessageDB  # noqa: E402
+
+CHAT = "0@chatroom"
+
+
+async def populate(db: MessageDB, count: int, chats: int):
+    start_time = datetime.now() - timedelta(days=3)
+    async with db._async_session_factory() as session:
+        for offset in range(0, count, 10000):
+            await session.execute(insert(Message), [
+                dict(msg_id=index, sender_wxid=f"wxid_{index % 500}", from_wxid=f"{index % chats}@chatroom",
+                     msg_type=1, content=f"测试消息 {index}", is_group=True,
+                     timestamp=start_time + timedelta(milliseconds=index * 100))
+                for index in range(offset, min(offset + 10000, count))
+            ])
+        await session.commit()
+
+
+async def offset_page(db: MessageDB, page: int, page_size: int) -> list:
+    # 旧实现：按时间倒序，用 OFFSET 跳过前面的页
+    async with db._async_session_factory() as session:
+        result = await session.execute(
+            select(Message).where(Message.from_wxid == CHAT).order_by(Message.timestamp.desc(), Message.id.desc())
+            .limit(page_size).offset(page * page_size))
+        return result.scalars().all()
+
+
+async def timed(func, repeat: int = 3) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--chats", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # MessageDB 从当前目录的 main_config.toml 读取设置，在临时目录中使用临时数据库
+        os.chdir(workdir)
+        with open("main_config.toml", "w", encoding="utf-8") as f:
+            f.write("[XYBot]\n"
+                    f'msgDB-url = "sqlite+aiosqlite:///{workdir}/message.db"\n'
+                    "msgDB-fts = false\n")
+
+        db = MessageDB()
+        await db.initialize()
+        try:
+            await populate(db, args.messages, args.chats)
+            print(f"消息数: {args.messages}  会话数: {args.chats}  每页: {args.page_size}")
+
+            pages = [0, 10, 100, 1000, 3000]
+            # 每一页的 before_id 是上一页最后一条消息的 id
+            cursors = {page: (await offset_page(db, page - 1, args.page_size))[-1].id if page else None
+                       for page in pages}
+            results = {page: {} for page in pages}
+
+            # 换成旧的单列索引
+            async with db.engine.begin() as conn:
+                await conn.exec_driver_sql("DROP INDEX ix_messages_from_wxid_timestamp")
+                await conn.exec_driver_sql("CREATE INDEX ix_messages_from_wxid ON messages (from_wxid)")
+                await conn.exec_driver_sql("ANALYZE")
+            for page in pages:
+                results[page]["old"] = await timed(lambda: offset_page(db, page, args.page_size))
+
+            await db.initialize()  # 重新创建组合索引，删除单列索引
+            async with db.engine.begin() as conn:
+                await conn.exec_driver_sql("ANALYZE")
+            for page in pages:
+                results[page]["offset"] = await timed(lambda: offset_page(db, page, args.page_size))
+                results[page]["keyset"] = await timed(
+                    lambda: db.get_message_page(from_wxid=CHAT, before_id=cursors[page], limit=args.page_size))
+
+            print(f"{'页':>6}{'单列索引+OFFSET':>18}{'组合索引+OFFSET':>18}{'组合索引+before_id':>20}  (毫秒)")
+            for page in pages:
+                r = results[page]
+                print(f"{page:>6}{r['old']:>18.2f}{r['offset']:>18.2f}{r['keyset']:>20.2f}")
+        finally:
+            await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""消息保留策略基准测试
+
+对比旧的一次 DELETE 删除全部过期消息和分批删除，删除过程中另一个任务每 10 毫秒写入一条消息，
+统计写入的最长等待时间，也就是清理造成的卡顿。
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_message_retention.py --messages 500000 --batch-size 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, func, insert, select  # noqa: E402
+
+from database.message_retention import MessageRetention  # noqa: E402
+from database.messsagDB import Message, MessageDB  # noqa: E402
+
+
+async def populate(db: MessageDB, count: int):
+    # 过期消息，时间从 10 天前开始递增
+    start = datetime.now() - timedelta(days=10)
+    async with db._async_session_factory() as session:
+        for offset in range(0, count, 10000):
+            await session.execute(insert(Message), [
+                dict(msg_id=index, sender_wxid="wxid_sender", from_wxid=f"{index % 50}@chatroom", msg_type=1,
+                     content=f"测试消息 {index}", is_group=True, timestamp=start + timedelta(milliseconds=index))
+                for index in range(offset, min(offset + 10000, count))
+            ])
+        await session.commit()
+
+
+async def writer(db: MessageDB, latencies: list, stop: asyncio.Event):
+    index = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        async with db._async_session_factory() as session:
+            session.add(Message(msg_id=index, sender_wxid="wxid_sender", from_wxid="writer@chatroom", msg_type=1,
+                                content="新消息", is_group=True, timestamp=datetime.now()))
+            await session.commit()
+        latencies.append(time.perf_counter() - start)
+        index += 1
+        await asyncio.sleep(0.01)
+
+
+async def single_delete(db: MessageDB):
+    # 旧实现：一条 DELETE 删除所有过期消息
+    async with db._async_session_factory() as session:
+        await session.execute(delete(Message).where(Message.timestamp < datetime.now() - timedelta(days=3)))
+        await session.commit()
+
+
+async def batched_delete(db: MessageDB, config: dict):
+    retention = MessageRetention(db, config)
+    while await retention.run_once():
+        pass
+
+
+async def measure(db: MessageDB, cleanup) -> tuple:
+    latencies = []
+    stop = asyncio.Event()
+    task = asyncio.create_task(writer(db, latencies, stop))
+    await asyncio.sleep(0.1)
+    start = time.perf_counter()
+    await cleanup()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await task
+
+    async with db._async_session_factory() as session:
+        remaining = (await session.execute(
+            select(func.count()).where(Message.from_wxid != "writer@chatroom"))).scalar()
+    assert remaining == 0, remaining
+    return elapsed, max(latencies) * 1000, len(latencies)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500000)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+    config = {"default-days": 3, "batch-size": args.batch_size, "max-batches": 50}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # MessageDB 从当前目录的 main_config.toml 读取设置，在临时目录中使用临时数据库
+        os.chdir(workdir)
+        with open("main_config.toml", "w", encoding="utf-8") as f:
+            f.write("[XYBot]\n"
+                    f'msgDB-url = "sqlite+aiosqlite:///{workdir}/message.db"\n')
+
+        db = MessageDB()
+        await db.initialize()
+        try:
+            await populate(db, args.messages)
+            single = await measure(db, lambda: single_delete(db))
+            await populate(db, args.messages)
+            batched = await measure(db, lambda: batched_delete(db, config))
+        finally:
+            await db.close()
+
+    print(f"过期消息数: {args.messages}  每批: {args.batch_size}")
+    for name, (elapsed, worst, writes) in (("一次删除", single), ("分批删除", batched)):
+        print(f"{name}: 耗时 {elapsed:7.2f} 秒  写入最长等待 {worst:8.1f} 毫秒  期间写入 {writes} 条")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""消息全文搜索基准测试
+
+生成一个随机中文消息库，对比 LIKE '%关键词%' 逐行查找和 search_messages 使用 FTS5 全文索引的查询耗时。
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_message_search.py --messages 2000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from database.messsagDB import Message, MessageDB  # noqa: E402
+
+CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处理"
+RARE = "量子纠缠实验"  # 只出现在少量消息中的词
+COMMON = "机器人"  # 出现在 2% 消息中的词
+
+
+def random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(CHARS) for _ in range(rng.randint(5, 40)))
+
+
+async def populate(db: MessageDB, count: int, chats: int) -> float:
+    rng = random.Random(42)
+    start_time = datetime.now() - timedelta(days=3)
+    start = time.perf_counter()
+    async with db._async_session_factory() as session:
+        for offset in range(0, count, 10000):
+            rows = []
+            for index in range(offset, min(offset + 10000, count)):
+                content = random_text(rng)
+                if index % 20000 == 0:
+                    content += RARE
+                if index % 50 == 1:
+                    content = COMMON + content
+                rows.append(dict(msg_id=index, sender_wxid=f"wxid_{index % 500}",
+                                 from_wxid=f"{index % chats}@chatroom", msg_type=1, content=content,
+                                 is_group=True, timestamp=start_time + timedelta(milliseconds=index * 100)))
+            await session.execute(insert(Message), rows)
+            await session.commit()
+    return count / (time.perf_counter() - start)
+
+
+async def like_search(db: MessageDB, term: str, from_wxid: str, limit: int):
+    # 没有全文索引时只能逐行查找
+    async with db._async_session_factory() as session:
+        stmt = select(Message).where(Message.content.like(f"%{term}%"))
+        if from_wxid:
+            stmt = stmt.where(Message.from_wxid == from_wxid)
+        result = await session.execute(stmt.order_by(Message.timestamp.desc()).limit(limit))
+        return result.scalars().all()
+
+
+async def timed(func, repeat: int) -> tuple:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = await func()
+    return (time.perf_counter() - start) / repeat * 1000, len(result)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # MessageDB 从当前目录的 main_config.toml 读取设置，在临时目录中使用临时数据库
+        os.chdir(workdir)
+        with open("main_config.toml", "w", encoding="utf-8") as f:
+            f.write("[XYBot]\n"
+                    f'msgDB-url = "sqlite+aiosqlite:///{workdir}/message.db"\n')
+
+        db = MessageDB()
+        await db.initialize()
+        try:
+            rate = await populate(db, args.messages, args.chats)
+            print(f"消息数: {args.messages}  写入（含全文索引）: {rate:.0f} 条/秒")
+            print(f"{'关键词':<12}{'会话':<12}{'LIKE 毫秒':>10}{'FTS 相关度':>12}{'FTS 时间':>10}{'结果数':>8}")
+            for term, chat in ((RARE, None), (COMMON, None), ("我们", None), (RARE, "0@chatroom")):
+                like_ms, _ = await timed(lambda: like_search(db, term, chat, args.limit), args.repeat)
+                rank_ms, found = await timed(lambda: db.search_messages(term, from_wxid=chat, limit=args.limit),
+                                             args.repeat)
+                time_ms, _ = await timed(lambda: db.search_messages(term, from_wxid=chat, limit=args.limit,
+                                                                    order_by_time=True), args.repeat)
+                print(f"{term:<12}{chat or '全部':<12}{like_ms:10.1f}{rank_ms:12.1f}{time_ms:10.1f}{found:8}")
+        finally:
+            await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
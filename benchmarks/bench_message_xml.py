@@ -0,0 +1,177 @@
+"""消息 XML 解析基准测试
+
+用录制的引用消息、文件消息、进群系统消息、拍一拍和文本消息 MsgSource，对比旧的处理方式
+（每个处理步骤各自 ET.fromstring，引用消息一次提取全部字段）和 utils/message_xml 的解析一次、按需提取。
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_message_xml.py --number 20000
+"""
+import argparse
+import os
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.message_xml import AppMsgXml, MsgSourceXml, SysMsgXml  # noqa: E402
+
+QUOTED = ('<msg><appmsg appid="" sdkver="0"><title>周末一起去爬山吗</title><des>周六早上八点集合</des><action>view</action>'
+          '<type>5</type><showtype>0</showtype><soundtype>0</soundtype><url>https://mp.weixin.qq.com/s/abcdef</url>'
+          '<lowurl></lowurl><dataurl></dataurl><lowdataurl></lowdataurl><appattach><totallen>0</totallen>'
+          '<attachid></attachid><emoticonmd5></emoticonmd5><fileext></fileext><cdnthumbaeskey>3a5f</cdnthumbaeskey>'
+          '<aeskey>9b1c</aeskey></appattach><extinfo></extinfo><sourceusername>gh_123</sourceusername>'
+          '<sourcedisplayname>公众号</sourcedisplayname><thumburl>https://mmbiz.qpic.cn/thumb</thumburl>'
+          '<md5></md5><statextstr></statextstr><directshare>0</directshare></appmsg>'
+          '<fromusername>wxid_a</fromusername><scene>0</scene></msg>')
+
+QUOTE = ('<msg><appmsg appid="" sdkver="0"><title>好啊，我也去</title><des></des><action></action><type>57</type>'
+         '<showtype>0</showtype><soundtype>0</soundtype><url></url><appattach><cdnthumbaeskey/><aeskey/></appattach>'
+         '<refermsg><type>49</type><svrid>8123456789012345678</svrid><fromusr>12345678@chatroom</fromusr>'
+         '<chatusr>wxid_a</chatusr><displayname>小明</displayname>'
+         '<msgsource>&lt;msgsource&gt;&lt;silence&gt;0&lt;/silence&gt;&lt;/msgsource&gt;</msgsource>'
+         '<content>' + escape(QUOTED) + '</content><createtime>1700000000</createtime></refermsg></appmsg>'
+         '<fromusername>wxid_b</fromusername><scene>0</scene><appinfo><version>1</version><appname></appname>'
+         '</appinfo><commenturl></commenturl></msg>')
+
+FILE = ('<msg><appmsg appid="" sdkver="0"><title>季度报告.pdf</title><des></des><action>view</action><type>6</type>'
+        '<showtype>0</showtype><url></url><appattach><totallen>1048576</totallen><attachid>@cdn_3057020100_abcdef'
+        '</attachid><emoticonmd5></emoticonmd5><fileext>pdf</fileext><cdnattachurl>3057020100</cdnattachurl>'
+        '<aeskey>0f1e2d</aeskey><encryver>1</encryver></appattach><md5>d41d8cd98f00b204e9800998ecf8427e</md5>'
+        '</appmsg><fromusername>wxid_a</fromusername></msg>')
+
+SYSMSG = ('<sysmsg type="sysmsgtemplate"><sysmsgtemplate><content_template type="tmpl_type_profile">'
+          '<plain><![CDATA[]]></plain><template><![CDATA["$username$"邀请"$names$"加入了群聊]]></template>'
+          '<link_list><link name="username" type="link_profile"><memberlist><member><username><![CDATA[wxid_x]]>'
+          '</username><nickname><![CDATA[甲]]></nickname></member></memberlist></link>'
+          '<link name="names" type="link_profile"><memberlist><member><username><![CDATA[wxid_y]]></username>'
+          '<nickname><![CDATA[乙]]></nickname></member></memberlist><separator><![CDATA[、]]></separator></link>'
+          '</link_list></content_template></sysmsgtemplate></sysmsg>')
+
+PAT = ('<sysmsg type="pat"><pat><fromusername>wxid_a</fromusername><chatusername>12345678@chatroom</chatusername>'
+       '<pattedusername>wxid_b</pattedusername><patsuffix><![CDATA[的脑袋]]></patsuffix>'
+       '<template><![CDATA["${wxid_a}" 拍了拍 "${wxid_b}"]]></template></pat></sysmsg>')
+
+MSGSOURCE = ('<msgsource><bizflag>0</bizflag><pua>1</pua><silence>0</silence><membercount>120</membercount>'
+             '<signature>V1_abcdefg|v1_abcdefg</signature><tmp_node><publisher-id></publisher-id></tmp_node></msgsource>')
+
+
+def text(element, default=""):
+    return element.text if isinstance(element, ET.Element) else default
+
+
+def old_quote():
+    # 旧实现：process_xml_message 解析一次取 type，process_quote_message 再解析一次并提取全部字段
+    root = ET.fromstring(QUOTE)
+    int(root.find("appmsg").find("type").text)
+    root = ET.fromstring(QUOTE)
+    appmsg = root.find("appmsg")
+    appmsg.find("title").text
+    refermsg = appmsg.find("refermsg")
+    quote = {"MsgType": int(refermsg.find("type").text)}
+    for key, tag in (("NewMsgId", "svrid"), ("ToWxid", "fromusr"), ("FromWxid", "chatusr"),
+                     ("Nickname", "displayname"), ("MsgSource", "msgsource"), ("Createtime", "createtime"),
+                     ("Content", "content")):
+        quote[key] = refermsg.find(tag).text
+    quote_appmsg = ET.fromstring(quote["Content"]).find("appmsg")
+    for key, tag in (("Content", "title"), ("destination", "des"), ("action", "action"), ("url", "url"),
+                     ("lowurl", "lowurl"), ("dataurl", "dataurl"), ("lowdataurl", "lowdataurl"),
+                     ("songlyric", "songlyric"), ("extinfo", "extinfo"), ("sourceusername", "sourceusername"),
+                     ("sourcedisplayname", "sourcedisplayname"), ("thumburl", "thumburl"), ("md5", "md5"),
+                     ("statextstr", "statextstr")):
+        quote[key] = text(quote_appmsg.find(tag))
+    for key in ("type", "showtype", "soundtype", "directshare"):
+        quote[key] = int(text(quote_appmsg.find(key), 0) or 0)
+    appattach = quote_appmsg.find("appattach")
+    quote["appattach"] = {key: text(appattach.find(key)) for key in
+                          ("totallen", "attachid", "emoticonmd5", "fileext", "cdnthumbaeskey", "aeskey")}
+    return quote
+
+
+def new_quote():
+    # 框架只读取 type、title 和被引用消息的类型，插件不读取引用内容
+    xml = AppMsgXml(QUOTE)
+    xml.type
+    xml.title
+    return xml.refermsg.MsgType
+
+
+def new_quote_read_content():
+    # 插件读取被引用消息的内容
+    xml = AppMsgXml(QUOTE)
+    xml.type
+    xml.title
+    return xml.refermsg["Content"]
+
+
+def old_file():
+    root = ET.fromstring(FILE)
+    int(root.find("appmsg").find("type").text)
+    root = ET.fromstring(FILE)
+    return (root.find("appmsg").find("title").text, root.find("appmsg").find("appattach").find("attachid").text,
+            root.find("appmsg").find("appattach").find("fileext").text)
+
+
+def new_file():
+    xml = AppMsgXml(FILE)
+    xml.type
+    return xml.title, xml.appattach.attachid, xml.appattach.fileext
+
+
+def old_sysmsg():
+    # 框架解析一次取 type，GroupWelcome 再解析一次
+    ET.fromstring(SYSMSG).attrib["type"]
+    root = ET.fromstring(SYSMSG.strip().replace("\n", "").replace("\t", ""))
+    return root.find("sysmsgtemplate").find("content_template").find("template").text
+
+
+def new_sysmsg():
+    xml = SysMsgXml(SYSMSG)
+    xml.type
+    return xml.root.find("sysmsgtemplate").find("content_template").find("template").text
+
+
+def old_pat():
+    ET.fromstring(PAT).attrib["type"]
+    pat = ET.fromstring(PAT).find("pat")
+    return pat.find("fromusername").text, pat.find("pattedusername").text, pat.find("patsuffix").text
+
+
+def new_pat():
+    xml = SysMsgXml(PAT)
+    xml.type
+    return xml.patter, xml.patted, xml.pat_suffix
+
+
+def old_msgsource():
+    root = ET.fromstring(MSGSOURCE)
+    return root.find("atuserlist").text if root.find("atuserlist") is not None else ""
+
+
+def new_msgsource():
+    return MsgSourceXml(MSGSOURCE).atuserlist
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    cases = [
+        ("引用消息", old_quote, new_quote),
+        ("引用消息（读取引用内容）", old_quote, new_quote_read_content),
+        ("文件消息", old_file, new_file),
+        ("进群消息 + GroupWelcome", old_sysmsg, new_sysmsg),
+        ("拍一拍", old_pat, new_pat),
+        ("文本消息 MsgSource", old_msgsource, new_msgsource),
+    ]
+    print(f"{'消息':<24}{'旧 微秒':>10}{'新 微秒':>10}{'加速':>8}")
+    for name, old, new in cases:
+        old_us = min(timeit.repeat(old, number=args.number, repeat=3)) / args.number * 1e6
+        new_us = min(timeit.repeat(new, number=args.number, repeat=3)) / args.number * 1e6
+        print(f"{name:<24}{old_us:10.2f}{new_us:10.2f}{old_us / new_us:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""分段并发下载基准测试
+
+启动一个本地的 WechatAPI 替身服务，DownloadAttach 按请求中的 Section 返回对应的数据段，没有 Section 时返回整个文件。
+每个请求先等待固定的延迟，再按单连接带宽限速返回，可以按比例随机返回错误，模拟微信 CDN 的慢速连接和偶发失败。
+对比一次请求下载整个文件和不同并发数的分段下载的吞吐量。
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_segmented_download.py --size-mb 50 --latency-ms 200 --bandwidth-mb 2 --fail-rate 0.05
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from WechatAPI.Client.media_stream import read_json_media  # noqa: E402
+from WechatAPI.Client.segmented_download import SegmentedDownloader, download_sections  # noqa: E402
+
+PORT = 18766
+
+
+def stand_in_server(data: bytes, latency: float, bandwidth: float, fail_rate: float) -> web.Application:
+    rng = random.Random(7)
+
+    async def download(request):
+        param = await request.json()
+        section = param.get("Section")
+        if section:
+            start = section["StartPos"]
+            part = data[start:start + section["DataLen"]]
+        else:
+            part = data
+
+        await asyncio.sleep(latency)
+        if rng.random() < fail_rate:
+            return web.json_response({"Code": -2, "Success": False, "Message": "模拟的下载失败", "Data": None})
+
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await response.prepare(request)
+        await response.write(b'{"Code":0,"Success":true,"Message":"","Data":{"data":{"buffer":"')
+        step = 3 * 64 * 1024
+        for offset in range(0, len(part), step):
+            chunk = part[offset:offset + step]
+            await response.write(base64.b64encode(chunk))
+            await asyncio.sleep(len(chunk) / bandwidth)  # 单个连接的带宽限制
+        await response.write(b'"}}}')
+        return response
+
+    app = web.Application()
+    app.router.add_post("/DownloadAttach", download)
+    return app
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--bandwidth-mb", type=float, default=2, help="单个连接的带宽（MB/秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.05, help="每个请求失败的概率")
+    parser.add_argument("--segment-kb", type=int, default=1024)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    data = os.urandom(args.size_mb * 1024 * 1024)
+    digest = hashlib.sha256(data).hexdigest()
+    runner = web.AppRunner(stand_in_server(data, args.latency_ms / 1000, args.bandwidth_mb * 1024 * 1024,
+                                           args.fail_rate))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+    url = f"http://127.0.0.1:{PORT}/DownloadAttach"
+    json_param = {"Wxid": "bench", "AttachId": "x"}
+
+    print(f"文件: {args.size_mb} MB  延迟: {args.latency_ms} ms  单连接带宽: {args.bandwidth_mb} MB/s  "
+          f"失败率: {args.fail_rate:.0%}  每段: {args.segment_kb} KB")
+    print(f"{'方式':<14}{'耗时 秒':>10}{'MB/秒':>10}{'请求数':>8}{'重试':>6}{'进度回调':>10}")
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=100)) as session:
+            # 一次请求下载整个文件，失败时整个文件重新下载
+            start = time.perf_counter()
+            attempts = 0
+            while True:
+                attempts += 1
+                async with session.post(url, json=json_param) as response:
+                    media, _ = await read_json_media(response)
+                if media is not None:
+                    break
+            elapsed = time.perf_counter() - start
+            assert hashlib.sha256(media.read()).hexdigest() == digest
+            media.close()
+            print(f"{'整个文件':<14}{elapsed:10.2f}{args.size_mb / elapsed:10.2f}{attempts:8}{attempts - 1:6}{'-':>10}")
+
+            for concurrency in args.concurrency:
+                downloader = SegmentedDownloader(segment_size=args.segment_kb * 1024, concurrency=concurrency,
+                                                 retries=5, min_size=0)
+                calls = 0
+
+                def progress(done: int, total: int):
+                    nonlocal calls
+                    calls += 1
+
+                start = time.perf_counter()
+                media = await download_sections(session, url, json_param, len(data), downloader, progress)
+                elapsed = time.perf_counter() - start
+                assert hashlib.sha256(media.read()).hexdigest() == digest
+                media.close()
+                metrics = downloader.get_metrics()
+                print(f"{f'分段 并发{concurrency}':<14}{elapsed:10.2f}{args.size_mb / elapsed:10.2f}"
+                      f"{metrics['segments'] + metrics['retried']:8}{metrics['retried']:6}{calls:10}")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
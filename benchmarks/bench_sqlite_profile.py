@@ -0,0 +1,88 @@
+"""SQLite 性能设置基准测试
+
+一个协程不停地逐条写入并提交，同时几个协程不停地读取，对比 SQLite 默认设置和 main_config.toml 中 [SQLite] 默认设置
+（WAL、synchronous=NORMAL 等）的写入吞吐量和读取延迟。
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_sqlite_profile.py --seconds 5 --readers 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from database.sqlite_profile import apply_sqlite_profile  # noqa: E402
+
+
+async def writer(engine, stop: asyncio.Event) -> int:
+    writes = 0
+    while not stop.is_set():
+        async with engine.begin() as conn:
+            await conn.execute(text("INSERT INTO points (wxid, points) VALUES (:wxid, :points)"),
+                               {"wxid": f"wxid_{writes % 1000}", "points": writes})
+        writes += 1
+    return writes
+
+
+async def reader(engine, stop: asyncio.Event, latencies: list):
+    index = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT SUM(points) FROM points WHERE wxid = :wxid"),
+                               {"wxid": f"wxid_{index % 1000}"})
+        latencies.append((time.perf_counter() - start) * 1000)
+        index += 1
+
+
+async def run(path: str, config: dict, seconds: float, readers: int) -> tuple[float, list]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=readers + 1, max_overflow=0)
+    apply_sqlite_profile(engine, config)
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE points (id INTEGER PRIMARY KEY, wxid TEXT, points INTEGER)"))
+        await conn.execute(text("CREATE INDEX ix_points_wxid ON points (wxid)"))
+
+    stop = asyncio.Event()
+    latencies = []
+    tasks = [asyncio.create_task(reader(engine, stop, latencies)) for _ in range(readers)]
+    write_task = asyncio.create_task(writer(engine, stop))
+    await asyncio.sleep(seconds)
+    stop.set()
+    writes = await write_task
+    await asyncio.gather(*tasks)
+    await engine.dispose()
+    return writes / seconds, sorted(latencies)
+
+
+def report(name: str, writes: float, latencies: list):
+    def percentile(q: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))] if latencies else 0.0
+
+    print(f"{name}: 写入 {writes:8.1f} 次/秒  读取 {len(latencies):6d} 次  "
+          f"读取延迟 p50 {percentile(0.50):6.2f} 毫秒  p99 {percentile(0.99):7.2f} 毫秒")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        default = await run(os.path.join(workdir, "default.db"), {"enable": False}, args.seconds, args.readers)
+        tuned = await run(os.path.join(workdir, "tuned.db"), {}, args.seconds, args.readers)
+
+    print(f"测试时间: {args.seconds} 秒  读取协程: {args.readers}")
+    report("SQLite 默认设置", *default)
+    report("    [SQLite] 设置", *tuned)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""XYBotDB 事件循环延迟基准测试
+
+模拟多个插件同时查询和修改积分，对比同步接口（线程池中执行，协程阻塞等待结果）和异步接口的吞吐量，
+以及同时运行的一个定时协程被推迟了多久（事件循环延迟）。
+
+用法（在项目根目录运行）:
+    python benchmarks/bench_xybotdb.py --operations 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger  # noqa: E402
+
+from database.XYBotDB import XYBotDB  # noqa: E402
+
+TICK = 0.005  # 定时协程每次休眠的秒数
+
+
+async def measure_loop_lag(lags: list, stop: asyncio.Event):
+    """每 TICK 秒醒来一次，记录实际醒来的时间比预期晚了多少毫秒"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append((time.perf_counter() - start - TICK) * 1000)
+
+
+async def point_operation_sync(db: XYBotDB, index: int):
+    # 旧的插件写法：在协程中直接调用同步接口
+    wxid = f"wxid_{index % 100}"
+    db.add_points(wxid, 1)
+    db.get_points(wxid)
+
+
+async def point_operation_async(db: XYBotDB, index: int):
+    wxid = f"wxid_{index % 100}"
+    await db.add_points_async(wxid, 1)
+    await db.get_points_async(wxid)
+
+
+async def run(operation, db: XYBotDB, total: int, concurrency: int) -> tuple[float, list]:
+    semaphore = asyncio.Semaphore(concurrency)
+    lags = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_loop_lag(lags, stop))
+
+    async def one(index: int):
+        async with semaphore:
+            await operation(db, index)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(total)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return total / elapsed, sorted(lags)
+
+
+def report(name: str, ops: float, lags: list):
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0
+    print(f"{name}: {ops:8.1f} 次/秒  循环延迟 p99 {p99:8.1f} 毫秒  最大 {max(lags, default=0.0):8.1f} 毫秒"
+          f"  定时协程运行 {len(lags)} 次")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--operations", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    logger.remove()  # 每次修改积分都会打日志，测试时关闭
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # XYBotDB 从当前目录的 main_config.toml 读取设置，在临时目录中使用临时数据库
+        os.chdir(workdir)
+        with open("main_config.toml", "w", encoding="utf-8") as f:
+            f.write("[XYBot]\n"
+                    f'XYBotDB-url = "sqlite:///{workdir}/xybot.db"\n')
+
+        db = XYBotDB()
+        try:
+            sync_ops, sync_lags = await run(point_operation_sync, db, args.operations, args.concurrency)
+            async_ops, async_lags = await run(point_operation_async, db, args.operations, args.concurrency)
+        finally:
+            await db.close()
+            db.engine.dispose()
+
+    print(f"积分操作: {args.operations} 次（每次增加积分并查询）  并发: {args.concurrency}")
+    report("同步接口", sync_ops, sync_lags)
+    report("异步接口", async_ops, async_lags)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
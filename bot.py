@@ -15,8 +15,12 @@ from WechatAPI.Server.WechatAPIServer import wechat_api_server
 from database.XYBotDB import XYBotDB
 from database.keyvalDB import KeyvalDB
 from database.messsagDB import MessageDB
+from database.sqlite_profile import SQLiteMaintenance
 from utils.decorators import scheduler
+from utils.message_pipeline import MessagePipeline
+from utils.sync_poller import SyncPoller
 from utils.plugin_manager import PluginManager
+from utils.stats_counter import StatsCounter
 from utils.xybot import XYBot
 
 
@@ -25,6 +29,9 @@ async def run_bot():
     机器人主要运行逻辑
     """
 
+    bot = None
+    pipeline = None
+    retention = None
     try:
         # 设置工作目录
         script_dir = Path(__file__).resolve().parent
@@ -53,6 +60,27 @@ async def run_bot():
         bot = WechatAPI.WechatAPIClient("127.0.0.1", api_config.get("port", 9000))
         bot.ignore_protect = main_config.get("XYBot", {}).get("ignore-protection", False)
 
+        sender_config = main_config.get("Sender", {})
+        bot.send_scheduler.configure(global_rate=sender_config.get("global-rate", 3),
+                                     global_burst=sender_config.get("global-burst", 5),
+                                     recipient_rate=sender_config.get("recipient-rate", 1),
+                                     recipient_burst=sender_config.get("recipient-burst", 1))
+        bot_bridge.register_metrics("sender", bot.send_scheduler.get_metrics)
+
+        media_cache_config = main_config.get("MediaCache", {})
+        bot.media_store.configure(directory=media_cache_config.get("path", "resource/media_cache"),
+                                  max_size=int(media_cache_config.get("max-size-mb", 1024) * 1024 * 1024),
+                                  enabled=media_cache_config.get("enable", True))
+        bot_bridge.register_metrics("media_store", bot.media_store.get_metrics)
+
+        download_config = main_config.get("Download", {})
+        bot.segmented_downloader.configure(segment_size=int(download_config.get("segment-size-kb", 1024) * 1024),
+                                           concurrency=download_config.get("concurrency", 4),
+                                           retries=download_config.get("retries", 3),
+                                           min_size=int(download_config.get("min-size-mb", 4) * 1024 * 1024),
+                                           enabled=download_config.get("segmented", True))
+        bot_bridge.register_metrics("segmented_download", bot.segmented_downloader.get_metrics)
+
         # 等待WechatAPI服务启动
         time_out = 10
         while not await bot.is_running() and time_out > 0:
@@ -227,6 +255,34 @@ async def run_bot():
             await asyncio.sleep(1)
         logger.success("处理堆积消息完毕")
 
+        # 同一个会话的消息按顺序处理，不同会话并行处理
+        dispatcher_config = main_config.get("Dispatcher", {})
+        pipeline = MessagePipeline(xybot.process_message, xybot.conversation_of,
+                                   workers=dispatcher_config.get("workers", 8),
+                                   high_water=dispatcher_config.get("queue-high-water", 1000),
+                                   low_water=dispatcher_config.get("queue-low-water", 500))
+        pipeline.start()
+        bot_bridge.register_metrics("pipeline", pipeline.get_metrics)
+
+        # 有消息时立即再次同步，空闲时逐渐降低同步频率
+        poller = SyncPoller(min_interval=dispatcher_config.get("poll-min-interval", 0.1),
+                            max_interval=dispatcher_config.get("poll-max-interval", 2.0),
+                            backoff=dispatcher_config.get("poll-backoff", 2.0))
+        bot_bridge.register_metrics("sync", poller.get_metrics)
+        bot_bridge.register_metrics("message_db", lambda: dict(MessageDB().write_stats))
+        bot_bridge.register_metrics("user_cache", XYBotDB().user_cache.get_metrics)
+        bot_bridge.register_metrics("keyval_cache", KeyvalDB().cache.get_metrics)
+        bot_bridge.register_metrics("media", xybot.media_stats.get_metrics)
+
+        # 定期执行 WAL 检查点
+        SQLiteMaintenance().start()
+        bot_bridge.register_metrics("sqlite", SQLiteMaintenance().get_metrics)
+
+        # 分批清理过期消息
+        retention = MessageDB().retention
+        retention.start()
+        bot_bridge.register_metrics("message_retention", retention.get_metrics)
+
         logger.success("开始处理消息")
         while True:
             try:
@@ -237,12 +293,25 @@ async def run_bot():
                 continue
 
             data = data.get("AddMsgs")
+            poller.record(data)
             if data:
                 for message in data:
-                    asyncio.create_task(xybot.process_message(message))
-            await asyncio.sleep(0.5)
+                    await pipeline.submit(message)
+            await poller.wait()
 
     except asyncio.CancelledError:
+        # 先处理完已经收到的消息，插件还要用到 bot 的连接
+        if pipeline is not None:
+            await pipeline.stop(main_config.get("Dispatcher", {}).get("shutdown-timeout", 10))
+        if bot is not None:
+            await bot.close()
+        if retention is not None:
+            await retention.stop()
+        # 写入还在缓冲区中的消息
+        await MessageDB().flush()
+        await StatsCounter().close()
+        await SQLiteMaintenance().stop()
+        await XYBotDB().close()
         await wechat_api_server.stop()
         logger.info("机器人关闭")
     except Exception as e:
@@ -1,19 +1,26 @@
 import datetime
 import tomllib
 from concurrent.futures import ThreadPoolExecutor
-from typing import Union
+from typing import Dict, Iterable, Union
 
 from loguru import logger
 from sqlalchemy import Column, String, Integer, DateTime, create_engine, JSON, Boolean
-from sqlalchemy import update
+from sqlalchemy import select, update
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base, Session
 from sqlalchemy.orm import sessionmaker
 
 from utils.singleton import Singleton
+from .sqlite_profile import apply_sqlite_profile
+from .user_cache import UserCache, UserState
 
 Base = declarative_base()
 
+# 批量查询时每条 IN (...) 语句最多包含的 wxid 数量，SQLite 默认最多 999 个参数
+BULK_CHUNK_SIZE = 500
+
 
 class User(Base):
     __tablename__ = 'user'
@@ -37,20 +44,53 @@ class Chatroom(Base):
 
 
 class XYBotDB(metaclass=Singleton):
+    """用户和群聊数据库
+
+    每个操作都有同步和异步两个版本，例如 get_points 和 get_points_async。
+    在协程中（插件的事件处理函数、定时任务）请使用异步版本，同步版本会阻塞事件循环直到查询完成，只为兼容旧插件保留。
+
+    异步版本使用两个连接池：读操作使用有多个连接的读连接池，可以并发执行；
+    写操作使用只有一个连接的写连接池，所有写入按顺序执行，避免 SQLite 写锁冲突。
+    """
+
     def __init__(self):
         with open("main_config.toml", "rb") as f:
             main_config = tomllib.load(f)
 
         self.database_url = main_config["XYBot"]["XYBotDB-url"]
+        sqlite_config = main_config.get("SQLite", {})
         self.engine = create_engine(self.database_url)
+        apply_sqlite_profile(self.engine, sqlite_config)
         self.DBSession = sessionmaker(bind=self.engine)
 
         # 创建表
         Base.metadata.create_all(self.engine)
 
-        # 创建线程池执行器
+        # 同步接口使用的线程池执行器
         self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
 
+        # 异步接口使用的读连接池和写连接池
+        async_url = self._async_url(self.database_url)
+        readers = max(main_config["XYBot"].get("XYBotDB-readers", 4), 1)
+        self.async_read_engine = create_async_engine(async_url, pool_size=readers, max_overflow=0)
+        self.async_write_engine = create_async_engine(async_url, pool_size=1, max_overflow=0)
+        apply_sqlite_profile(self.async_read_engine, sqlite_config)
+        apply_sqlite_profile(self.async_write_engine, sqlite_config, "xybot")
+        self.AsyncReadSession = async_sessionmaker(self.async_read_engine, expire_on_commit=False)
+        self.AsyncWriteSession = async_sessionmaker(self.async_write_engine, expire_on_commit=False)
+
+        # 积分、签到状态和白名单的缓存
+        self.user_cache = UserCache(max_size=main_config["XYBot"].get("XYBotDB-cache-size", 10000),
+                                    enabled=main_config["XYBot"].get("XYBotDB-cache", True))
+
+    @staticmethod
+    def _async_url(database_url: str) -> str:
+        """把同步数据库地址转换为异步驱动的地址，例如 sqlite:/// 转换为 sqlite+aiosqlite:///"""
+        url = make_url(database_url)
+        if url.drivername == "sqlite":
+            url = url.set(drivername="sqlite+aiosqlite")
+        return url.render_as_string(hide_password=False)
+
     def _execute_in_queue(self, method, *args, **kwargs):
         """在队列中执行数据库操作"""
         future = self.executor.submit(method, *args, **kwargs)
@@ -60,15 +100,106 @@ class XYBotDB(metaclass=Singleton):
             logger.error(f"数据库操作失败: {method.__name__} - {str(e)}")
             raise
 
+    def _run(self, operation, *args):
+        """同步执行数据库操作，会阻塞调用的线程"""
+        return self._execute_in_queue(self._run_in_session, operation, *args)
+
+    def _run_in_session(self, operation, *args):
+        session = self.DBSession()
+        try:
+            return operation(session, *args)
+        finally:
+            session.close()
+
+    async def _read(self, operation, *args):
+        """在读连接池中异步执行只读操作"""
+        async with self.AsyncReadSession() as session:
+            return await session.run_sync(operation, *args)
+
+    async def _write(self, operation, *args):
+        """在写连接中异步执行写操作，同一时间只有一个写操作"""
+        async with self.AsyncWriteSession() as session:
+            return await session.run_sync(operation, *args)
+
+    def _user_state(self, wxid: str) -> UserState:
+        state, generation = self.user_cache.get(wxid)
+        if state is None:
+            state = self._run(self._query_user_state, wxid)
+            self.user_cache.put(wxid, state, generation)
+        return state
+
+    async def _user_state_async(self, wxid: str) -> UserState:
+        state, generation = self.user_cache.get(wxid)
+        if state is None:
+            state = await self._read(self._query_user_state, wxid)
+            self.user_cache.put(wxid, state, generation)
+        return state
+
+    @staticmethod
+    def _query_user_state(session: Session, wxid: str) -> UserState:
+        user = session.query(User).filter_by(wxid=wxid).first()
+        if not user:
+            return UserState()
+        return UserState(points=user.points, signin_stat=user.signin_stat, signin_streak=user.signin_streak,
+                         whitelist=user.whitelist)
+
+    def _user_states(self, wxids: Iterable[str]) -> Dict[str, UserState]:
+        states, missing, generation = self.user_cache.get_many(dict.fromkeys(wxids))
+        if missing:
+            loaded = self._run(self._query_user_states, missing)
+            self.user_cache.put_many(loaded, generation)
+            states.update(loaded)
+        return states
+
+    async def _user_states_async(self, wxids: Iterable[str]) -> Dict[str, UserState]:
+        states, missing, generation = self.user_cache.get_many(dict.fromkeys(wxids))
+        if missing:
+            loaded = await self._read(self._query_user_states, missing)
+            self.user_cache.put_many(loaded, generation)
+            states.update(loaded)
+        return states
+
+    @staticmethod
+    def _query_user_states(session: Session, wxids: list) -> Dict[str, UserState]:
+        states = {}
+        for start in range(0, len(wxids), BULK_CHUNK_SIZE):
+            rows = session.execute(
+                select(User.wxid, User.points, User.signin_stat, User.signin_streak, User.whitelist)
+                .where(User.wxid.in_(wxids[start:start + BULK_CHUNK_SIZE]))
+            )
+            for row in rows:
+                states[row.wxid] = UserState(points=row.points, signin_stat=row.signin_stat,
+                                             signin_streak=row.signin_streak, whitelist=row.whitelist)
+        for wxid in wxids:
+            if wxid not in states:
+                states[wxid] = UserState()
+        return states
+
+    async def close(self):
+        """关闭异步连接池"""
+        await self.async_read_engine.dispose()
+        await self.async_write_engine.dispose()
+
     # USER
 
     def add_points(self, wxid: str, num: int) -> bool:
         """Thread-safe point addition"""
-        return self._execute_in_queue(self._add_points, wxid, num)
+        return self._after_add_points(self._run(self._add_points, wxid, num), wxid, num)
 
-    def _add_points(self, wxid: str, num: int) -> bool:
+    async def add_points_async(self, wxid: str, num: int) -> bool:
+        """add_points 的异步版本"""
+        return self._after_add_points(await self._write(self._add_points, wxid, num), wxid, num)
+
+    def _after_add_points(self, success: bool, wxid: str, num: int) -> bool:
+        if success:
+            self.user_cache.add_points(wxid, num)
+        else:
+            self.user_cache.invalidate(wxid)
+        return success
+
+    @staticmethod
+    def _add_points(session: Session, wxid: str, num: int) -> bool:
         """Thread-safe point addition"""
-        session = self.DBSession()
         try:
             # Use UPDATE with atomic operation
             result = session.execute(
@@ -87,16 +218,25 @@ class XYBotDB(metaclass=Singleton):
             session.rollback()
             logger.error(f"数据库: 用户{wxid}积分增加失败, 错误: {e}")
             return False
-        finally:
-            session.close()
 
     def set_points(self, wxid: str, num: int) -> bool:
         """Thread-safe point setting"""
-        return self._execute_in_queue(self._set_points, wxid, num)
+        return self._after_update(self._run(self._set_points, wxid, num), wxid, points=num)
+
+    async def set_points_async(self, wxid: str, num: int) -> bool:
+        """set_points 的异步版本"""
+        return self._after_update(await self._write(self._set_points, wxid, num), wxid, points=num)
+
+    def _after_update(self, success: bool, wxid: str, **changes) -> bool:
+        if success:
+            self.user_cache.update(wxid, **changes)
+        else:
+            self.user_cache.invalidate(wxid)
+        return success
 
-    def _set_points(self, wxid: str, num: int) -> bool:
+    @staticmethod
+    def _set_points(session: Session, wxid: str, num: int) -> bool:
         """Thread-safe point setting"""
-        session = self.DBSession()
         try:
             result = session.execute(
                 update(User)
@@ -113,40 +253,50 @@ class XYBotDB(metaclass=Singleton):
             session.rollback()
             logger.error(f"数据库: 用户{wxid}积分设置失败, 错误: {e}")
             return False
-        finally:
-            session.close()
 
     def get_points(self, wxid: str) -> int:
         """Get user points"""
-        return self._execute_in_queue(self._get_points, wxid)
+        return self._user_state(wxid).points
 
-    def _get_points(self, wxid: str) -> int:
-        """Get user points"""
-        session = self.DBSession()
-        try:
-            user = session.query(User).filter_by(wxid=wxid).first()
-            return user.points if user else 0
-        finally:
-            session.close()
+    async def get_points_async(self, wxid: str) -> int:
+        """get_points 的异步版本"""
+        return (await self._user_state_async(wxid)).points
+
+    def get_points_many(self, wxids: Iterable[str]) -> Dict[str, int]:
+        """批量获取用户积分，返回 {wxid: 积分}，一次查询代替每个用户调用一次 get_points"""
+        return {wxid: state.points for wxid, state in self._user_states(wxids).items()}
+
+    async def get_points_many_async(self, wxids: Iterable[str]) -> Dict[str, int]:
+        """get_points_many 的异步版本"""
+        return {wxid: state.points for wxid, state in (await self._user_states_async(wxids)).items()}
+
+    def get_users_many(self, wxids: Iterable[str]) -> Dict[str, UserState]:
+        """批量获取用户的积分、签到状态、连续签到天数和白名单状态，返回 {wxid: UserState}"""
+        return self._user_states(wxids)
+
+    async def get_users_many_async(self, wxids: Iterable[str]) -> Dict[str, UserState]:
+        """get_users_many 的异步版本"""
+        return await self._user_states_async(wxids)
 
     def get_signin_stat(self, wxid: str) -> datetime.datetime:
         """获取用户签到状态"""
-        return self._execute_in_queue(self._get_signin_stat, wxid)
+        return self._user_state(wxid).signin_stat
 
-    def _get_signin_stat(self, wxid: str) -> datetime.datetime:
-        session = self.DBSession()
-        try:
-            user = session.query(User).filter_by(wxid=wxid).first()
-            return user.signin_stat if user else datetime.datetime.fromtimestamp(0)
-        finally:
-            session.close()
+    async def get_signin_stat_async(self, wxid: str) -> datetime.datetime:
+        """get_signin_stat 的异步版本"""
+        return (await self._user_state_async(wxid)).signin_stat
 
     def set_signin_stat(self, wxid: str, signin_time: datetime.datetime) -> bool:
         """Thread-safe set user's signin time"""
-        return self._execute_in_queue(self._set_signin_stat, wxid, signin_time)
+        return self._after_update(self._run(self._set_signin_stat, wxid, signin_time), wxid, signin_stat=signin_time)
 
-    def _set_signin_stat(self, wxid: str, signin_time: datetime.datetime) -> bool:
-        session = self.DBSession()
+    async def set_signin_stat_async(self, wxid: str, signin_time: datetime.datetime) -> bool:
+        """set_signin_stat 的异步版本"""
+        success = await self._write(self._set_signin_stat, wxid, signin_time)
+        return self._after_update(success, wxid, signin_stat=signin_time)
+
+    @staticmethod
+    def _set_signin_stat(session: Session, wxid: str, signin_time: datetime.datetime) -> bool:
         try:
             result = session.execute(
                 update(User)
@@ -170,12 +320,23 @@ class XYBotDB(metaclass=Singleton):
             session.rollback()
             logger.error(f"数据库: 用户{wxid}登录时间设置失败, 错误: {e}")
             return False
-        finally:
-            session.close()
 
     def reset_all_signin_stat(self) -> bool:
         """Reset all users' signin status"""
-        session = self.DBSession()
+        try:
+            return self._run(self._reset_all_signin_stat)
+        finally:
+            self.user_cache.clear()
+
+    async def reset_all_signin_stat_async(self) -> bool:
+        """reset_all_signin_stat 的异步版本"""
+        try:
+            return await self._write(self._reset_all_signin_stat)
+        finally:
+            self.user_cache.clear()
+
+    @staticmethod
+    def _reset_all_signin_stat(session: Session) -> bool:
         try:
             session.query(User).update({User.signin_stat: datetime.datetime.fromtimestamp(0)})
             session.commit()
@@ -184,21 +345,30 @@ class XYBotDB(metaclass=Singleton):
             session.rollback()
             logger.error(f"数据库: 重置所有用户登录时间失败, 错误: {e}")
             return False
-        finally:
-            session.close()
 
     def get_leaderboard(self, count: int) -> list:
         """Get points leaderboard"""
-        session = self.DBSession()
-        try:
-            users = session.query(User).order_by(User.points.desc()).limit(count).all()
-            return [(user.wxid, user.points) for user in users]
-        finally:
-            session.close()
+        return self._run(self._get_leaderboard, count)
+
+    async def get_leaderboard_async(self, count: int) -> list:
+        """get_leaderboard 的异步版本"""
+        return await self._read(self._get_leaderboard, count)
+
+    @staticmethod
+    def _get_leaderboard(session: Session, count: int) -> list:
+        users = session.query(User).order_by(User.points.desc()).limit(count).all()
+        return [(user.wxid, user.points) for user in users]
 
     def set_whitelist(self, wxid: str, stat: bool) -> bool:
         """Set user's whitelist status"""
-        session = self.DBSession()
+        return self._after_update(self._run(self._set_whitelist, wxid, stat), wxid, whitelist=stat)
+
+    async def set_whitelist_async(self, wxid: str, stat: bool) -> bool:
+        """set_whitelist 的异步版本"""
+        return self._after_update(await self._write(self._set_whitelist, wxid, stat), wxid, whitelist=stat)
+
+    @staticmethod
+    def _set_whitelist(session: Session, wxid: str, stat: bool) -> bool:
         try:
             user = session.query(User).filter_by(wxid=wxid).first()
             if not user:
@@ -212,34 +382,49 @@ class XYBotDB(metaclass=Singleton):
             session.rollback()
             logger.error(f"数据库: 用户{wxid}白名单状态设置失败, 错误: {e}")
             return False
-        finally:
-            session.close()
 
     def get_whitelist(self, wxid: str) -> bool:
         """Get user's whitelist status"""
-        session = self.DBSession()
-        try:
-            user = session.query(User).filter_by(wxid=wxid).first()
-            return user.whitelist if user else False
-        finally:
-            session.close()
+        return self._user_state(wxid).whitelist
+
+    async def get_whitelist_async(self, wxid: str) -> bool:
+        """get_whitelist 的异步版本"""
+        return (await self._user_state_async(wxid)).whitelist
 
     def get_whitelist_list(self) -> list:
         """Get list of all whitelisted users"""
-        session = self.DBSession()
-        try:
-            users = session.query(User).filter_by(whitelist=True).all()
-            return [user.wxid for user in users]
-        finally:
-            session.close()
+        return self._run(self._get_whitelist_list)
+
+    async def get_whitelist_list_async(self) -> list:
+        """get_whitelist_list 的异步版本"""
+        return await self._read(self._get_whitelist_list)
+
+    @staticmethod
+    def _get_whitelist_list(session: Session) -> list:
+        users = session.query(User).filter_by(whitelist=True).all()
+        return [user.wxid for user in users]
 
     def safe_trade_points(self, trader_wxid: str, target_wxid: str, num: int) -> bool:
         """Thread-safe points trading between users"""
-        return self._execute_in_queue(self._safe_trade_points, trader_wxid, target_wxid, num)
-
-    def _safe_trade_points(self, trader_wxid: str, target_wxid: str, num: int) -> bool:
+        success = self._run(self._safe_trade_points, trader_wxid, target_wxid, num)
+        return self._after_trade_points(success, trader_wxid, target_wxid, num)
+
+    async def safe_trade_points_async(self, trader_wxid: str, target_wxid: str, num: int) -> bool:
+        """safe_trade_points 的异步版本"""
+        success = await self._write(self._safe_trade_points, trader_wxid, target_wxid, num)
+        return self._after_trade_points(success, trader_wxid, target_wxid, num)
+
+    def _after_trade_points(self, success: bool, trader_wxid: str, target_wxid: str, num: int) -> bool:
+        if success:
+            self.user_cache.add_points(trader_wxid, -num)
+            self.user_cache.add_points(target_wxid, num)
+        else:
+            self.user_cache.invalidate(trader_wxid, target_wxid)
+        return success
+
+    @staticmethod
+    def _safe_trade_points(session: Session, trader_wxid: str, target_wxid: str, num: int) -> bool:
         """Thread-safe points trading between users"""
-        session = self.DBSession()
         try:
             # Start transaction with row-level locking
             trader = session.query(User).filter_by(wxid=trader_wxid) \
@@ -268,42 +453,55 @@ class XYBotDB(metaclass=Singleton):
             session.rollback()
             logger.error(f"数据库: 转账失败, 错误: {e}")
             return False
-        finally:
-            session.close()
 
     def get_user_list(self) -> list:
         """Get list of all users"""
-        session = self.DBSession()
-        try:
-            users = session.query(User).all()
-            return [user.wxid for user in users]
-        finally:
-            session.close()
+        return self._run(self._get_user_list)
+
+    async def get_user_list_async(self) -> list:
+        """get_user_list 的异步版本"""
+        return await self._read(self._get_user_list)
+
+    @staticmethod
+    def _get_user_list(session: Session) -> list:
+        users = session.query(User).all()
+        return [user.wxid for user in users]
 
     def get_llm_thread_id(self, wxid: str, namespace: str = None) -> Union[dict, str]:
         """Get LLM thread id for user or chatroom"""
-        session = self.DBSession()
-        try:
-            # Check if it's a chatroom ID
-            if wxid.endswith("@chatroom"):
-                chatroom = session.query(Chatroom).filter_by(chatroom_id=wxid).first()
-                if namespace:
-                    return chatroom.llm_thread_id.get(namespace, "") if chatroom else ""
-                else:
-                    return chatroom.llm_thread_id if chatroom else {}
+        return self._run(self._get_llm_thread_id, wxid, namespace)
+
+    async def get_llm_thread_id_async(self, wxid: str, namespace: str = None) -> Union[dict, str]:
+        """get_llm_thread_id 的异步版本"""
+        return await self._read(self._get_llm_thread_id, wxid, namespace)
+
+    @staticmethod
+    def _get_llm_thread_id(session: Session, wxid: str, namespace: str = None) -> Union[dict, str]:
+        # Check if it's a chatroom ID
+        if wxid.endswith("@chatroom"):
+            chatroom = session.query(Chatroom).filter_by(chatroom_id=wxid).first()
+            if namespace:
+                return chatroom.llm_thread_id.get(namespace, "") if chatroom else ""
             else:
-                # Regular user
-                user = session.query(User).filter_by(wxid=wxid).first()
-                if namespace:
-                    return user.llm_thread_id.get(namespace, "") if user else ""
-                else:
-                    return user.llm_thread_id if user else {}
-        finally:
-            session.close()
+                return chatroom.llm_thread_id if chatroom else {}
+        else:
+            # Regular user
+            user = session.query(User).filter_by(wxid=wxid).first()
+            if namespace:
+                return user.llm_thread_id.get(namespace, "") if user else ""
+            else:
+                return user.llm_thread_id if user else {}
 
     def save_llm_thread_id(self, wxid: str, data: str, namespace: str) -> bool:
         """Save LLM thread id for user or chatroom"""
-        session = self.DBSession()
+        return self._run(self._save_llm_thread_id, wxid, data, namespace)
+
+    async def save_llm_thread_id_async(self, wxid: str, data: str, namespace: str) -> bool:
+        """save_llm_thread_id 的异步版本"""
+        return await self._write(self._save_llm_thread_id, wxid, data, namespace)
+
+    @staticmethod
+    def _save_llm_thread_id(session: Session, wxid: str, data: str, namespace: str) -> bool:
         try:
             if wxid.endswith("@chatroom"):
                 chatroom = session.query(Chatroom).filter_by(chatroom_id=wxid).first()
@@ -337,12 +535,17 @@ class XYBotDB(metaclass=Singleton):
             session.rollback()
             logger.error(f"数据库: 保存用户llm thread id失败, 错误: {e}")
             return False
-        finally:
-            session.close()
 
     def delete_all_llm_thread_id(self):
         """Clear llm thread id for everyone"""
-        session = self.DBSession()
+        return self._run(self._delete_all_llm_thread_id)
+
+    async def delete_all_llm_thread_id_async(self):
+        """delete_all_llm_thread_id 的异步版本"""
+        return await self._write(self._delete_all_llm_thread_id)
+
+    @staticmethod
+    def _delete_all_llm_thread_id(session: Session):
         try:
             session.query(User).update({User.llm_thread_id: {}})
             session.query(Chatroom).update({Chatroom.llm_thread_id: {}})
@@ -352,27 +555,25 @@ class XYBotDB(metaclass=Singleton):
             session.rollback()
             logger.error(f"数据库: 清除所有用户llm thread id失败, 错误: {e}")
             return False
-        finally:
-            session.close()
 
     def get_signin_streak(self, wxid: str) -> int:
         """Thread-safe get user's signin streak"""
-        return self._execute_in_queue(self._get_signin_streak, wxid)
+        return self._user_state(wxid).signin_streak
 
-    def _get_signin_streak(self, wxid: str) -> int:
-        session = self.DBSession()
-        try:
-            user = session.query(User).filter_by(wxid=wxid).first()
-            return user.signin_streak if user else 0
-        finally:
-            session.close()
+    async def get_signin_streak_async(self, wxid: str) -> int:
+        """get_signin_streak 的异步版本"""
+        return (await self._user_state_async(wxid)).signin_streak
 
     def set_signin_streak(self, wxid: str, streak: int) -> bool:
         """Thread-safe set user's signin streak"""
-        return self._execute_in_queue(self._set_signin_streak, wxid, streak)
+        return self._after_update(self._run(self._set_signin_streak, wxid, streak), wxid, signin_streak=streak)
 
-    def _set_signin_streak(self, wxid: str, streak: int) -> bool:
-        session = self.DBSession()
+    async def set_signin_streak_async(self, wxid: str, streak: int) -> bool:
+        """set_signin_streak 的异步版本"""
+        return self._after_update(await self._write(self._set_signin_streak, wxid, streak), wxid, signin_streak=streak)
+
+    @staticmethod
+    def _set_signin_streak(session: Session, wxid: str, streak: int) -> bool:
         try:
             result = session.execute(
                 update(User)
@@ -389,32 +590,45 @@ class XYBotDB(metaclass=Singleton):
             session.rollback()
             logger.error(f"数据库: 用户{wxid}连续签到天数设置失败, 错误: {e}")
             return False
-        finally:
-            session.close()
 
     # CHATROOM
 
     def get_chatroom_list(self) -> list:
         """Get list of all chatrooms"""
-        session = self.DBSession()
-        try:
-            chatrooms = session.query(Chatroom).all()
-            return [chatroom.chatroom_id for chatroom in chatrooms]
-        finally:
-            session.close()
+        return self._run(self._get_chatroom_list)
+
+    async def get_chatroom_list_async(self) -> list:
+        """get_chatroom_list 的异步版本"""
+        return await self._read(self._get_chatroom_list)
+
+    @staticmethod
+    def _get_chatroom_list(session: Session) -> list:
+        chatrooms = session.query(Chatroom).all()
+        return [chatroom.chatroom_id for chatroom in chatrooms]
 
     def get_chatroom_members(self, chatroom_id: str) -> set:
         """Get members of a chatroom"""
-        session = self.DBSession()
-        try:
-            chatroom = session.query(Chatroom).filter_by(chatroom_id=chatroom_id).first()
-            return set(chatroom.members) if chatroom else set()
-        finally:
-            session.close()
+        return self._run(self._get_chatroom_members, chatroom_id)
+
+    async def get_chatroom_members_async(self, chatroom_id: str) -> set:
+        """get_chatroom_members 的异步版本"""
+        return await self._read(self._get_chatroom_members, chatroom_id)
+
+    @staticmethod
+    def _get_chatroom_members(session: Session, chatroom_id: str) -> set:
+        chatroom = session.query(Chatroom).filter_by(chatroom_id=chatroom_id).first()
+        return set(chatroom.members) if chatroom else set()
 
     def set_chatroom_members(self, chatroom_id: str, members: set) -> bool:
         """Set members of a chatroom"""
-        session = self.DBSession()
+        return self._run(self._set_chatroom_members, chatroom_id, members)
+
+    async def set_chatroom_members_async(self, chatroom_id: str, members: set) -> bool:
+        """set_chatroom_members 的异步版本"""
+        return await self._write(self._set_chatroom_members, chatroom_id, members)
+
+    @staticmethod
+    def _set_chatroom_members(session: Session, chatroom_id: str, members: set) -> bool:
         try:
             chatroom = session.query(Chatroom).filter_by(chatroom_id=chatroom_id).first()
             if not chatroom:
@@ -428,15 +642,17 @@ class XYBotDB(metaclass=Singleton):
             session.rollback()
             logger.error(f"Database: Set chatroom {chatroom_id} members failed, error: {e}")
             return False
-        finally:
-            session.close()
 
     def get_users_count(self):
-        session = self.DBSession()
-        try:
-            return session.query(User).count()
-        finally:
-            session.close()
+        return self._run(self._get_users_count)
+
+    async def get_users_count_async(self):
+        """get_users_count 的异步版本"""
+        return await self._read(self._get_users_count)
+
+    @staticmethod
+    def _get_users_count(session: Session):
+        return session.query(User).count()
 
     def __del__(self):
         """确保关闭时清理资源"""
@@ -1,18 +1,44 @@
 import asyncio
+import heapq
 import logging
+import threading
+import time
 import tomllib
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, Union, List
+from typing import Any, Dict, Iterable, Optional, Union, List, Tuple
 
 from pydantic import validate_arguments
-from sqlalchemy import Column, String, Text, DateTime, delete, select
+from sqlalchemy import Column, String, Text, DateTime, bindparam, delete, select, or_, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_scoped_session
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from utils.singleton import Singleton
+from .sqlite_profile import apply_sqlite_profile
 
 DeclarativeBase = declarative_base()
 
+# mget 时每条 IN (...) 语句最多包含的键数量
+MGET_CHUNK_SIZE = 500
+
+# set 和 incrby 使用 INSERT ... ON CONFLICT DO UPDATE，一条语句完成，同时写同一个新键时不会主键冲突。
+# SQLAlchemy 不缓存 on_conflict_do_update 构造的语句，每次执行都要重新编译，所以直接写 SQL
+_UPSERT = text(
+    "INSERT INTO key_value_store (key, value, expire_time) VALUES (:key, :value, :expire_time) "
+    "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expire_time = excluded.expire_time"
+).bindparams(bindparam("expire_time", type_=DateTime))
+
+# 已过期的键视为不存在，从0开始计数并清除过期时间；值不是整数时不更新，也不返回行
+_INCRBY = text(
+    "INSERT INTO key_value_store (key, value, expire_time) VALUES (:key, :initial, NULL) "
+    "ON CONFLICT (key) DO UPDATE SET "
+    "value = CASE WHEN expire_time < :now THEN excluded.value "
+    "ELSE CAST(CAST(value AS INTEGER) + :amount AS TEXT) END, "
+    "expire_time = CASE WHEN expire_time < :now THEN NULL ELSE expire_time END "
+    "WHERE expire_time < :now OR CAST(CAST(value AS INTEGER) AS TEXT) = value "
+    "RETURNING value, expire_time"
+).bindparams(bindparam("now", type_=DateTime)).columns(value=Text, expire_time=DateTime)
+
 
 class KeyValue(DeclarativeBase):
     __tablename__ = 'key_value_store'
@@ -22,6 +48,207 @@ class KeyValue(DeclarativeBase):
     expire_time = Column(DateTime, index=True, comment='过期时间')
 
 
+class _CacheEntry:
+    """缓存的键值，value 为 None 表示数据库中没有这个键"""
+
+    __slots__ = ("value", "expire_at")
+
+    def __init__(self, value: Optional[str], expire_at: Optional[float] = None):
+        self.value = value
+        self.expire_at = expire_at  # 过期时间戳，None 为永不过期
+
+
+class KeyvalCache:
+    """KeyvalDB 的内存缓存层
+
+    - 读取时先查缓存，没有时查数据库再放入缓存（数据库中没有的键也会缓存，避免反复查询）
+    - 写入时先写数据库，成功后更新缓存（write-through）
+    - 有过期时间的键放入最小堆，到期时从堆顶取出，在缓存中标记为不存在，不需要写数据库；数据库中的过期数据由后台任务分批删除
+
+    机器人和 WebUI 在不同线程中使用同一个 KeyvalDB，所以所有操作都加锁。
+
+    Args:
+        max_size (int): 最多缓存多少个键，0 为不使用缓存
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max(max_size, 0)
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: str) -> Tuple[Optional[_CacheEntry], int]:
+        """返回 (缓存项, generation)，没有缓存时缓存项为 None，查询数据库后把 generation 传给 put"""
+        with self._lock:
+            self._expire(time.time())
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return entry, self._generation
+
+    def get_many(self, keys: Iterable[str]) -> Tuple[Dict[str, _CacheEntry], List[str], int]:
+        """批量读取，返回 (缓存中有的项, 缓存中没有的键, generation)"""
+        found = {}
+        missing = []
+        with self._lock:
+            self._expire(time.time())
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    missing.append(key)
+                else:
+                    found[key] = entry
+                    self._entries.move_to_end(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+            return found, missing, self._generation
+
+    def put(self, key: str, value: Optional[str], expire_at: Optional[float], generation: int = None):
+        """放入缓存。写入数据库后调用时不传 generation；查询数据库后调用时传入 get 返回的 generation，期间有写入则不放入"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is None:
+                self._generation += 1
+            elif generation != self._generation:
+                return
+            if expire_at is not None and expire_at <= time.time():
+                value, expire_at = None, None
+            self._entries[key] = _CacheEntry(value, expire_at)
+            self._entries.move_to_end(key)
+            if expire_at is not None:
+                heapq.heappush(self._expiry_heap, (expire_at, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            # 被覆盖或淘汰的键在堆中留下的旧记录太多时重建堆
+            if len(self._expiry_heap) > 2 * len(self._entries) + 1024:
+                self._expiry_heap = [(entry.expire_at, k) for k, entry in self._entries.items()
+                                     if entry.expire_at is not None]
+                heapq.heapify(self._expiry_heap)
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._expiry_heap.clear()
+
+    def _expire(self, now: float):
+        """把已经过期的键标记为不存在"""
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expire_at, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            # 堆中的记录可能已经过时（键被覆盖、删除或淘汰），和缓存中的过期时间一致才处理
+            if entry is not None and entry.expire_at == expire_at:
+                entry.value = None
+                entry.expire_at = None
+                self.expired += 1
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "expiry_heap": len(self._expiry_heap),
+            }
+
+
+def _timestamp(expire_time: Optional[datetime]) -> Optional[float]:
+    return expire_time.timestamp() if expire_time else None
+
+
+def _expire_time(ex: Optional[Union[int, timedelta]]) -> Optional[datetime]:
+    if not ex:
+        return None
+    return datetime.now() + (ex if isinstance(ex, timedelta) else timedelta(seconds=ex))
+
+
+class KeyvalPipeline:
+    """把多个写操作放在一个事务中执行
+
+    例子:
+        async with KeyvalDB().pipeline() as pipe:
+            pipe.set("a", "1")
+            pipe.incrby("counter", 5)
+            pipe.delete("b")
+        print(pipe.results)  # [True, 5, True]
+
+    退出 async with 时自动执行，也可以调用 execute() 提前执行并拿到结果。
+    任何一个操作失败时整个事务回滚，execute() 抛出异常。
+    """
+
+    def __init__(self, db: "KeyvalDB"):
+        self._db = db
+        self._commands: List[Tuple[str, tuple]] = []
+        self.results: Optional[List[Any]] = None
+
+    def set(self, key: str, value: Union[str, dict, list],
+            ex: Optional[Union[int, timedelta]] = None) -> "KeyvalPipeline":
+        self._commands.append(("set", (key, str(value), _expire_time(ex))))
+        return self
+
+    def mset(self, mapping: Dict[str, Union[str, dict, list]],
+             ex: Optional[Union[int, timedelta]] = None) -> "KeyvalPipeline":
+        expire_time = _expire_time(ex)
+        for key, value in mapping.items():
+            self._commands.append(("set", (key, str(value), expire_time)))
+        return self
+
+    def incrby(self, key: str, amount: int = 1) -> "KeyvalPipeline":
+        self._commands.append(("incrby", (key, int(amount))))
+        return self
+
+    def incr(self, key: str) -> "KeyvalPipeline":
+        return self.incrby(key, 1)
+
+    def decr(self, key: str) -> "KeyvalPipeline":
+        return self.incrby(key, -1)
+
+    def delete(self, key: str) -> "KeyvalPipeline":
+        self._commands.append(("delete", (key,)))
+        return self
+
+    async def execute(self) -> List[Any]:
+        """在一个事务中执行所有操作，返回每个操作的结果"""
+        commands, self._commands = self._commands, []
+        self.results = await self._db._execute_commands(commands) if commands else []
+        return self.results
+
+    async def __aenter__(self) -> "KeyvalPipeline":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None and self._commands:
+            await self.execute()
+
+
 class KeyvalDB(metaclass=Singleton):
     _instance = None
 
@@ -37,6 +264,7 @@ class KeyvalDB(metaclass=Singleton):
                 echo=False,
                 future=True
             )
+            apply_sqlite_profile(cls._instance.engine, main_config.get("SQLite", {}), "keyval")
             cls._async_session_factory = async_scoped_session(
                 sessionmaker(
                     cls._instance.engine,
@@ -45,6 +273,21 @@ class KeyvalDB(metaclass=Singleton):
                 ),
                 scopefunc=asyncio.current_task
             )
+            # 写操作使用只有一个连接的连接池，在连接池中排队，而不是在 SQLite 的写锁上反复等待重试
+            cls._instance.write_engine = create_async_engine(db_url, pool_size=1, max_overflow=0)
+            apply_sqlite_profile(cls._instance.write_engine, main_config.get("SQLite", {}))
+            cls._write_session_factory = sessionmaker(
+                cls._instance.write_engine,
+                class_=AsyncSession,
+                expire_on_commit=False
+            )
+
+            # 内存缓存和过期数据清理设置
+            xybot_config = main_config["XYBot"]
+            cls._instance.cache = KeyvalCache(xybot_config.get("keyvalDB-cache-size", 10000))
+            cls._instance.cleanup_interval = xybot_config.get("keyvalDB-cleanup-interval", 60)
+            cls._instance.cleanup_batch = max(xybot_config.get("keyvalDB-cleanup-batch", 500), 1)
+            cls._instance._cleanup_task = None
         return cls._instance
 
     async def initialize(self):
@@ -52,7 +295,8 @@ class KeyvalDB(metaclass=Singleton):
         async with self.engine.begin() as conn:
             await conn.run_sync(DeclarativeBase.metadata.create_all)
         # 启动后台清理任务
-        asyncio.create_task(self._cleanup_expired())
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.create_task(self._cleanup_expired())
 
     @validate_arguments
     async def set(
@@ -62,115 +306,211 @@ class KeyvalDB(metaclass=Singleton):
             ex: Optional[Union[int, timedelta]] = None
     ) -> bool:
         """设置键值对，支持过期时间（秒或timedelta）"""
-        async with self._async_session_factory() as session:
-            try:
-                expire_time = None
-                if ex:
-                    # 统一处理时间类型转换
-                    if isinstance(ex, int):
-                        expire_time = datetime.now() + timedelta(seconds=ex)
-                    else:
-                        expire_time = datetime.now() + ex
-
-                kv = KeyValue(
-                    key=key,
-                    value=str(value),
-                    expire_time=expire_time
-                )
-                await session.merge(kv)
-                await session.commit()
-                return True
-            except Exception as e:
-                logging.error(f"设置键值失败: {str(e)}")
-                await session.rollback()
-                return False
+        try:
+            # INSERT ... ON CONFLICT DO UPDATE，同时设置同一个新键时不会出现主键冲突
+            await self._execute_commands([("set", (key, str(value), _expire_time(ex)))])
+            return True
+        except Exception as e:
+            logging.error(f"设置键值失败: {str(e)}")
+            return False
+
+    async def _load(self, key: str) -> _CacheEntry:
+        """读取一个键，先查缓存，没有时查数据库并放入缓存。过期的键只在读取结果中视为不存在，不在这里删除"""
+        entry, generation = self.cache.get(key)
+        if entry is not None:
+            return entry
 
-    async def get(self, key: str) -> Optional[str]:
-        """获取键值，自动处理过期数据"""
         async with self._async_session_factory() as session:
             result = await session.get(KeyValue, key)
-            if not result:
-                return None
-
-            if result.expire_time and result.expire_time < datetime.now():
-                await session.delete(result)
-                await session.commit()
-                return None
+        if not result or (result.expire_time and result.expire_time < datetime.now()):
+            entry = _CacheEntry(None)
+        else:
+            entry = _CacheEntry(result.value, _timestamp(result.expire_time))
+        self.cache.put(key, entry.value, entry.expire_at, generation)
+        return entry
 
-            return result.value
+    async def get(self, key: str) -> Optional[str]:
+        """获取键值，已过期的键返回 None"""
+        return (await self._load(key)).value
 
     async def delete(self, key: str) -> bool:
         """删除键值"""
-        async with self._async_session_factory() as session:
-            result = await session.execute(delete(KeyValue).where(KeyValue.key == key))
-            await session.commit()
-            return result.rowcount > 0
+        async with self._write_session_factory() as session:
+            try:
+                result = await session.execute(delete(KeyValue).where(KeyValue.key == key))
+                await session.commit()
+            except Exception:
+                self.cache.invalidate(key)
+                raise
+        self.cache.put(key, None, None)
+        return result.rowcount > 0
 
     async def exists(self, key: str) -> bool:
         """检查键是否存在"""
-        async with self._async_session_factory() as session:
-            result = await session.get(KeyValue, key)
-            if result and result.expire_time and result.expire_time < datetime.now():
-                await session.delete(result)
-                await session.commit()
-                return False
-            return result is not None
+        return (await self._load(key)).value is not None
 
     async def ttl(self, key: str) -> int:
         """获取剩余生存时间（秒）"""
-        async with self._async_session_factory() as session:
-            result = await session.get(KeyValue, key)
-            if not result or not result.expire_time:
-                return -1
+        entry = await self._load(key)
+        if entry.value is None or entry.expire_at is None:
+            return -1
 
-            remaining = (result.expire_time - datetime.now()).total_seconds()
-            # 明确返回类型处理
-            return int(remaining) if remaining > 0 else -2
+        remaining = entry.expire_at - time.time()
+        # 明确返回类型处理
+        return int(remaining) if remaining > 0 else -2
 
     async def expire(self, key: str, ex: Union[int, timedelta]) -> bool:
         """设置过期时间"""
-        async with self._async_session_factory() as session:
-            result = await session.get(KeyValue, key)
-            if not result:
-                return False
+        async with self._write_session_factory() as session:
+            try:
+                result = await session.get(KeyValue, key)
+                if not result or (result.expire_time and result.expire_time < datetime.now()):
+                    return False
+
+                expire_time = datetime.now() + (ex if isinstance(ex, timedelta) else timedelta(seconds=ex))
+                result.expire_time = expire_time
+                await session.commit()
+            except Exception:
+                self.cache.invalidate(key)
+                raise
+        self.cache.put(key, result.value, _timestamp(expire_time))
+        return True
+
+    async def incrby(self, key: str, amount: int = 1) -> int:
+        """把键的整数值原子地加上 amount 并返回新值，键不存在或已过期时从0开始。值不是整数时抛出 ValueError"""
+        return (await self._execute_commands([("incrby", (key, int(amount)))]))[0]
+
+    async def incr(self, key: str) -> int:
+        """键的值加1并返回新值"""
+        return await self.incrby(key, 1)
+
+    async def decr(self, key: str) -> int:
+        """键的值减1并返回新值"""
+        return await self.incrby(key, -1)
 
-            expire_time = datetime.now() + (ex if isinstance(ex, timedelta) else timedelta(seconds=ex))
-            result.expire_time = expire_time
-            await session.commit()
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """批量获取键值，按 keys 的顺序返回，不存在或已过期的键为 None"""
+        entries, missing, generation = self.cache.get_many(dict.fromkeys(keys))
+        if missing:
+            now = datetime.now()
+            async with self._async_session_factory() as session:
+                for start in range(0, len(missing), MGET_CHUNK_SIZE):
+                    result = await session.execute(
+                        select(KeyValue.key, KeyValue.value, KeyValue.expire_time)
+                        .where(KeyValue.key.in_(missing[start:start + MGET_CHUNK_SIZE]))
+                    )
+                    for row in result:
+                        if not row.expire_time or row.expire_time >= now:
+                            entries[row.key] = _CacheEntry(row.value, _timestamp(row.expire_time))
+            for key in missing:
+                entry = entries.setdefault(key, _CacheEntry(None))
+                self.cache.put(key, entry.value, entry.expire_at, generation)
+        return [entries[key].value for key in keys]
+
+    async def mset(self, mapping: Dict[str, Union[str, dict, list]],
+                   ex: Optional[Union[int, timedelta]] = None) -> bool:
+        """在一个事务中设置多个键值对"""
+        try:
+            async with self.pipeline() as pipe:
+                pipe.mset(mapping, ex)
             return True
+        except Exception as e:
+            logging.error(f"批量设置键值失败: {str(e)}")
+            return False
+
+    def pipeline(self) -> KeyvalPipeline:
+        """创建一个管道，把多个写操作放在一个事务中执行"""
+        return KeyvalPipeline(self)
+
+    async def _execute_commands(self, commands: List[Tuple[str, tuple]]) -> List[Any]:
+        """在一个事务中执行 set、incrby、delete 操作，提交成功后更新缓存"""
+        results = []
+        cache_updates = []
+        async with self._write_session_factory() as session:
+            try:
+                for name, args in commands:
+                    if name == "set":
+                        key, value, expire_time = args
+                        await session.execute(_UPSERT, {"key": key, "value": value, "expire_time": expire_time})
+                        results.append(True)
+                        cache_updates.append((key, value, _timestamp(expire_time)))
+                    elif name == "incrby":
+                        key, amount = args
+                        row = (await session.execute(_INCRBY, {"key": key, "amount": amount, "initial": str(amount),
+                                                               "now": datetime.now()})).first()
+                        if row is None:
+                            raise ValueError(f"键 {key} 的值不是整数")
+                        results.append(int(row.value))
+                        cache_updates.append((key, row.value, _timestamp(row.expire_time)))
+                    elif name == "delete":
+                        key, = args
+                        result = await session.execute(delete(KeyValue).where(KeyValue.key == key))
+                        results.append(result.rowcount > 0)
+                        cache_updates.append((key, None, None))
+                    else:
+                        raise ValueError(f"未知的操作: {name}")
+                await session.commit()
+            except BaseException:
+                await session.rollback()
+                for _, args in commands:
+                    self.cache.invalidate(args[0])
+                raise
+
+        for key, value, expire_at in cache_updates:
+            self.cache.put(key, value, expire_at)
+        return results
 
     async def keys(self, pattern: str = "*") -> List[str]:
         """查找匹配模式的键"""
         async with self._async_session_factory() as session:
-            # 显式指定查询列类型
-            query = select(KeyValue.key).where(KeyValue.key.like(pattern.replace("*", "%")))
+            # 显式指定查询列类型，跳过已过期但还没被清理的键
+            query = select(KeyValue.key).where(
+                KeyValue.key.like(pattern.replace("*", "%")),
+                or_(KeyValue.expire_time.is_(None), KeyValue.expire_time >= datetime.now())
+            )
             result = await session.execute(query)
             return [str(row[0]) for row in result.all()]  # 确保返回字符串类型
 
-    async def _cleanup_expired(self, interval: int = 3600):
-        """后台定时清理过期数据"""
+    async def _cleanup_expired(self):
+        """后台定时分批删除过期数据，每批删除后让出事件循环"""
         while True:
-            async with self._async_session_factory() as session:
-                await session.execute(
-                    delete(KeyValue).where(KeyValue.expire_time < datetime.now())
-                )
+            try:
+                await self.delete_expired()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"清理过期键值失败: {str(e)}")
+            await asyncio.sleep(self.cleanup_interval)
+
+    async def delete_expired(self) -> int:
+        """分批删除数据库中已过期的键，返回删除的数量"""
+        deleted = 0
+        now = datetime.now()
+        while True:
+            expired_keys = select(KeyValue.key).where(KeyValue.expire_time < now).limit(self.cleanup_batch)
+            async with self._write_session_factory() as session:
+                result = await session.execute(delete(KeyValue).where(KeyValue.key.in_(expired_keys)))
                 await session.commit()
-            await asyncio.sleep(interval)
+            deleted += result.rowcount
+            if result.rowcount < self.cleanup_batch:
+                return deleted
+            await asyncio.sleep(0)
 
     async def close(self):
         """关闭数据库连接"""
         try:
             # 取消清理任务如果正在运行
-            for task in asyncio.all_tasks():
-                if task != asyncio.current_task() and '_cleanup_expired' in str(task):
-                    task.cancel()
-                    try:
-                        await task
-                    except asyncio.CancelledError:
-                        pass
+            task = self._cleanup_task
+            if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
 
             # 关闭连接
             await self.engine.dispose()
+            await self.write_engine.dispose()
             return True
         except asyncio.CancelledError:
             logging.warning("键值数据库关闭过程被取消，这可能是正常的关闭行为")
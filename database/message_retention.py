@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, select
+
+from .messsagDB import Message, MessageDB
+
+
+@dataclass
+class RetentionRule:
+    """一条保留规则，days 为 0 时永久保留"""
+    name: str
+    days: float
+    conditions: list = field(default_factory=list)
+
+
+def _parse_rules(items: List[str], kind: str) -> Dict[str, float]:
+    """解析 ["123456@chatroom=30", "3=1"] 格式的规则"""
+    rules = {}
+    for item in items:
+        key, sep, days = str(item).rpartition("=")
+        try:
+            if not sep or not key.strip():
+                raise ValueError
+            rules[key.strip()] = float(days)
+        except ValueError:
+            logging.warning(f"消息保留规则 {kind} 中的 {item} 格式错误，应为 名称=天数")
+    return rules
+
+
+class MessageRetention:
+    """消息数据库的保留策略
+
+    按规则定期删除过期消息。每条规则按 id（rowid）从小到大分批删除，每批一个短事务，批与批之间让出事件循环，
+    不会像一次删除几百万行那样长时间锁住数据库，WAL 文件也不会一下子变得很大。
+
+    规则优先级：会话规则 > 消息类型规则 > 默认规则。
+
+    Args:
+        db: 消息数据库
+        config: main_config.toml 中的 [MessageRetention] 设置
+    """
+
+    def __init__(self, db: MessageDB, config: dict):
+        self.db = db
+        self.enabled = config.get("enable", True)
+        self.interval = max(config.get("interval", 60), 1)
+        self.batch_size = max(config.get("batch-size", 2000), 1)
+        self.max_batches = max(config.get("max-batches", 50), 1)
+        self.incremental_vacuum = config.get("incremental-vacuum", False)
+        self.vacuum_pages = max(config.get("vacuum-pages", 1000), 1)
+
+        chat_days = _parse_rules(config.get("chat-rules", []), "chat-rules")
+        type_days = {}
+        for msg_type, days in _parse_rules(config.get("type-rules", []), "type-rules").items():
+            try:
+                type_days[int(msg_type)] = days
+            except ValueError:
+                logging.warning(f"消息保留规则 type-rules 中的消息类型 {msg_type} 不是整数")
+        chats = list(chat_days)
+        types = list(type_days)
+
+        self.rules: List[RetentionRule] = []
+        for chat, days in chat_days.items():
+            self.rules.append(RetentionRule(f"chat:{chat}", days, [Message.from_wxid == chat]))
+        for msg_type, days in type_days.items():
+            self.rules.append(RetentionRule(f"type:{msg_type}", days,
+                                            [Message.msg_type == msg_type, Message.from_wxid.not_in(chats)]))
+        self.rules.append(RetentionRule("default", config.get("default-days", 3),
+                                        [Message.from_wxid.not_in(chats), Message.msg_type.not_in(types)]))
+
+        self._progress: Dict[str, int] = {}  # 每条规则已经检查到的 id
+        self._max_id = 0  # 上次清理时最大的 id
+        self._vacuum_mode: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # 统计
+        self.passes = 0
+        self.batches = 0
+        self.rows_deleted = 0
+        self.seconds_spent = 0.0
+        self.last_pass_deleted = 0
+        self.last_pass_ms = 0.0
+        self.vacuum_pages_freed = 0
+        self.rule_deleted: Dict[str, int] = {rule.name: 0 for rule in self.rules}
+
+    def start(self):
+        if not self.enabled:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run_forever(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"清理消息失败: {str(e)}")
+
+    async def run_once(self) -> int:
+        """按所有规则清理一次，每条规则最多删除 max-batches 批，返回删除的行数"""
+        start = time.perf_counter()
+        deleted = 0
+        async with self.db._async_session_factory() as session:
+            max_id = (await session.execute(select(func.max(Message.id)))).scalar() or 0
+        if max_id < self._max_id:
+            # id 不是 AUTOINCREMENT，最大的几行被删掉后 SQLite 会重新使用这些 id，之前的进度不再有效
+            self._progress.clear()
+        self._max_id = max_id
+
+        for rule in self.rules:
+            if rule.days > 0:
+                deleted += await self._apply(rule)
+
+        if deleted and self.incremental_vacuum:
+            await self._vacuum()
+
+        elapsed = time.perf_counter() - start
+        self.passes += 1
+        self.seconds_spent += elapsed
+        self.last_pass_deleted = deleted
+        self.last_pass_ms = elapsed * 1000
+        return deleted
+
+    async def _apply(self, rule: RetentionRule) -> int:
+        cutoff = datetime.now() - timedelta(days=rule.days)
+        async with self.db._async_session_factory() as session:
+            # 消息按时间顺序写入，最后一条早于 cutoff 的消息的 id 就是这次清理的上界
+            upper = (await session.execute(
+                select(Message.id).where(Message.timestamp < cutoff).order_by(Message.timestamp.desc()).limit(1)
+            )).scalar()
+        if upper is None:
+            return 0
+
+        deleted = 0
+        lower = self._progress.get(rule.name, 0)
+        if upper < lower:
+            # id 被重新使用了，从头检查
+            lower = self._progress[rule.name] = 0
+        conditions = [Message.timestamp < cutoff, *rule.conditions]
+        for _ in range(self.max_batches):
+            async with self.db._async_session_factory() as session:
+                ids = (await session.execute(
+                    select(Message.id)
+                    .where(Message.id > lower, Message.id <= upper, *conditions)
+                    .order_by(Message.id)
+                    .limit(self.batch_size)
+                )).scalars().all()
+                if not ids:
+                    break
+                result = await session.execute(
+                    delete(Message).where(Message.id >= ids[0], Message.id <= ids[-1], *conditions)
+                )
+                await session.commit()
+
+            deleted += result.rowcount
+            lower = self._progress[rule.name] = ids[-1]
+            self.batches += 1
+            if len(ids) < self.batch_size:
+                break
+            await asyncio.sleep(0)
+
+        self.rows_deleted += deleted
+        self.rule_deleted[rule.name] += deleted
+        return deleted
+
+    async def _vacuum(self):
+        """归还删除消息后空出来的页，数据库需要是 auto_vacuum = INCREMENTAL 模式"""
+        async with self.db.engine.connect() as conn:
+            if self._vacuum_mode is None:
+                self._vacuum_mode = (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+                if self._vacuum_mode != 2:
+                    logging.warning("消息数据库不是 auto_vacuum = INCREMENTAL 模式，"
+                                    "需要先执行一次 VACUUM 才能使用 incremental-vacuum")
+            if self._vacuum_mode != 2:
+                return
+            before = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+            # incremental_vacuum 每执行一步归还一页，普通的 execute 只执行一步，executescript 才会执行到结束
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});")
+            after = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+            await conn.commit()
+            self.vacuum_pages_freed += max(before - after, 0)
+
+    def get_metrics(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "passes": self.passes,
+            "batches": self.batches,
+            "rows_deleted": self.rows_deleted,
+            "time_spent_ms": round(self.seconds_spent * 1000, 1),
+            "last_pass_deleted": self.last_pass_deleted,
+            "last_pass_ms": round(self.last_pass_ms, 1),
+            "vacuum_pages_freed": self.vacuum_pages_freed,
+            "rules": {rule.name: {"days": rule.days, "deleted": self.rule_deleted[rule.name]} for rule in self.rules},
+        }
@@ -1,16 +1,19 @@
 import asyncio
 import logging
 import tomllib
-from datetime import datetime, timedelta
-from typing import Optional, List
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Optional, List
 
 from pydantic import validate_arguments
-from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, delete
-from sqlalchemy import select
+from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, Index, insert
+from sqlalchemy import and_, or_, select, table, column
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_scoped_session
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from utils.singleton import Singleton
+from .sqlite_profile import apply_sqlite_profile
 
 # 使用新的声明式基类
 DeclarativeBase = declarative_base()
@@ -18,17 +21,75 @@ DeclarativeBase = declarative_base()
 
 class Message(DeclarativeBase):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # 查询某个会话或某个人的消息记录时，一个索引同时完成筛选和按时间排序
+        Index('ix_messages_from_wxid_timestamp', 'from_wxid', 'timestamp'),
+        Index('ix_messages_sender_wxid_timestamp', 'sender_wxid', 'timestamp'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     msg_id = Column(Integer, index=True, comment='消息唯一ID（整型）')
-    sender_wxid = Column(String(40), index=True, comment='消息发送人wxid')
-    from_wxid = Column(String(40), index=True, comment='消息来源wxid')
+    sender_wxid = Column(String(40), comment='消息发送人wxid')
+    from_wxid = Column(String(40), comment='消息来源wxid')
     msg_type = Column(Integer, comment='消息类型（整型编码）')
     content = Column(Text, comment='消息内容')
     timestamp = Column(DateTime, default=datetime.now, index=True, comment='消息时间戳')
     is_group = Column(Boolean, default=False, comment='是否群消息')
 
 
+# 消息内容的全文索引，外部内容表，只保存索引不重复保存消息内容，由触发器和 messages 表保持同步。
+# trigram 分词器按每3个字符建立索引，中文不需要分词也能搜索任意子串
+messages_fts = table("messages_fts", column("rowid", Integer), column("rank"), column("messages_fts"))
+
+_FTS_MIN_TERM = 3  # trigram 只能匹配至少3个字符的词，更短的词用 LIKE 查找
+
+_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "content, content='messages', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+]
+
+_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS messages_fts_insert",
+    "DROP TRIGGER IF EXISTS messages_fts_delete",
+    "DROP TRIGGER IF EXISTS messages_fts_update",
+    "DROP TABLE IF EXISTS messages_fts",
+]
+
+
+# 被上面的组合索引取代的旧索引
+_REPLACED_INDEXES = ["ix_messages_sender_wxid", "ix_messages_from_wxid"]
+
+
+@dataclass
+class MessagePage:
+    """一页消息记录，按时间从新到旧排序
+
+    把 before_id 传给 get_message_page 获取更早的一页，after_id 获取更新的一页，为 None 时表示这个方向没有更多消息。
+    """
+    messages: List[Message] = field(default_factory=list)
+    before_id: Optional[int] = None
+    after_id: Optional[int] = None
+
+
+def _create_indexes(connection):
+    """为已有的数据库创建新增的索引，删除被取代的旧索引"""
+    for index in Message.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    for name in _REPLACED_INDEXES:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
 class MessageDB(metaclass=Singleton):
     _instance = None
 
@@ -39,11 +100,32 @@ class MessageDB(metaclass=Singleton):
 
         if cls._instance is None:
             cls._instance = super().__new__(cls)
+
+            # 写缓冲设置
+            xybot_config = main_config["XYBot"]
+            cls._instance.batch_size = max(xybot_config.get("msgDB-batch-size", 200), 1)
+            cls._instance.flush_interval = xybot_config.get("msgDB-flush-interval", 500) / 1000
+            cls._instance.buffer_limit = max(xybot_config.get("msgDB-buffer-limit", 10000),
+                                             cls._instance.batch_size)
+            cls._instance.overflow_policy = xybot_config.get("msgDB-overflow", "block")
+            cls._instance.fts_enabled = xybot_config.get("msgDB-fts", True)
+            cls._instance._buffer = deque()
+            cls._instance._flush_lock = None
+            cls._instance._flush_event = None
+            cls._instance._flush_task = None
+            cls._instance.write_stats = {"buffered": 0, "written": 0, "flushes": 0, "dropped": 0, "failed_flushes": 0}
+
             cls._instance.engine = create_async_engine(
                 db_url,
                 echo=False,
                 future=True
             )
+            cls._instance.retention_config = main_config.get("MessageRetention", {})
+            cls._instance._retention = None
+            # 清理消息后归还空闲页需要 auto_vacuum = INCREMENTAL，只对新数据库生效，已有的数据库需要执行一次 VACUUM
+            first_pragmas = {"auto_vacuum": "INCREMENTAL"} if cls._instance.retention_config.get(
+                "incremental-vacuum", False) else None
+            apply_sqlite_profile(cls._instance.engine, main_config.get("SQLite", {}), "message", first_pragmas)
             cls._async_session_factory = async_scoped_session(
                 sessionmaker(
                     cls._instance.engine,
@@ -58,6 +140,8 @@ class MessageDB(metaclass=Singleton):
         """异步初始化数据库"""
         async with self.engine.begin() as conn:
             await conn.run_sync(DeclarativeBase.metadata.create_all)
+            await conn.run_sync(_create_indexes)
+        await self._setup_fts()
 
     @validate_arguments(config=dict(arbitrary_types_allowed=True))
     async def save_message(self,
@@ -67,25 +151,117 @@ class MessageDB(metaclass=Singleton):
                            msg_type: int,
                            content: str,
                            is_group: bool = False) -> bool:
-        """异步保存消息到数据库"""
-        async with self._async_session_factory() as session:
+        """异步保存消息到数据库
+
+        消息先放进内存缓冲区，攒够 msgDB-batch-size 条或者过了 msgDB-flush-interval 毫秒后一次性写入，
+        返回True表示消息已经进入缓冲区。
+        """
+        if len(self._buffer) >= self.buffer_limit:
+            if self.overflow_policy == "drop":
+                # 丢弃最旧的消息，保证处理消息不被数据库拖慢
+                self._buffer.popleft()
+                self.write_stats["dropped"] += 1
+                if self.write_stats["dropped"] % 1000 == 1:
+                    logging.warning(f"消息写缓冲区已满，已丢弃 {self.write_stats['dropped']} 条消息")
+            else:
+                # 等待写入数据库后再放入缓冲区
+                await self.flush()
+
+        self._buffer.append({
+            "msg_id": msg_id,
+            "sender_wxid": sender_wxid,
+            "from_wxid": from_wxid,
+            "msg_type": msg_type,
+            "content": content,
+            "is_group": is_group,
+            "timestamp": datetime.now(),
+        })
+        self.write_stats["buffered"] = len(self._buffer)
+
+        self._ensure_flusher()
+        if len(self._buffer) >= self.batch_size:
+            self._flush_event.set()
+        return True
+
+    async def _setup_fts(self):
+        """创建全文索引，关闭 msgDB-fts 时删除全文索引"""
+        if self.engine.dialect.name != "sqlite":
+            self.fts_enabled = False
+            return
+
+        async with self.engine.begin() as conn:
+            exists = (await conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")).scalar()
+            if not self.fts_enabled:
+                if exists:
+                    for statement in _FTS_DROP:
+                        await conn.exec_driver_sql(statement)
+                    logging.info("已删除消息全文索引")
+                return
+
             try:
-                message = Message(
-                    msg_id=msg_id,
-                    sender_wxid=sender_wxid,
-                    from_wxid=from_wxid,
-                    msg_type=msg_type,
-                    content=content,
-                    is_group=is_group,
-                    timestamp=datetime.now()
-                )
-                session.add(message)
-                await session.commit()
-                return True
+                for statement in _FTS_DDL:
+                    await conn.exec_driver_sql(statement)
             except Exception as e:
-                logging.error(f"保存消息失败: {str(e)}")
-                await session.rollback()
-                return False
+                # SQLite 版本太旧（trigram 需要 3.34 以上）或者没有编译 FTS5
+                logging.warning(f"创建消息全文索引失败，搜索消息将使用 LIKE 逐行查找: {str(e)}")
+                self.fts_enabled = False
+                return
+
+            if not exists:
+                # 为已有的消息建立索引
+                await conn.exec_driver_sql("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+
+    def _ensure_flusher(self):
+        """在当前事件循环中启动后台写入任务"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_lock = asyncio.Lock()
+            self._flush_event = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """把缓冲区中的消息用一条多行INSERT写入数据库，返回写入的条数"""
+        if not self._buffer:
+            return 0
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            rows, self._buffer = list(self._buffer), deque()
+            if not rows:
+                return 0
+            async with self._async_session_factory() as session:
+                try:
+                    await session.execute(insert(Message), rows)
+                    await session.commit()
+                except asyncio.CancelledError:
+                    # 关闭时被取消，放回缓冲区由 close 写入
+                    self._buffer.extendleft(reversed(rows))
+                    raise
+                except Exception as e:
+                    logging.error(f"批量保存消息失败: {str(e)}")
+                    await session.rollback()
+                    # 放回缓冲区等下次重试，超出上限的部分丢弃
+                    pending = rows + list(self._buffer)
+                    self.write_stats["dropped"] += max(0, len(pending) - self.buffer_limit)
+                    self._buffer = deque(pending[-self.buffer_limit:])
+                    self.write_stats["failed_flushes"] += 1
+                    self.write_stats["buffered"] = len(self._buffer)
+                    return 0
+
+            self.write_stats["written"] += len(rows)
+            self.write_stats["flushes"] += 1
+            self.write_stats["buffered"] = len(self._buffer)
+            return len(rows)
 
     async def get_messages(self,
                            start_time: Optional[datetime] = None,
@@ -96,40 +272,232 @@ class MessageDB(metaclass=Singleton):
                            is_group: Optional[bool] = None,
                            limit: int = 100) -> List[Message]:
         """异步查询消息记录"""
+        # 先写入缓冲区中的消息，保证能查到刚保存的消息
+        await self.flush()
         async with self._async_session_factory() as session:
             try:
-                query = select(Message).order_by(Message.timestamp.desc()).limit(limit)
+                conditions = self._filter_conditions(start_time, end_time, sender_wxid, from_wxid, msg_type, is_group)
+                return await self._fetch(session, conditions, None, True, limit)
+            except Exception as e:
+                logging.error(f"查询消息失败: {str(e)}")
+                return []
+
+    async def get_message_page(self,
+                               start_time: Optional[datetime] = None,
+                               end_time: Optional[datetime] = None,
+                               sender_wxid: Optional[str] = None,
+                               from_wxid: Optional[str] = None,
+                               msg_type: Optional[int] = None,
+                               is_group: Optional[bool] = None,
+                               before_id: Optional[int] = None,
+                               after_id: Optional[int] = None,
+                               limit: int = 100) -> MessagePage:
+        """分页查询消息记录
 
+        用上一页返回的 before_id 或 after_id 定位，不使用 OFFSET，翻到多深都只读取一页的数据。
+        不传 before_id 和 after_id 时返回最新的一页。
+
+        Args:
+            before_id: 返回比这条消息更早的消息
+            after_id: 返回比这条消息更新的消息
+            limit: 每页数量
+
+        Returns:
+            MessagePage: 这一页的消息和翻页用的 before_id、after_id
+        """
+        await self.flush()
+        async with self._async_session_factory() as session:
+            try:
+                conditions = self._filter_conditions(start_time, end_time, sender_wxid, from_wxid, msg_type, is_group)
+                older = after_id is None
+                cursor = before_id if older else after_id
+                # 多查一条判断这个方向是否还有消息
+                messages = await self._fetch(session, conditions, cursor, older, limit + 1)
+            except Exception as e:
+                logging.error(f"查询消息失败: {str(e)}")
+                return MessagePage()
+
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if not older:
+            messages.reverse()
+        if not messages:
+            return MessagePage()
+        return MessagePage(
+            messages=messages,
+            before_id=messages[-1].id if (has_more if older else True) else None,
+            after_id=messages[0].id if (cursor is not None if older else has_more) else None,
+        )
+
+    async def iter_messages(self,
+                            start_time: Optional[datetime] = None,
+                            end_time: Optional[datetime] = None,
+                            sender_wxid: Optional[str] = None,
+                            from_wxid: Optional[str] = None,
+                            msg_type: Optional[int] = None,
+                            is_group: Optional[bool] = None,
+                            newest_first: bool = False,
+                            batch_size: int = 500) -> AsyncIterator[Message]:
+        """逐条返回所有符合条件的消息，用于导出消息记录
+
+        每次只从数据库读取 batch_size 条，每批一个短事务，内存占用不随消息数量增长，也不会长时间占用数据库连接。
+        默认按时间从旧到新返回。
+        """
+        await self.flush()
+        conditions = self._filter_conditions(start_time, end_time, sender_wxid, from_wxid, msg_type, is_group)
+        cursor = None
+        while True:
+            async with self._async_session_factory() as session:
+                messages = await self._fetch(session, conditions, cursor, newest_first, batch_size)
+            for message in messages:
+                yield message
+            if len(messages) < batch_size:
+                return
+            cursor = messages[-1].id
+
+    @staticmethod
+    def _filter_conditions(start_time: Optional[datetime], end_time: Optional[datetime],
+                           sender_wxid: Optional[str], from_wxid: Optional[str],
+                           msg_type: Optional[int], is_group: Optional[bool]) -> list:
+        conditions = []
+        if start_time:
+            conditions.append(Message.timestamp >= start_time)
+        if end_time:
+            conditions.append(Message.timestamp <= end_time)
+        if sender_wxid:
+            conditions.append(Message.sender_wxid == sender_wxid)
+        if from_wxid:
+            conditions.append(Message.from_wxid == from_wxid)
+        if msg_type is not None:
+            conditions.append(Message.msg_type == msg_type)
+        if is_group is not None:
+            conditions.append(Message.is_group == is_group)
+        return conditions
+
+    @staticmethod
+    async def _fetch(session: AsyncSession, conditions: list, cursor: Optional[int], older: bool,
+                     limit: int) -> List[Message]:
+        """按 (timestamp, id) 顺序从 cursor 这条消息开始读取 limit 条，older 为 True 时向更早的方向读取"""
+        if older:
+            order = (Message.timestamp.desc(), Message.id.desc())
+        else:
+            order = (Message.timestamp.asc(), Message.id.asc())
+        query = select(Message).where(*conditions).order_by(*order).limit(limit)
+        if cursor is None:
+            return list((await session.execute(query)).scalars().all())
+
+        # cursor 的时间用子查询取得，一次查询完成。timestamp <= 可以使用索引的范围查找，时间相同的消息再按 id 区分
+        timestamp = select(Message.timestamp).where(Message.id == cursor).scalar_subquery()
+        if older:
+            keyset = and_(Message.timestamp <= timestamp, or_(Message.timestamp < timestamp, Message.id < cursor))
+        else:
+            keyset = and_(Message.timestamp >= timestamp, or_(Message.timestamp > timestamp, Message.id > cursor))
+        messages = list((await session.execute(query.where(keyset))).scalars().all())
+
+        if len(messages) < limit and (await session.execute(
+                select(Message.id).where(Message.id == cursor))).scalar() is None:
+            # cursor 这条消息已经被清理，id 也是按写入顺序递增的，改为按 id 定位
+            keyset = Message.id < cursor if older else Message.id > cursor
+            messages = list((await session.execute(query.where(keyset))).scalars().all())
+        return messages
+
+    async def search_messages(self,
+                              query: str,
+                              from_wxid: Optional[str] = None,
+                              start_time: Optional[datetime] = None,
+                              end_time: Optional[datetime] = None,
+                              sender_wxid: Optional[str] = None,
+                              msg_type: Optional[int] = None,
+                              limit: int = 20,
+                              offset: int = 0,
+                              order_by_time: bool = False) -> List[Message]:
+        """搜索包含关键词的消息
+
+        多个关键词用空格分隔，消息需要包含全部关键词，按相关度从高到低排序，相关度相同时新消息在前。
+        少于3个字符的关键词（例如两个字的中文词）无法使用全文索引，只包含这种关键词时按时间从新到旧排序。
+        按相关度排序需要计算所有匹配消息的得分，关键词很常见时用 order_by_time 更快。
+
+        Args:
+            query: 关键词
+            from_wxid: 只搜索这个会话的消息
+            start_time: 开始时间
+            end_time: 结束时间
+            sender_wxid: 只搜索这个人发送的消息
+            msg_type: 只搜索这种类型的消息
+            limit: 每页数量
+            offset: 跳过前多少条，用于翻页
+            order_by_time: 按时间从新到旧排序，而不是按相关度
+
+        Returns:
+            List[Message]: 匹配的消息
+        """
+        terms = query.split()
+        if not terms:
+            return []
+
+        fts_terms = [term for term in terms if self.fts_enabled and len(term) >= _FTS_MIN_TERM]
+        like_terms = [term for term in terms if term not in fts_terms]
+
+        await self.flush()
+        async with self._async_session_factory() as session:
+            try:
+                if fts_terms:
+                    # 每个关键词作为一个短语，避免 AND、OR、* 等被当作 FTS5 语法
+                    match = " ".join('"' + term.replace('"', '""') + '"' for term in fts_terms)
+                    stmt = (select(Message)
+                            .join(messages_fts, messages_fts.c.rowid == Message.id)
+                            .where(messages_fts.c.messages_fts.op("MATCH")(match)))
+                    if order_by_time:
+                        # 消息按时间顺序写入，id 越大越新，全文索引可以直接按 rowid 倒序读取
+                        stmt = stmt.order_by(messages_fts.c.rowid.desc())
+                    else:
+                        stmt = stmt.order_by(messages_fts.c.rank, Message.id.desc())
+                else:
+                    stmt = select(Message).order_by(Message.timestamp.desc(), Message.id.desc())
+
+                for term in like_terms:
+                    stmt = stmt.where(Message.content.like(f"%{_escape_like(term)}%", escape="\\"))
+                if from_wxid:
+                    stmt = stmt.where(Message.from_wxid == from_wxid)
+                if sender_wxid:
+                    stmt = stmt.where(Message.sender_wxid == sender_wxid)
                 if start_time:
-                    query = query.where(Message.timestamp >= start_time)
+                    stmt = stmt.where(Message.timestamp >= start_time)
                 if end_time:
-                    query = query.where(Message.timestamp <= end_time)
-                if sender_wxid:
-                    query = query.where(Message.sender_wxid == sender_wxid)
-                if from_wxid:
-                    query = query.where(Message.from_wxid == from_wxid)
+                    stmt = stmt.where(Message.timestamp <= end_time)
                 if msg_type is not None:
-                    query = query.where(Message.msg_type == msg_type)
-                if is_group is not None:
-                    query = query.where(Message.is_group == is_group)
+                    stmt = stmt.where(Message.msg_type == msg_type)
 
-                result = await session.execute(query)
+                result = await session.execute(stmt.limit(limit).offset(offset))
                 return result.scalars().all()
             except Exception as e:
-                logging.error(f"查询消息失败: {str(e)}")
+                logging.error(f"搜索消息失败: {str(e)}")
                 return []
 
+    @property
+    def retention(self):
+        """按 [MessageRetention] 的设置清理旧消息，整个进程只有这一个"""
+        if self._retention is None:
+            from .message_retention import MessageRetention
+
+            self._retention = MessageRetention(self, self.retention_config)
+        return self._retention
+
     async def close(self):
         """关闭数据库连接"""
         try:
-            # 取消清理任务如果正在运行
-            for task in asyncio.all_tasks():
-                if task != asyncio.current_task() and 'cleanup_messages' in str(task):
-                    task.cancel()
-                    try:
-                        await task
-                    except asyncio.CancelledError:
-                        pass
+            # 停止清理消息的定时任务
+            if self._retention is not None:
+                await self._retention.stop()
+
+            # 停止后台写入任务，写入缓冲区中剩下的消息
+            if self._flush_task is not None and not self._flush_task.done():
+                self._flush_task.cancel()
+                try:
+                    await self._flush_task
+                except asyncio.CancelledError:
+                    pass
+            await self.flush()
 
             # 关闭连接
             await self.engine.dispose()
@@ -141,26 +509,9 @@ class MessageDB(metaclass=Singleton):
             logging.error(f"关闭数据库连接时出错: {str(e)}")
             return False
 
-    async def cleanup_messages(self):
-        """每三天清理旧消息"""
-        while True:
-            async with self._async_session_factory() as session:
-                try:
-                    # 计算三天前的时间
-                    three_days_ago = datetime.now() - timedelta(days=3)
-                    # 删除三天前的消息
-                    await session.execute(
-                        delete(Message).where(Message.timestamp < three_days_ago)
-                    )
-                    await session.commit()
-                except Exception as e:
-                    logging.error(f"清理消息失败: {str(e)}")
-                    await session.rollback()
-            await asyncio.sleep(259200)  # 每三天（259200秒）执行一次
-
     async def __aenter__(self):
         # 启动清理消息的定时任务
-        asyncio.create_task(self.cleanup_messages())
+        self.retention.start()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from utils.singleton import Singleton
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_TEMP_STORES = {"DEFAULT", "FILE", "MEMORY"}
+
+
+def build_pragmas(config: dict) -> Dict[str, str]:
+    """根据 main_config.toml 的 [SQLite] 设置生成连接时执行的 PRAGMA，enable 为 false 时返回空字典"""
+    if not config.get("enable", True):
+        return {}
+
+    def choice(key: str, default: str, allowed: set) -> str:
+        value = str(config.get(key, default)).upper()
+        if value not in allowed:
+            logger.warning("SQLite 设置 {} = {} 无效，使用 {}", key, value, default)
+            return default
+        return value
+
+    return {
+        "journal_mode": choice("journal-mode", "WAL", _JOURNAL_MODES),
+        "synchronous": choice("synchronous", "NORMAL", _SYNCHRONOUS),
+        "mmap_size": str(int(config.get("mmap-size", 268435456))),
+        "cache_size": str(int(config.get("cache-size", -65536))),
+        "temp_store": choice("temp-store", "MEMORY", _TEMP_STORES),
+        "busy_timeout": str(int(config.get("busy-timeout", 5000))),
+    }
+
+
+def apply_sqlite_profile(engine, config: dict, name: Optional[str] = None, first: Optional[Dict[str, str]] = None):
+    """在每个新连接上执行 [SQLite] 中设置的 PRAGMA
+
+    Args:
+        engine: create_engine 或 create_async_engine 创建的引擎，不是 SQLite 时不做处理
+        config: main_config.toml 中的 [SQLite] 设置
+        name: 传入时把异步引擎加入定期检查点任务
+        first: 在其他 PRAGMA 之前执行的 PRAGMA，例如 auto_vacuum 必须在切换到 WAL 模式之前设置
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = {**(first or {}), **build_pragmas(config)}
+    sync_engine: Engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+
+    if pragmas:
+        @event.listens_for(sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {pragma} = {value}")
+            finally:
+                cursor.close()
+
+    if name is not None and isinstance(engine, AsyncEngine):
+        SQLiteMaintenance().register(name, engine, config.get("checkpoint-interval", 300))
+
+
+class SQLiteMaintenance(metaclass=Singleton):
+    """定期对 SQLite 数据库执行 WAL 检查点和 PRAGMA optimize
+
+    WAL 模式下写入先追加到 -wal 文件，检查点把它合并回数据库文件，防止 -wal 文件越来越大、读取越来越慢。
+    PASSIVE 检查点不等待正在进行的读写，不会阻塞机器人。
+    """
+
+    def __init__(self):
+        self._engines: Dict[str, AsyncEngine] = {}
+        self.interval = 300
+        self._task: Optional[asyncio.Task] = None
+
+        # 统计
+        self.runs = 0
+        self.failures = 0
+        self.last_duration_ms = 0.0
+        self.last_checkpoint: Dict[str, dict] = {}
+
+    def register(self, name: str, engine: AsyncEngine, interval: float):
+        self._engines[name] = engine
+        self.interval = interval
+
+    def start(self):
+        if self.interval <= 0 or not self._engines:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    async def run_once(self):
+        """对所有数据库执行一次检查点和 optimize"""
+        start = time.perf_counter()
+        for name, engine in list(self._engines.items()):
+            try:
+                async with engine.connect() as conn:
+                    result = await conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+                    busy, log_pages, checkpointed = result.one()
+                    await conn.exec_driver_sql("PRAGMA optimize")
+                self.last_checkpoint[name] = {"busy": busy, "wal_pages": log_pages, "checkpointed": checkpointed}
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.warning("数据库 {} 执行检查点失败: {}", name, e)
+        self.runs += 1
+        self.last_duration_ms = (time.perf_counter() - start) * 1000
+
+    def get_metrics(self) -> dict:
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_duration_ms": round(self.last_duration_ms, 1),
+            "databases": dict(self.last_checkpoint),
+        }
@@ -0,0 +1,134 @@
+import datetime
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class UserState:
+    """缓存的用户数据，数据库中没有这个用户时是各字段的默认值"""
+    points: int = 0
+    signin_stat: datetime.datetime = datetime.datetime.fromtimestamp(0)
+    signin_streak: int = 0
+    whitelist: bool = False
+
+
+class UserCache:
+    """用户数据的 LRU 缓存
+
+    读取时先查缓存，没有再查数据库并放入缓存；写操作成功后直接修改缓存中的数据，失败时删除缓存。
+    同步接口在线程池中执行，WebUI 也在另一个线程中读取，所以所有操作都加锁。
+
+    查询数据库期间如果有写操作，查询到的数据可能已经过期，这时不放入缓存（用 generation 判断）。
+
+    Args:
+        max_size (int): 最多缓存多少个用户
+        enabled (bool): 是否启用缓存
+    """
+
+    def __init__(self, max_size: int = 10000, enabled: bool = True):
+        self.max_size = max(max_size, 1)
+        self.enabled = enabled
+        self._users: OrderedDict[str, UserState] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, wxid: str) -> Tuple[Optional[UserState], int]:
+        """返回 (缓存的数据, generation)，没有缓存时数据为 None，查询数据库后把 generation 传给 put"""
+        with self._lock:
+            state = self._users.get(wxid) if self.enabled else None
+            if state is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._users.move_to_end(wxid)
+            return state, self._generation
+
+    def get_many(self, wxids: Iterable[str]) -> Tuple[Dict[str, UserState], List[str], int]:
+        """批量读取，返回 (缓存中有的数据, 缓存中没有的 wxid, generation)"""
+        found = {}
+        missing = []
+        with self._lock:
+            for wxid in wxids:
+                state = self._users.get(wxid) if self.enabled else None
+                if state is None:
+                    missing.append(wxid)
+                else:
+                    found[wxid] = state
+                    self._users.move_to_end(wxid)
+            self.hits += len(found)
+            self.misses += len(missing)
+            return found, missing, self._generation
+
+    def put(self, wxid: str, state: UserState, generation: int):
+        """放入从数据库查询到的数据"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._users[wxid] = state
+            self._users.move_to_end(wxid)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+                self.evictions += 1
+
+    def put_many(self, states: Dict[str, UserState], generation: int):
+        """批量放入从数据库查询到的数据"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            for wxid, state in states.items():
+                self._users[wxid] = state
+                self._users.move_to_end(wxid)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, wxid: str, **changes):
+        """写入数据库成功后修改缓存中的字段，没有缓存时不做处理"""
+        with self._lock:
+            self._generation += 1
+            state = self._users.get(wxid)
+            if state is not None:
+                self._users[wxid] = replace(state, **changes)
+
+    def add_points(self, wxid: str, num: int):
+        """写入数据库成功后修改缓存中的积分"""
+        with self._lock:
+            self._generation += 1
+            state = self._users.get(wxid)
+            if state is not None:
+                self._users[wxid] = replace(state, points=state.points + num)
+
+    def invalidate(self, *wxids: str):
+        with self._lock:
+            self._generation += 1
+            for wxid in wxids:
+                self._users.pop(wxid, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._users.clear()
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._users),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -30,7 +30,7 @@ class AdminPoint(PluginBase):
 
         self.db = XYBotDB()
 
-    @on_text_message
+    @on_text_message(commands=["加积分", "减积分", "设置积分"])
     async def handle_text(self, bot: WechatAPIClient, message: dict):
         if not self.enable:
             return
@@ -60,10 +60,10 @@ class AdminPoint(PluginBase):
                 return
 
             change_point = int(command[1])
-            self.db.add_points(change_wxid, change_point)
+            await self.db.add_points_async(change_wxid, change_point)
 
             nickname = await bot.get_nickname(change_wxid)
-            new_point = self.db.get_points(change_wxid)
+            new_point = await self.db.get_points_async(change_wxid)
 
             output = (
                 f"-----XYBot-----\n"
@@ -83,10 +83,10 @@ class AdminPoint(PluginBase):
                 return
 
             change_point = int(command[1])
-            self.db.add_points(change_wxid, -change_point)
+            await self.db.add_points_async(change_wxid, -change_point)
 
             nickname = await bot.get_nickname(change_wxid)
-            new_point = self.db.get_points(change_wxid)
+            new_point = await self.db.get_points_async(change_wxid)
 
             output = (
                 f"-----XYBot-----\n"
@@ -106,7 +106,7 @@ class AdminPoint(PluginBase):
                 return
 
             change_point = int(command[1])
-            self.db.set_points(change_wxid, change_point)
+            await self.db.set_points_async(change_wxid, change_point)
 
             nickname = await bot.get_nickname(change_wxid)
 
@@ -2,12 +2,13 @@ import json
 import re
 import tomllib
 import traceback
+from typing import Union
 
 import aiohttp
 import filetype
 from loguru import logger
 
-from WechatAPI import WechatAPIClient
+from WechatAPI import MediaFile, WechatAPIClient
 from database.XYBotDB import XYBotDB
 from utils.decorators import *
 from utils.plugin_base import PluginBase
@@ -22,6 +23,9 @@ class Dify(PluginBase):
     # 1.1.0 2025-02-20 插件优先级，插件阻塞
     # 1.2.0 2025-02-22 有插件阻塞了，other-plugin-cmd可删了
 
+    # 只在需要上传时下载图片、语音、视频和文件
+    lazy_media = True
+
     def __init__(self):
         super().__init__()
 
@@ -98,7 +102,7 @@ class Dify(PluginBase):
             return False
 
         if await self._check_point(bot, message):
-            upload_file_id = await self.upload_file(message["FromWxid"], message["Content"])
+            upload_file_id = await self.upload_file(message["FromWxid"], await message.media())
 
             files = [
                 {
@@ -125,7 +129,7 @@ class Dify(PluginBase):
             return False
 
         if await self._check_point(bot, message):
-            upload_file_id = await self.upload_file(message["FromWxid"], bot.base64_to_byte(message["Content"]))
+            upload_file_id = await self.upload_file(message["FromWxid"], bot.base64_to_byte(await message.media()))
 
             files = [
                 {
@@ -152,7 +156,7 @@ class Dify(PluginBase):
             return False
 
         if await self._check_point(bot, message):
-            upload_file_id = await self.upload_file(message["FromWxid"], bot.base64_to_byte(message["Video"]))
+            upload_file_id = await self.upload_file(message["FromWxid"], await message.media())
 
             files = [
                 {
@@ -179,7 +183,7 @@ class Dify(PluginBase):
             return False
 
         if await self._check_point(bot, message):
-            upload_file_id = await self.upload_file(message["FromWxid"], message["Content"])
+            upload_file_id = await self.upload_file(message["FromWxid"], await message.media())
 
             files = [
                 {
@@ -196,8 +200,8 @@ class Dify(PluginBase):
     async def dify(self, bot: WechatAPIClient, message: dict, query: str, files=None):
         if files is None:
             files = []
-        conversation_id = self.db.get_llm_thread_id(message["FromWxid"],
-                                                    namespace="dify")
+        conversation_id = await self.db.get_llm_thread_id_async(message["FromWxid"],
+                                                                namespace="dify")
         headers = {"Authorization": f"Bearer {self.api_key}",
                    "Content-Type": "application/json"}
         payload = json.dumps({
@@ -247,10 +251,10 @@ class Dify(PluginBase):
 
                     new_con_id = resp_json.get("conversation_id", "")
                     if new_con_id and new_con_id != conversation_id:
-                        self.db.save_llm_thread_id(message["FromWxid"], new_con_id, "dify")
+                        await self.db.save_llm_thread_id_async(message["FromWxid"], new_con_id, "dify")
 
                 elif resp.status == 404:
-                    self.db.save_llm_thread_id(message["FromWxid"], "", "dify")
+                    await self.db.save_llm_thread_id_async(message["FromWxid"], "", "dify")
                     return await self.dify(bot, message, query)
 
                 elif resp.status == 400:
@@ -265,11 +269,15 @@ class Dify(PluginBase):
         if ai_resp:
             await self.dify_handle_text(bot, message, ai_resp)
 
-    async def upload_file(self, user: str, file: bytes):
+    async def upload_file(self, user: str, file: Union[bytes, MediaFile]):
         headers = {"Authorization": f"Bearer {self.api_key}"}
 
-        # user multipart/form-data
-        kind = filetype.guess(file)
+        # user multipart/form-data，MediaFile 逐块上传，不读进内存
+        if isinstance(file, MediaFile):
+            kind = filetype.guess(file.head())
+            file = file.reader()
+        else:
+            kind = filetype.guess(file)
         formdata = aiohttp.FormData()
         formdata.add_field("user", user)
         formdata.add_field("file", file, filename=kind.extension, content_type=kind.mime)
@@ -365,15 +373,15 @@ class Dify(PluginBase):
 
         if wxid in self.admins and self.admin_ignore:
             return True
-        elif self.db.get_whitelist(wxid) and self.whitelist_ignore:
+        elif await self.db.get_whitelist_async(wxid) and self.whitelist_ignore:
             return True
         else:
-            if self.db.get_points(wxid) < self.price:
+            if await self.db.get_points_async(wxid) < self.price:
                 await bot.send_at_message(message["FromWxid"],
                                           f"\n-----XYBot-----\n"
                                           f"😭你的积分不够啦！需要 {self.price} 积分",
                                           [wxid])
                 return False
 
-            self.db.add_points(wxid, -self.price)
+            await self.db.add_points_async(wxid, -self.price)
             return True
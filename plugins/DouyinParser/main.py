@@ -216,7 +216,7 @@ class DouyinParser(PluginBase):
                 at=[sender]
             )
 
-    @on_text_message(priority=80)
+    @on_text_message(priority=80, commands=["测试卡片"], patterns=lambda self: [self.url_pattern])
     async def handle_douyin_links(self, bot: WechatAPIClient, message: dict):
         if not self.enable:
             return True
@@ -231,12 +231,17 @@ class DouyinParser(PluginBase):
             return
 
         try:
-            # 提取抖音链接并清理
-            match = self.url_pattern.search(content)
-            if not match:
-                return
+            # 提取抖音链接并清理，优先使用分发时已经匹配到的链接
+            matches = message.get("TriggerMatches")
+            if matches:
+                matched_url = matches[0].text
+            else:
+                match = self.url_pattern.search(content)
+                if not match:
+                    return
+                matched_url = match.group(0)
 
-            original_url = self._clean_url(match.group(0))
+            original_url = self._clean_url(matched_url)
             logger.info(f"发现抖音链接: {original_url}")
             
             # 添加解析提示
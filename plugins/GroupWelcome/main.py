@@ -34,8 +34,13 @@ class GroupWelcome(PluginBase):
         if not message["IsGroup"]:
             return
 
-        xml_content = str(message["Content"]).strip().replace("\n", "").replace("\t", "")
-        root = ET.fromstring(xml_content)
+        # 使用框架已经解析好的 XML，不再重复解析
+        xml = message.get("Xml")
+        if xml is not None:
+            root = xml.root
+        else:
+            xml_content = str(message["Content"]).strip().replace("\n", "").replace("\t", "")
+            root = ET.fromstring(xml_content)
 
         if root.tag != "sysmsg":
             return
@@ -27,7 +27,7 @@ class Leaderboard(PluginBase):
 
         self.db = XYBotDB()
 
-    @on_text_message
+    @on_text_message(commands=lambda self: self.command)
     async def handle_text(self, bot: WechatAPIClient, message: dict):
         if not self.enable:
             return
@@ -40,10 +40,11 @@ class Leaderboard(PluginBase):
 
         if "群" in command[0]:
             chatroom_members = await bot.get_chatroom_member_list(message["FromWxid"])
+            # 一次批量查询所有群成员的积分
+            points_map = await self.db.get_points_many_async(member["UserName"] for member in chatroom_members)
             data = []
             for member in chatroom_members:
-                wxid = member["UserName"]
-                points = self.db.get_points(wxid)
+                points = points_map.get(member["UserName"], 0)
                 if points == 0:
                     continue
                 data.append((member["NickName"], points))
@@ -61,7 +62,7 @@ class Leaderboard(PluginBase):
                 out_message += f"\n{emoji}{'' if emoji else str(rank) + '.'} {nickname}   {points}分  {random_emoji}"
 
         else:
-            data = self.db.get_leaderboard(self.max_count)
+            data = await self.db.get_leaderboard_async(self.max_count)
 
             wxids = [i[0] for i in data]
             nicknames = []
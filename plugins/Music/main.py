@@ -24,7 +24,7 @@ class Music(PluginBase):
         self.command = config["command"]
         self.command_format = config["command-format"]
 
-    @on_text_message
+    @on_text_message(commands=lambda self: self.command)
     async def handle_text(self, bot: WechatAPIClient, message: dict):
         if not self.enable:
             return
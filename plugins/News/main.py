@@ -29,7 +29,7 @@ class News(PluginBase):
         self.enable_schedule_news = config["enable-schedule-news"]
         self.command = config["command"]
 
-    @on_text_message
+    @on_text_message(commands=lambda self: self.command)
     async def handle_text(self, bot: WechatAPIClient, message: dict):
         if not self.enable:
             return
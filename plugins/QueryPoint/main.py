@@ -24,7 +24,7 @@ class QueryPoint(PluginBase):
 
         self.db = XYBotDB()
 
-    @on_text_message
+    @on_text_message(commands=lambda self: self.command)
     async def handle_text(self, bot: WechatAPIClient, message: dict):
         if not self.enable:
             return
@@ -37,7 +37,7 @@ class QueryPoint(PluginBase):
 
         query_wxid = message["SenderWxid"]
 
-        points = self.db.get_points(query_wxid)
+        points = await self.db.get_points_async(query_wxid)
 
         output = ("\n"
                   f"-----XYBot-----\n"
@@ -23,7 +23,7 @@ class RandomMember(PluginBase):
         self.command = config["command"]
         self.count = config["count"]
 
-    @on_text_message
+    @on_text_message(commands=lambda self: self.command)
     async def handle_text(self, bot: WechatAPIClient, message: dict):
         if not self.enable:
             return
@@ -17,7 +17,7 @@ class UpdateQR(PluginBase):
     def __init__(self):
         super().__init__()
 
-    @on_text_message
+    @on_text_message(commands=["更新群二维码"])
     async def on_text(self, bot: WechatAPIClient, message: dict):
         if message.get("Content") == "更新群二维码":
             await self.update_qr(bot)
@@ -41,7 +41,7 @@ class Warthunder(PluginBase):
 
         self.font_path = "resource/font/华文细黑.ttf"
 
-    @on_text_message
+    @on_text_message(commands=lambda self: self.command)
     async def handle_text(self, bot: WechatAPIClient, message: dict):
         if not self.enable:
             return
@@ -5,6 +5,8 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
+from WechatAPI.Client.send_scheduler import PRIORITY_LOW, send_priority
+
 scheduler = AsyncIOScheduler()
 
 
@@ -27,7 +29,9 @@ def schedule(
 
         @wraps(func)
         async def wrapper(self, *args, **kwargs):
-            return await func(self, *args, **kwargs)
+            # 定时任务发送的消息排在回复消息后面
+            with send_priority(PRIORITY_LOW):
+                return await func(self, *args, **kwargs)
 
         setattr(wrapper, '_is_scheduled', True)
         setattr(wrapper, '_schedule_trigger', trigger)
@@ -57,178 +61,105 @@ def remove_job_safe(scheduler: AsyncIOScheduler, job_id: str):
         pass
 
 
-def on_text_message(priority=50):
-    """文本消息装饰器"""
-
-    def decorator(func):
-        if callable(priority):  # 无参数调用时
-            f = priority
-            setattr(f, '_event_type', 'text_message')
-            setattr(f, '_priority', 50)
-            return f
-        # 有参数调用时
-        setattr(func, '_event_type', 'text_message')
-        setattr(func, '_priority', min(max(priority, 0), 99))
-        return func
-
-    return decorator if not callable(priority) else decorator(priority)
-
-
-def on_image_message(priority=50):
-    """图片消息装饰器"""
-
-    def decorator(func):
-        if callable(priority):
-            f = priority
-            setattr(f, '_event_type', 'image_message')
-            setattr(f, '_priority', 50)
-            return f
-        setattr(func, '_event_type', 'image_message')
-        setattr(func, '_priority', min(max(priority, 0), 99))
-        return func
-
-    return decorator if not callable(priority) else decorator(priority)
+def _mark_handler(func: Callable, event_type: str, priority: int, **options) -> Callable:
+    """给处理函数打上事件类型、优先级和路由过滤条件的标记"""
+    setattr(func, '_event_type', event_type)
+    setattr(func, '_priority', min(max(priority, 0), 99))
+    for name, value in options.items():
+        if value is not None:
+            setattr(func, f'_{name}', value)
+    return func
 
 
-def on_voice_message(priority=50):
-    """语音消息装饰器"""
+def _event_decorator(event_type: str, priority, **options):
+    if callable(priority):  # 无参数调用时
+        return _mark_handler(priority, event_type, 50)
 
+    # 有参数调用时
     def decorator(func):
-        if callable(priority):
-            f = priority
-            setattr(f, '_event_type', 'voice_message')
-            setattr(f, '_priority', 50)
-            return f
-        setattr(func, '_event_type', 'voice_message')
-        setattr(func, '_priority', min(max(priority, 0), 99))
-        return func
+        return _mark_handler(func, event_type, priority, **options)
 
-    return decorator if not callable(priority) else decorator(priority)
+    return decorator
 
 
-def on_emoji_message(priority=50):
-    """表情消息装饰器"""
+def on_text_message(priority=50, commands=None, prefixes=None, keywords=None, patterns=None, concurrent=False, timeout=None):
+    """文本消息装饰器
 
-    def decorator(func):
-        if callable(priority):
-            f = priority
-            setattr(f, '_event_type', 'emoji_message')
-            setattr(f, '_priority', 50)
-            return f
-        setattr(func, '_event_type', 'emoji_message')
-        setattr(func, '_priority', min(max(priority, 0), 99))
-        return func
+    下面几个参数用来声明处理函数只处理哪些消息，满足任意一个条件才会调用处理函数:
 
-    return decorator if not callable(priority) else decorator(priority)
+    - commands: 消息第一个词（按空白分割）等于其中之一时才调用
+    - prefixes: 消息以其中之一开头时才调用
+    - keywords: 消息任意位置包含其中之一时才调用
+    - patterns: 消息任意位置匹配其中之一（字符串或 re.Pattern）时才调用
 
+    它们都可以是列表，或者接收插件实例、返回列表的函数（在插件加载时求值，方便从配置文件读取指令）。
+    keywords/patterns 命中时，处理函数可以从 message["TriggerMatches"] 读到匹配位置（TriggerMatch 列表）。
 
-def on_file_message(priority=50):
-    """文件消息装饰器"""
-
-    def decorator(func):
-        if callable(priority):
-            f = priority
-            setattr(f, '_event_type', 'file_message')
-            setattr(f, '_priority', 50)
-            return f
-        setattr(func, '_event_type', 'file_message')
-        setattr(func, '_priority', min(max(priority, 0), 99))
-        return func
+    concurrent=True 声明处理函数从不返回 False（不阻塞后续处理函数），同一优先级上相邻的这类处理函数会并发执行，
+    其中一个抛出异常不会影响其他处理函数。
 
-    return decorator if not callable(priority) else decorator(priority)
+    timeout 是处理函数的超时时间（秒），超时后处理函数会被取消，默认使用插件的 handler_timeout 或全局设置。
+    concurrent 和 timeout 所有事件装饰器都支持。
 
+    例子:
 
-def on_quote_message(priority=50):
-    """引用消息装饰器"""
+    - @on_text_message(commands=["签到", "每日签到"])
+    - @on_text_message(commands=lambda self: self.command)
+    - @on_text_message(priority=80, prefixes=["!pip"])
+    - @on_text_message(keywords=["天气"])
+    - @on_text_message(patterns=[r"https?://v\\.douyin\\.com/\\w+/?"])
+    """
+    return _event_decorator('text_message', priority, commands=commands, prefixes=prefixes,
+                            keywords=keywords, patterns=patterns, concurrent=concurrent, timeout=timeout)
 
-    def decorator(func):
-        if callable(priority):
-            f = priority
-            setattr(f, '_event_type', 'quote_message')
-            setattr(f, '_priority', 50)
-            return f
-        setattr(func, '_event_type', 'quote_message')
-        setattr(func, '_priority', min(max(priority, 0), 99))
-        return func
 
-    return decorator if not callable(priority) else decorator(priority)
+def on_image_message(priority=50, concurrent=False, timeout=None):
+    """图片消息装饰器"""
+    return _event_decorator('image_message', priority, concurrent=concurrent, timeout=timeout)
 
 
-def on_video_message(priority=50):
-    """视频消息装饰器"""
+def on_voice_message(priority=50, concurrent=False, timeout=None):
+    """语音消息装饰器"""
+    return _event_decorator('voice_message', priority, concurrent=concurrent, timeout=timeout)
 
-    def decorator(func):
-        if callable(priority):
-            f = priority
-            setattr(f, '_event_type', 'video_message')
-            setattr(f, '_priority', 50)
-            return f
-        setattr(func, '_event_type', 'video_message')
-        setattr(func, '_priority', min(max(priority, 0), 99))
-        return func
 
-    return decorator if not callable(priority) else decorator(priority)
+def on_emoji_message(priority=50, concurrent=False, timeout=None):
+    """表情消息装饰器"""
+    return _event_decorator('emoji_message', priority, concurrent=concurrent, timeout=timeout)
 
 
-def on_pat_message(priority=50):
-    """拍一拍消息装饰器"""
+def on_file_message(priority=50, concurrent=False, timeout=None):
+    """文件消息装饰器"""
+    return _event_decorator('file_message', priority, concurrent=concurrent, timeout=timeout)
 
-    def decorator(func):
-        if callable(priority):
-            f = priority
-            setattr(f, '_event_type', 'pat_message')
-            setattr(f, '_priority', 50)
-            return f
-        setattr(func, '_event_type', 'pat_message')
-        setattr(func, '_priority', min(max(priority, 0), 99))
-        return func
 
-    return decorator if not callable(priority) else decorator(priority)
+def on_quote_message(priority=50, commands=None, prefixes=None, keywords=None, patterns=None, concurrent=False, timeout=None):
+    """引用消息装饰器，过滤条件的用法同 on_text_message"""
+    return _event_decorator('quote_message', priority, commands=commands, prefixes=prefixes,
+                            keywords=keywords, patterns=patterns, concurrent=concurrent, timeout=timeout)
 
 
-def on_at_message(priority=50):
-    """被@消息装饰器"""
+def on_video_message(priority=50, concurrent=False, timeout=None):
+    """视频消息装饰器"""
+    return _event_decorator('video_message', priority, concurrent=concurrent, timeout=timeout)
 
-    def decorator(func):
-        if callable(priority):
-            f = priority
-            setattr(f, '_event_type', 'at_message')
-            setattr(f, '_priority', 50)
-            return f
-        setattr(func, '_event_type', 'at_message')
-        setattr(func, '_priority', min(max(priority, 0), 99))
-        return func
 
-    return decorator if not callable(priority) else decorator(priority)
+def on_pat_message(priority=50, concurrent=False, timeout=None):
+    """拍一拍消息装饰器"""
+    return _event_decorator('pat_message', priority, concurrent=concurrent, timeout=timeout)
 
 
-def on_system_message(priority=50):
-    """其他消息装饰器"""
+def on_at_message(priority=50, commands=None, prefixes=None, keywords=None, patterns=None, concurrent=False, timeout=None):
+    """被@消息装饰器，过滤条件的用法同 on_text_message"""
+    return _event_decorator('at_message', priority, commands=commands, prefixes=prefixes,
+                            keywords=keywords, patterns=patterns, concurrent=concurrent, timeout=timeout)
 
-    def decorator(func):
-        if callable(priority):
-            f = priority
-            setattr(f, '_event_type', 'system_message')
-            setattr(f, '_priority', 50)
-            return f
-        setattr(func, '_event_type', 'other_message')
-        setattr(func, '_priority', min(max(priority, 0), 99))
-        return func
 
-    return decorator if not callable(priority) else decorator(priority)
+def on_system_message(priority=50, concurrent=False, timeout=None):
+    """系统消息装饰器"""
+    return _event_decorator('system_message', priority, concurrent=concurrent, timeout=timeout)
 
 
-def on_other_message(priority=50):
+def on_other_message(priority=50, concurrent=False, timeout=None):
     """其他消息装饰器"""
-
-    def decorator(func):
-        if callable(priority):
-            f = priority
-            setattr(f, '_event_type', 'other_message')
-            setattr(f, '_priority', 50)
-            return f
-        setattr(func, '_event_type', 'other_message')
-        setattr(func, '_priority', min(max(priority, 0), 99))
-        return func
-
-    return decorator if not callable(priority) else decorator(priority)
+    return _event_decorator('other_message', priority, concurrent=concurrent, timeout=timeout)
@@ -1,24 +1,235 @@
+import asyncio
 import copy
-from typing import Callable, Dict, List
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .handler_router import HandlerRouter
+from .handler_stats import HandlerStats
+from .message_view import MessageView
+
+
+@dataclass
+class HandlerEntry:
+    """已注册的事件处理函数"""
+    handler: Callable
+    instance: object
+    priority: int
+    deepcopy_message: bool = False
+    commands: Optional[frozenset] = None
+    prefixes: Optional[tuple] = None
+    keywords: Optional[tuple] = None
+    patterns: Optional[tuple] = None
+    concurrent: bool = False
+    timeout: Optional[float] = None
+    stats: Optional[HandlerStats] = None
+    lazy_media: bool = False
+
+    @property
+    def name(self) -> str:
+        return f"{type(self.instance).__name__}.{self.handler.__name__}"
+
+
+def _resolve_filter(instance: object, value) -> Optional[tuple]:
+    """把装饰器声明的过滤条件解析成元组，可调用对象在绑定时用插件实例求值"""
+    if value is None:
+        return None
+    if callable(value):
+        value = value(instance)
+    if isinstance(value, (str, re.Pattern)):
+        return (value,)
+    return tuple(value)
 
 
 class EventManager:
-    _handlers: Dict[str, List[tuple[Callable, object, int]]] = {}
+    _handlers: Dict[str, List[HandlerEntry]] = {}
+    _routers: Dict[str, HandlerRouter] = {}
+    _stats: Dict[str, HandlerStats] = {}
+
+    # 分发设置，由 configure 从 main_config.toml 的 [Dispatcher] 读取
+    _default_timeout: Optional[float] = None
+    _latency_budget: float = 0
+    _budget_action: str = "disable"
+    _disable_seconds: float = 300
+    _min_samples: int = 20
+    _stats_window: int = 100
+
+    @classmethod
+    def configure(cls, config: dict):
+        """应用 [Dispatcher] 设置"""
+        cls._default_timeout = config.get("handler-timeout", 0) or None
+        cls._latency_budget = config.get("latency-budget", 0)
+        cls._budget_action = config.get("budget-action", "disable")
+        cls._disable_seconds = config.get("disable-seconds", 300)
+        cls._min_samples = config.get("budget-min-samples", 20)
+        cls._stats_window = max(config.get("budget-window", 100), 1)
 
     @classmethod
     def bind_instance(cls, instance: object):
         """将实例绑定到对应的事件处理函数"""
+        # 插件可以通过 deepcopy_message = True 回退到旧的深拷贝语义
+        deepcopy_message = getattr(instance, 'deepcopy_message', False)
+        # 插件设置 lazy_media = True 表示它通过 await message.media() 读取媒体内容，不需要框架提前下载
+        lazy_media = getattr(instance, 'lazy_media', False)
+        plugin_timeout = getattr(instance, 'handler_timeout', None)
+        plugin_name = type(instance).__name__
+
         for method_name in dir(instance):
             method = getattr(instance, method_name)
             if hasattr(method, '_event_type'):
                 event_type = getattr(method, '_event_type')
                 priority = getattr(method, '_priority', 50)
-                
+                commands = _resolve_filter(instance, getattr(method, '_commands', None))
+                prefixes = _resolve_filter(instance, getattr(method, '_prefixes', None))
+                keywords = _resolve_filter(instance, getattr(method, '_keywords', None))
+                patterns = _resolve_filter(instance, getattr(method, '_patterns', None))
+
+                timeout = getattr(method, '_timeout', plugin_timeout)
+
+                # 统计按处理函数名保存，插件重载后继续累计
+                name = f"{plugin_name}.{method.__name__}"
+                stats = cls._stats.get(name)
+                if stats is None:
+                    stats = cls._stats[name] = HandlerStats(name, plugin_name, cls._stats_window)
+                stats.reset_policy()
+
                 if event_type not in cls._handlers:
                     cls._handlers[event_type] = []
-                cls._handlers[event_type].append((method, instance, priority))
+                cls._handlers[event_type].append(HandlerEntry(
+                    method, instance, priority, deepcopy_message,
+                    commands=frozenset(commands) if commands is not None else None,
+                    prefixes=prefixes,
+                    keywords=keywords,
+                    patterns=patterns,
+                    concurrent=getattr(method, '_concurrent', False),
+                    timeout=timeout,
+                    stats=stats,
+                    lazy_media=lazy_media,
+                ))
                 # 按优先级排序，优先级高的在前
-                cls._handlers[event_type].sort(key=lambda x: x[2], reverse=True)
+                cls._handlers[event_type].sort(key=lambda x: x.priority, reverse=True)
+                # 路由表在下次触发事件时重新编译
+                cls._routers.pop(event_type, None)
+
+    @classmethod
+    def _select_handlers(cls, event_type: str, message) -> List[Tuple[HandlerEntry, Optional[list]]]:
+        """根据路由表挑出可能处理这条消息的处理函数，以及它们命中的触发器匹配"""
+        router = cls._routers.get(event_type)
+        if router is None:
+            # 插件加载/重载后第一次触发事件时重新编译路由表和触发器自动机
+            router = cls._routers[event_type] = HandlerRouter(cls._handlers[event_type])
+        if not isinstance(message, dict):
+            return [(entry, None) for entry in cls._handlers[event_type]]
+        return router.select(message)
+
+    @staticmethod
+    def _isolate(value, deepcopy_message: bool):
+        """为单个处理函数准备参数，字典默认包装成写时复制视图而不是深拷贝"""
+        if deepcopy_message:
+            return copy.deepcopy(value)
+        if isinstance(value, dict):
+            return MessageView(value)
+        if isinstance(value, (list, set)):
+            return copy.deepcopy(value)
+        return value
+
+    @classmethod
+    async def _call(cls, entry: HandlerEntry, matches: Optional[list], api_client, message, kwargs: dict):
+        """调用单个处理函数，记录耗时，超时的处理函数会被取消"""
+        stats = entry.stats
+        if stats.is_disabled():
+            return None
+
+        # api_client 保持不变，message 和 kwargs 交给每个处理函数各自的视图
+        handler_message = cls._isolate(message, entry.deepcopy_message)
+        if matches:
+            handler_message["TriggerMatches"] = matches
+        new_kwargs = {k: cls._isolate(v, entry.deepcopy_message) for k, v in kwargs.items()}
+
+        timeout = entry.timeout if entry.timeout is not None else cls._default_timeout
+        deadline = asyncio.timeout(timeout or None)
+        start = time.perf_counter()
+        try:
+            async with deadline:
+                result = await entry.handler(api_client, handler_message, **new_kwargs)
+        except TimeoutError:
+            elapsed = (time.perf_counter() - start) * 1000
+            if not deadline.expired():
+                stats.record(elapsed, error=True)
+                cls._check_budget(entry)
+                raise
+            stats.record(elapsed, timeout=True)
+            logger.warning("处理函数 {} 执行超过 {} 秒，已取消", entry.name, timeout)
+            cls._check_budget(entry)
+            return None
+        except Exception:
+            stats.record((time.perf_counter() - start) * 1000, error=True)
+            cls._check_budget(entry)
+            raise
+
+        stats.record((time.perf_counter() - start) * 1000)
+        cls._check_budget(entry)
+        return result
+
+    @classmethod
+    def _check_budget(cls, entry: HandlerEntry):
+        """最近样本的p99超出延迟预算时，降低处理函数的优先级或暂时停用"""
+        stats = entry.stats
+        if not cls._latency_budget or len(stats.recent) < cls._min_samples:
+            return
+        p99 = stats.recent_p99()
+        if p99 <= cls._latency_budget:
+            return
+
+        if cls._budget_action == "demote":
+            if stats.demoted:
+                return
+            stats.demoted = True
+            cls._demote(entry)
+            logger.warning("处理函数 {} 最近p99延迟 {:.0f}ms 超出预算 {}ms，已降到最低优先级",
+                           entry.name, p99, cls._latency_budget)
+        else:
+            stats.disable_for(cls._disable_seconds)
+            logger.warning("处理函数 {} 最近p99延迟 {:.0f}ms 超出预算 {}ms，暂停 {} 秒",
+                           entry.name, p99, cls._latency_budget, cls._disable_seconds)
+
+    @classmethod
+    def _demote(cls, entry: HandlerEntry):
+        entry.priority = 0
+        for event_type, entries in cls._handlers.items():
+            if any(item is entry for item in entries):
+                entries.sort(key=lambda x: x.priority, reverse=True)
+                cls._routers.pop(event_type, None)
+
+    @classmethod
+    def get_stats(cls, plugin_name: str = None) -> List[dict]:
+        """获取处理函数的调用统计
+
+        Args:
+            plugin_name: 插件类名，为None时返回所有处理函数的统计
+        """
+        return [stats.to_dict() for stats in cls._stats.values()
+                if plugin_name is None or stats.plugin == plugin_name]
+
+    @classmethod
+    async def _call_concurrent(cls, batch: list, api_client, message, kwargs: dict) -> bool:
+        """并发调用同一优先级上相邻的非阻塞处理函数，返回是否继续执行"""
+        results = await asyncio.gather(
+            *(cls._call(entry, matches, api_client, message, kwargs) for entry, matches in batch),
+            return_exceptions=True,
+        )
+        proceed = True
+        for (entry, _), result in zip(batch, results):
+            if isinstance(result, BaseException):
+                logger.opt(exception=result).error("处理函数 {} 出现异常: {}", entry.name, result)
+            elif result is False:
+                # 声明了 concurrent 却返回 False，等同一批的处理函数都执行完再停止
+                logger.warning("并发处理函数 {} 返回了 False，已停止执行后续处理函数", entry.name)
+                proceed = False
+        return proceed
 
     @classmethod
     async def emit(cls, event_type: str, *args, **kwargs) -> None:
@@ -27,12 +238,23 @@ class EventManager:
             return
 
         api_client, message = args
-        for handler, instance, priority in cls._handlers[event_type]:
-            # 只对 message 进行深拷贝，api_client 保持不变
-            handler_args = (api_client, copy.deepcopy(message))
-            new_kwargs = {k: copy.deepcopy(v) for k, v in kwargs.items()}
+        selected = cls._select_handlers(event_type, message)
+        index = 0
+        while index < len(selected):
+            entry, matches = selected[index]
+            index += 1
+
+            if entry.concurrent:
+                batch = [(entry, matches)]
+                while (index < len(selected) and selected[index][0].concurrent
+                       and selected[index][0].priority == entry.priority):
+                    batch.append(selected[index])
+                    index += 1
+                if not await cls._call_concurrent(batch, api_client, message, kwargs):
+                    break
+                continue
 
-            result = await handler(*handler_args, **new_kwargs)
+            result = await cls._call(entry, matches, api_client, message, kwargs)
 
             if isinstance(result, bool):
                 # True 继续执行 False 停止执行
@@ -41,12 +263,23 @@ class EventManager:
             else:
                 continue  # 我也不知道你返回了个啥玩意，反正继续执行就是了
 
+    @classmethod
+    def has_handlers(cls, event_type: str) -> bool:
+        """是否有没被停用的处理函数处理这种事件"""
+        return any(not entry.stats.is_disabled() for entry in cls._handlers.get(event_type, ()))
+
+    @classmethod
+    def needs_media(cls, event_type: str) -> bool:
+        """是否有处理函数需要框架在触发事件前下载好媒体内容（没有设置 lazy_media 的旧插件）"""
+        return any(not entry.lazy_media and not entry.stats.is_disabled()
+                   for entry in cls._handlers.get(event_type, ()))
+
     @classmethod
     def unbind_instance(cls, instance: object):
         """解绑实例的所有事件处理函数"""
         for event_type in cls._handlers:
             cls._handlers[event_type] = [
-                (handler, inst, priority)
-                for handler, inst, priority in cls._handlers[event_type]
-                if inst is not instance
+                entry for entry in cls._handlers[event_type]
+                if entry.instance is not instance
             ]
+        cls._routers.clear()
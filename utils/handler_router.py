@@ -0,0 +1,80 @@
+from typing import Dict, List, Optional, Tuple
+
+from .trigger_matcher import TriggerMatcher
+
+
+def first_token(content: str) -> str:
+    """消息的第一个词，按任意空白（包括@后面的\\u2005）分割"""
+    parts = content.split(None, 1)
+    return parts[0] if parts else ""
+
+
+class HandlerRouter:
+    """事件处理函数路由表
+
+    插件加载时根据装饰器声明的过滤条件编译:
+
+    - commands 编进以消息第一个词为键的哈希索引
+    - prefixes 逐个检查前缀
+    - keywords/patterns 编进一个 TriggerMatcher，每条消息只扫描一次
+    - 没有声明过滤条件的处理函数进入兜底列表，每条消息都会收到
+
+    select 返回的处理函数保持原来的优先级顺序。
+
+    Args:
+        entries (list): 已按优先级排好序的处理函数
+    """
+
+    def __init__(self, entries: list):
+        self._entries = entries
+        self._fallback: List[int] = []
+        self._prefixes: List[Tuple[str, int]] = []
+        self._matcher = TriggerMatcher()
+        token_index: Dict[str, set] = {}
+
+        for index, entry in enumerate(entries):
+            if all(value is None for value in (entry.commands, entry.prefixes, entry.keywords, entry.patterns)):
+                self._fallback.append(index)
+                continue
+            for command in entry.commands or ():
+                token_index.setdefault(command, set()).add(index)
+            for prefix in entry.prefixes or ():
+                self._prefixes.append((prefix, index))
+            self._matcher.add(index, entry.keywords or (), entry.patterns or ())
+        self._matcher.compile()
+
+        # 每个指令对应的列表预先合并好兜底处理函数，命中时不用再排序
+        fallback = set(self._fallback)
+        self._routes: Dict[str, List[int]] = {
+            token: sorted(indexes | fallback) for token, indexes in token_index.items()
+        }
+        self._all = [(entry, None) for entry in entries]
+        self._fallback_entries = [(entries[i], None) for i in self._fallback]
+
+    @property
+    def is_filtered(self) -> bool:
+        """是否有处理函数声明了过滤条件"""
+        return len(self._fallback) != len(self._entries)
+
+    def select(self, message) -> List[Tuple[object, Optional[list]]]:
+        """返回可能处理这条消息的处理函数，以及它们命中的触发器匹配"""
+        if not self.is_filtered:
+            return self._all
+
+        content = message.get("Content")
+        if not isinstance(content, str):
+            return self._fallback_entries
+
+        stripped = content.strip()
+        indexes = self._routes.get(first_token(stripped))
+
+        matched = {index for prefix, index in self._prefixes if stripped.startswith(prefix)}
+        triggers = self._matcher.scan(content) if not self._matcher.empty else {}
+        matched.update(triggers)
+
+        if matched:
+            indexes = sorted(matched.union(indexes or self._fallback))
+        elif indexes is None:
+            return self._fallback_entries
+
+        return [(self._entries[i], triggers.get(i)) for i in indexes]
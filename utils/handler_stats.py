@@ -0,0 +1,110 @@
+import bisect
+import time
+from collections import deque
+from typing import Deque, List
+
+# 延迟直方图的桶上界（毫秒），最后一个桶收集超出上界的所有样本
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+
+class LatencyHistogram:
+    """固定分桶的延迟直方图，记录一次只需要一次二分查找，内存占用和样本数无关"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed_ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total += elapsed_ms
+        if elapsed_ms > self.max:
+            self.max = elapsed_ms
+
+    def percentile(self, q: float) -> float:
+        """估算分位数（毫秒），取样本所在桶的上界，不超过最大值"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return min(LATENCY_BUCKETS_MS[index], self.max)
+                break
+        return self.max
+
+
+class HandlerStats:
+    """单个事件处理函数的调用统计
+
+    Args:
+        name (str): 处理函数名，格式为 插件类名.方法名
+        plugin (str): 插件类名
+        window (int): 延迟预算策略使用的最近样本数量
+    """
+
+    def __init__(self, name: str, plugin: str, window: int = 100):
+        self.name = name
+        self.plugin = plugin
+        self.histogram = LatencyHistogram()
+        self.recent: Deque[float] = deque(maxlen=window)
+        self.errors = 0
+        self.timeouts = 0
+        self.disabled_until = 0.0
+        self.demoted = False
+
+    @property
+    def calls(self) -> int:
+        return self.histogram.count
+
+    def record(self, elapsed_ms: float, error: bool = False, timeout: bool = False):
+        self.histogram.record(elapsed_ms)
+        self.recent.append(elapsed_ms)
+        if error:
+            self.errors += 1
+        if timeout:
+            self.timeouts += 1
+
+    def recent_p99(self) -> float:
+        """最近样本的p99（毫秒），样本数量少，直接排序计算"""
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+    def is_disabled(self) -> bool:
+        return self.disabled_until > 0 and time.monotonic() < self.disabled_until
+
+    def disable_for(self, seconds: float):
+        self.disabled_until = time.monotonic() + seconds
+        self.recent.clear()
+
+    def reset_policy(self):
+        """插件重新加载时解除停用和降级"""
+        self.disabled_until = 0.0
+        self.demoted = False
+        self.recent.clear()
+
+    def to_dict(self) -> dict:
+        histogram = self.histogram
+        return {
+            "name": self.name,
+            "plugin": self.plugin,
+            "calls": histogram.count,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "avg_ms": round(histogram.total / histogram.count, 2) if histogram.count else 0.0,
+            "p50_ms": round(histogram.percentile(0.50), 2),
+            "p95_ms": round(histogram.percentile(0.95), 2),
+            "p99_ms": round(histogram.percentile(0.99), 2),
+            "max_ms": round(histogram.max, 2),
+            "disabled": self.is_disabled(),
+            "disabled_remaining": max(0, round(self.disabled_until - time.monotonic())) if self.is_disabled() else 0,
+            "demoted": self.demoted,
+        }
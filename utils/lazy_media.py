@@ -0,0 +1,114 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class MediaStats:
+    """按媒体类型统计下载了多少、省掉了多少
+
+    - messages: 收到的消息数
+    - downloads: 实际下载的消息数
+    - skipped_filtered: 被黑白名单过滤，没有下载
+    - skipped_unhandled: 没有插件处理这种消息，没有下载
+    - avoided: 没有下载的消息数，除了上面两种，还包括插件都没有读取媒体内容的消息
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[str, float]] = {}
+
+    def _counter(self, kind: str) -> Dict[str, float]:
+        counter = self._counters.get(kind)
+        if counter is None:
+            counter = self._counters[kind] = {"messages": 0, "downloads": 0, "failures": 0, "skipped_filtered": 0,
+                                              "skipped_unhandled": 0, "download_ms": 0.0, "bytes": 0}
+        return counter
+
+    def record_message(self, kind: str):
+        self._counter(kind)["messages"] += 1
+
+    def record_skip(self, kind: str, reason: str):
+        self._counter(kind)[f"skipped_{reason}"] += 1
+
+    def record_download(self, kind: str, elapsed_ms: float, size: int, failed: bool = False):
+        counter = self._counter(kind)
+        counter["download_ms"] += elapsed_ms
+        if failed:
+            counter["failures"] += 1
+        else:
+            counter["downloads"] += 1
+            counter["bytes"] += size
+
+    def get_metrics(self) -> dict:
+        metrics = {}
+        for kind, counter in self._counters.items():
+            metrics[kind] = {
+                **counter,
+                "download_ms": round(counter["download_ms"], 1),
+                "avoided": counter["messages"] - counter["downloads"],
+            }
+        return metrics
+
+
+class LazyMedia:
+    """消息中的图片、语音、视频或文件，第一次 await 时才下载，之后返回同一个结果
+
+    同一条消息的所有处理函数共享一个 LazyMedia，多个处理函数同时 await 也只下载一次。
+    某个处理函数超时被取消不会中断下载，下载失败时下次 await 会重新下载。
+
+    Args:
+        kind: 媒体类型，用于统计，"image"、"voice"、"video" 或 "file"
+        fetch: 下载媒体内容的协程函数
+        stats: 下载统计
+    """
+
+    __slots__ = ("kind", "_fetch", "_stats", "_task", "_counted")
+
+    def __init__(self, kind: str, fetch: Callable[[], Awaitable[Any]], stats: Optional[MediaStats] = None):
+        self.kind = kind
+        self._fetch = fetch
+        self._stats = stats
+        self._task: Optional[asyncio.Task] = None
+        self._counted = False
+
+    @property
+    def loaded(self) -> bool:
+        """是否已经下载成功"""
+        return (self._task is not None and self._task.done() and not self._task.cancelled()
+                and self._task.exception() is None)
+
+    async def get(self) -> Any:
+        """下载并返回媒体内容，已经下载过时直接返回"""
+        task = self._task
+        if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+            task = self._task = asyncio.ensure_future(self._download())
+        return await asyncio.shield(task)
+
+    def __await__(self):
+        return self.get().__await__()
+
+    async def _download(self) -> Any:
+        start = time.perf_counter()
+        try:
+            value = await self._fetch()
+        except Exception:
+            if self._stats is not None:
+                self._stats.record_download(self.kind, (time.perf_counter() - start) * 1000, 0, failed=True)
+            raise
+
+        if self._stats is not None and not self._counted:
+            self._counted = True
+            try:
+                size = len(value)  # base64 字符串、bytes 或 MediaFile
+            except TypeError:
+                size = 0
+            self._stats.record_download(self.kind, (time.perf_counter() - start) * 1000, size)
+        return value
+
+    def __repr__(self):
+        return f"LazyMedia({self.kind}, loaded={self.loaded})"
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
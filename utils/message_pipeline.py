@@ -0,0 +1,133 @@
+import asyncio
+import time
+import traceback
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from loguru import logger
+
+
+class MessagePipeline:
+    """入站消息处理管线
+
+    每个会话（FromWxid）一个先进先出队列，同一个会话的消息按接收顺序逐条处理，不同会话由固定数量的 worker 并行处理。
+    积压的消息数超过高水位时 submit 会等待，直到降到低水位以下，从而让收消息循环慢下来，而不是无限创建任务。
+
+    Args:
+        handler: 处理单条消息的协程函数
+        key_func: 从消息中取出会话标识的函数
+        workers (int): worker 数量
+        high_water (int): 积压消息数的高水位
+        low_water (int): 积压消息数的低水位，默认为高水位的一半
+    """
+
+    def __init__(self, handler: Callable[[dict], Awaitable[Any]], key_func: Callable[[dict], str],
+                 workers: int = 8, high_water: int = 1000, low_water: Optional[int] = None):
+        self.handler = handler
+        self.key_func = key_func
+        self.workers = max(workers, 1)
+        self.high_water = max(high_water, 1)
+        self.low_water = min(low_water if low_water is not None else self.high_water // 2, self.high_water - 1)
+
+        self._queues: Dict[str, Deque[dict]] = {}
+        self._scheduled: Set[str] = set()  # 在就绪队列中或正在被处理的会话
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._idle = asyncio.Event()  # 没有积压的消息
+        self._idle.set()
+        self._tasks: List[asyncio.Task] = []
+
+        # 统计
+        self.pending = 0
+        self.peak_pending = 0
+        self.processed = 0
+        self.errors = 0
+        self.backpressure_count = 0
+        self.backpressure_seconds = 0.0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        """停止接收处理，先等待积压的消息处理完，超过 timeout 秒后取消还在运行的 worker"""
+        if self._tasks and self.pending:
+            logger.info("等待处理剩余的 {} 条消息", self.pending)
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("{} 秒内没有处理完，丢弃剩余的 {} 条消息", timeout, self.pending)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, message: dict):
+        """把消息放入所属会话的队列，积压超过高水位时等待"""
+        if self.pending >= self.high_water:
+            self.backpressure_count += 1
+            logger.warning("消息积压 {} 条，超过高水位 {}，暂停接收新消息", self.pending, self.high_water)
+            start = time.monotonic()
+            self._drained.clear()
+            await self._drained.wait()
+            self.backpressure_seconds += time.monotonic() - start
+
+        key = self.key_func(message)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+        queue.append(message)
+
+        self.pending += 1
+        self._idle.clear()
+        if self.pending > self.peak_pending:
+            self.peak_pending = self.pending
+
+        if key not in self._scheduled:
+            self._scheduled.add(key)
+            self._ready.put_nowait(key)
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            message = queue.popleft()
+            try:
+                await self.handler(message)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                logger.error("处理消息时发生错误: {}", traceback.format_exc())
+            finally:
+                self.pending -= 1
+                if self.pending <= self.low_water:
+                    self._drained.set()
+                if not self.pending:
+                    self._idle.set()
+
+                # 每次只处理一条，有剩余消息时排到就绪队列末尾，避免一个会话占住 worker
+                if queue:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._queues[key]
+                    self._scheduled.discard(key)
+
+    def get_metrics(self) -> dict:
+        """队列深度等运行统计"""
+        # WebUI 在另一个线程中读取，先复制一份
+        depths = [len(queue) for queue in list(self._queues.values())]
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "peak_pending": self.peak_pending,
+            "conversations": len(depths),
+            "max_conversation_depth": max(depths, default=0),
+            "processed": self.processed,
+            "errors": self.errors,
+            "backpressure_count": self.backpressure_count,
+            "backpressure_seconds": round(self.backpressure_seconds, 3),
+        }
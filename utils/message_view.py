@@ -0,0 +1,103 @@
+import copy
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator
+
+from .message_xml import XmlPayload
+
+# 不可变类型可以直接共享，不需要复制
+_IMMUTABLE_TYPES = (str, bytes, int, float, bool, type(None), frozenset)
+
+_MISSING = object()
+
+
+class MessageView(MutableMapping):
+    """消息的写时复制视图
+
+    所有处理函数共享同一份原始消息，读取时直接返回原始数据；
+    写入和删除只记录在当前视图自己的覆盖层中，不会影响原始消息和其他处理函数。
+    嵌套的字典会被包装成子视图，列表等可变对象在第一次读取时才复制一份，
+    所以一个处理函数修改消息只需要为它自己的改动付出代价。
+
+    Args:
+        base (dict): 原始消息，视图不会修改它
+    """
+
+    __slots__ = ("_base", "_overlay", "_deleted")
+
+    def __init__(self, base: Dict[str, Any]):
+        self._base = base
+        self._overlay: Dict[str, Any] = {}
+        self._deleted = set()
+
+    def __getitem__(self, key):
+        value = self._overlay.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if key in self._deleted:
+            raise KeyError(key)
+
+        value = self._base[key]
+        if isinstance(value, _IMMUTABLE_TYPES):
+            return value
+
+        # 可变对象在第一次读取时放进覆盖层，之后的原地修改只影响当前视图
+        if isinstance(value, dict):
+            value = MessageView(value)
+        else:
+            value = copy.deepcopy(value)
+        self._overlay[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._overlay[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._overlay.pop(key, None)
+        if key in self._base:
+            self._deleted.add(key)
+
+    def __contains__(self, key):
+        if key in self._overlay:
+            return True
+        return key not in self._deleted and key in self._base
+
+    def __iter__(self) -> Iterator:
+        for key in self._base:
+            if key not in self._deleted:
+                yield key
+        for key in self._overlay:
+            if key not in self._base:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def __deepcopy__(self, memo):
+        return self.to_dict()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为普通字典，嵌套视图和解析好的XML也会一起转换"""
+        result = {}
+        for key in self:
+            value = self[key]
+            if isinstance(value, (MessageView, XmlPayload)):
+                value = value.to_dict()
+            result[key] = value
+        return result
+
+    async def media(self) -> Any:
+        """下载并返回消息中的图片、语音、视频或文件，只在第一次调用时下载，没有媒体时抛出 KeyError
+
+        deepcopy_message = True 的插件收到的是普通字典，等价的写法是 await message["Media"]
+        """
+        return await self["Media"]
+
+    def copy(self) -> Dict[str, Any]:
+        """与dict.copy行为一致，返回普通字典"""
+        return self.to_dict()
@@ -0,0 +1,267 @@
+import xml.etree.ElementTree as ET
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, Optional
+
+_UNPARSED = object()
+
+
+class XmlField:
+    """声明一个从 XML 中读取的字段，第一次读取时才从解析好的 XML 树中取值，之后直接返回缓存的值
+
+    Args:
+        path: 元素路径，例如 "appmsg/title"；"img@aeskey" 读取元素的属性，"@type" 读取根元素的属性
+        type: 把文本转换为字段类型的函数，也可以是 XmlPayload 的子类，用于文本本身又是一段 XML 的情况
+        default: 元素或属性不存在、没有文本、或者转换失败时的值
+    """
+
+    def __init__(self, path: str, type: Callable = str, default: Any = None):
+        path, _, attr = path.partition("@")
+        self.path = path.strip("/") or "."
+        # 逐级 find 单个标签比 find("a/b/c") 的路径解析快
+        self.tags = tuple(self.path.split("/")) if self.path != "." else ()
+        self.attr = attr or None
+        self.type = type
+        self.default = default
+        self.name = None
+        # 原始文本中没有这个标签或属性时，不用解析就知道字段不存在
+        self.probe = f"{self.attr}=" if self.attr else "<" + self.path.rsplit("/", 1)[-1]
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, payload: Optional["XmlPayload"], owner=None):
+        if payload is None:
+            return self
+        values = payload._values
+        if self.name not in values:
+            values[self.name] = self.extract(payload)
+        return values[self.name]
+
+    def extract(self, payload: "XmlPayload") -> Any:
+        if not payload._may_contain(self.probe):
+            return self.default
+        node = payload._find(self.tags)
+        if node is None:
+            return self.default
+        raw = node.get(self.attr) if self.attr else node.text
+        if raw is None:
+            return self.default
+        try:
+            return self.type(raw)
+        except (TypeError, ValueError):
+            return self.default
+
+
+class XmlSection(XmlField):
+    """声明 XML 中的一个子元素，用另一个 XmlPayload 子类读取它的字段，不会重新解析
+
+    子元素不存在时返回一个所有字段都是默认值的空对象。
+    """
+
+    def __init__(self, path: str, type: Callable):
+        super().__init__(path, type)
+
+    def extract(self, payload: "XmlPayload") -> Any:
+        node = payload._find(self.tags) if payload._may_contain(self.probe) else None
+        return self.type(element=node)
+
+
+class XmlPayload(Mapping):
+    """一段 XML 消息内容，最多解析一次，字段在第一次读取时才提取
+
+    子类用 XmlField 声明字段，可以像属性一样读取，也可以像只读字典一样按字段名读取。
+    同一条消息会被多个处理函数共享，复制时返回自己，不要修改 root 中的元素。
+    XML 格式错误时，读取 root 或者需要解析才能得到的字段会抛出 xml.etree.ElementTree.ParseError，
+    原始文本中根本没有的字段不解析，直接返回默认值。
+
+    Args:
+        raw: XML 文本
+        element: 已经解析好的元素，用于 XmlSection
+    """
+
+    _fields: Dict[str, XmlField] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = {}
+        for klass in reversed(cls.__mro__):
+            for name, value in vars(klass).items():
+                if isinstance(value, XmlField):
+                    fields[name] = value
+        cls._fields = fields
+
+    def __init__(self, raw: Optional[str] = None, element: Optional[ET.Element] = None):
+        self.raw = raw
+        self._root = element if raw is None else _UNPARSED
+        self._error: Optional[ET.ParseError] = None
+        self._values: Dict[str, Any] = {}
+
+    @property
+    def root(self) -> Optional[ET.Element]:
+        """解析后的根元素，XmlSection 的子元素不存在时为 None"""
+        if self._root is _UNPARSED:
+            try:
+                self._root = ET.fromstring(self.raw)
+            except ET.ParseError as e:
+                self._root = None
+                self._error = e
+        if self._error is not None:
+            raise self._error
+        return self._root
+
+    def _may_contain(self, probe: str) -> bool:
+        if self._root is _UNPARSED:
+            return probe in self.raw
+        return True
+
+    def _find(self, tags: tuple) -> Optional[ET.Element]:
+        node = self.root
+        for tag in tags:
+            if node is None:
+                break
+            node = node.find(tag)
+        return node
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """提取所有字段，转换为普通字典"""
+        return {key: value.to_dict() if isinstance(value, XmlPayload) else value for key, value in self.items()}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class MsgSourceXml(XmlPayload):
+    """文本消息的 MsgSource"""
+    atuserlist = XmlField("atuserlist", default="")
+
+
+class ImageXml(XmlPayload):
+    """图片消息"""
+    aeskey = XmlField("img@aeskey")
+    cdnmidimgurl = XmlField("img@cdnmidimgurl")
+    md5 = XmlField("img@md5")
+    length = XmlField("img@length", int, 0)
+
+
+class VoiceXml(XmlPayload):
+    """语音消息"""
+    voiceurl = XmlField("voicemsg@voiceurl")
+    length = XmlField("voicemsg@length", int, 0)
+
+
+class VideoXml(XmlPayload):
+    """视频消息"""
+    aeskey = XmlField("videomsg@aeskey")
+    cdnvideourl = XmlField("videomsg@cdnvideourl")
+    md5 = XmlField("videomsg@md5")
+    length = XmlField("videomsg@length", int, 0)
+
+
+class AppAttachXml(XmlPayload):
+    """appmsg 中的 appattach"""
+    totallen = XmlField("totallen", int, 0)
+    attachid = XmlField("attachid", default="")
+    emoticonmd5 = XmlField("emoticonmd5", default="")
+    fileext = XmlField("fileext", default="")
+    cdnthumbaeskey = XmlField("cdnthumbaeskey", default="")
+    aeskey = XmlField("aeskey", default="")
+
+
+class QuotedAppMsgXml(XmlPayload):
+    """被引用的 xml 消息，字段名与原来 Quote 字典中的键一致"""
+    Content = XmlField("appmsg/title", default="")
+    destination = XmlField("appmsg/des", default="")
+    action = XmlField("appmsg/action", default="")
+    XmlType = XmlField("appmsg/type", int, 0)
+    showtype = XmlField("appmsg/showtype", int, 0)
+    soundtype = XmlField("appmsg/soundtype", int, 0)
+    url = XmlField("appmsg/url", default="")
+    lowurl = XmlField("appmsg/lowurl", default="")
+    dataurl = XmlField("appmsg/dataurl", default="")
+    lowdataurl = XmlField("appmsg/lowdataurl", default="")
+    songlyric = XmlField("appmsg/songlyric", default="")
+    appattach = XmlSection("appmsg/appattach", AppAttachXml)
+    extinfo = XmlField("appmsg/extinfo", default="")
+    sourceusername = XmlField("appmsg/sourceusername", default="")
+    sourcedisplayname = XmlField("appmsg/sourcedisplayname", default="")
+    thumburl = XmlField("appmsg/thumburl", default="")
+    md5 = XmlField("appmsg/md5", default="")
+    statextstr = XmlField("appmsg/statextstr", default="")
+    directshare = XmlField("appmsg/directshare", int, 0)
+
+
+class QuoteXml(XmlPayload):
+    """引用消息中的 refermsg，也就是 message["Quote"]
+
+    被引用的是 xml 消息（MsgType 为 49）时，content 是另一段 XML，Content、url、appattach 等键从这段 XML 中读取。
+    """
+    MsgType = XmlField("type", int, 0)
+    NewMsgId = XmlField("svrid")
+    ToWxid = XmlField("fromusr")
+    FromWxid = XmlField("chatusr")
+    Nickname = XmlField("displayname")
+    MsgSource = XmlField("msgsource")
+    Createtime = XmlField("createtime")
+    RawContent = XmlField("content")
+    Quoted = XmlField("content", QuotedAppMsgXml)
+
+    _hidden = ("RawContent", "Quoted")
+
+    @property
+    def Content(self) -> Optional[str]:
+        return self["Content"]
+
+    def __getitem__(self, key: str) -> Any:
+        if self.MsgType == 49 and key in QuotedAppMsgXml._fields:
+            return (self.Quoted or QuotedAppMsgXml(element=None))[key]
+        if key == "Content":
+            return self.RawContent
+        if key in self._hidden:
+            raise KeyError(key)
+        return super().__getitem__(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from (key for key in self._fields if key not in self._hidden)
+        if self.MsgType == 49:
+            yield from QuotedAppMsgXml._fields
+        else:
+            yield "Content"
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class AppMsgXml(XmlPayload):
+    """xml 消息（MsgType 49），包括引用消息和文件消息"""
+    type = XmlField("appmsg/type", int, 0)
+    title = XmlField("appmsg/title")
+    des = XmlField("appmsg/des")
+    url = XmlField("appmsg/url")
+    md5 = XmlField("appmsg/md5")
+    appattach = XmlSection("appmsg/appattach", AppAttachXml)
+    refermsg = XmlSection("appmsg/refermsg", QuoteXml)
+
+
+class SysMsgXml(XmlPayload):
+    """系统消息（MsgType 10002）"""
+    type = XmlField("@type")
+    patter = XmlField("pat/fromusername")
+    patted = XmlField("pat/pattedusername")
+    pat_suffix = XmlField("pat/patsuffix")
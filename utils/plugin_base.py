@@ -1,4 +1,5 @@
 from abc import ABC
+from typing import Optional
 
 from loguru import logger
 
@@ -13,6 +14,17 @@ class PluginBase(ABC):
     author: str = "未知"
     version: str = "1.0.0"
 
+    # 为True时事件处理函数收到消息的深拷贝，否则收到写时复制的消息视图
+    deepcopy_message: bool = False
+
+    # 为True时插件通过 await message.media() 按需下载图片、语音、视频和文件，
+    # 否则框架在触发事件前下载好，放在 Content、Video、File 中。
+    # 同时设置了 deepcopy_message = True 时收到的是普通字典，没有 media()，要用 await message["Media"]
+    lazy_media: bool = False
+
+    # 事件处理函数的超时时间（秒），为None时使用 main_config.toml 中 [Dispatcher] 的设置
+    handler_timeout: Optional[float] = None
+
     def __init__(self):
         self.enabled = False
         self._scheduled_jobs = set()
@@ -27,6 +27,8 @@ class PluginManager(metaclass=Singleton):
 
         self.excluded_plugins = main_config["XYBot"]["disabled-plugins"]
 
+        EventManager.configure(main_config.get("Dispatcher", {}))
+
     def set_bot(self, bot: WechatAPIClient):
         self.bot = bot
 
@@ -275,3 +277,14 @@ class PluginManager(metaclass=Singleton):
         if plugin_name:
             return self.plugin_info.get(plugin_name)
         return list(self.plugin_info.values())
+
+    def get_handler_stats(self, plugin_name: str = None) -> List[dict]:
+        """获取事件处理函数的耗时统计
+
+        Args:
+            plugin_name: 插件名称，如果为None则返回所有处理函数的统计
+
+        Returns:
+            处理函数统计列表，包含调用次数、错误次数、超时次数、p50/p95/p99延迟（毫秒）以及是否被停用或降级
+        """
+        return EventManager.get_stats(plugin_name)
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import tomllib
+from typing import Dict, Optional
+
+from loguru import logger
+
+from database.keyvalDB import KeyvalDB
+from utils.singleton import Singleton
+
+
+class StatsCounter(metaclass=Singleton):
+    """统计计数器
+
+    计数只在内存中累加，后台任务定期把增量写入 KeyvalDB，机器人关闭时再写入一次。
+    机器人线程和 WebUI 线程共用同一个实例，增量的读写都在 _lock 中进行。
+    计数器 name 保存在键值数据库的 "bot:stats:<name>" 中，例如:
+
+    - message_count: 接收消息总数
+    - message_count:type:<MsgType>: 每种消息类型的数量
+    - message_count:chat:<FromWxid>: 每个会话的消息数量
+    """
+
+    KEY_PREFIX = "bot:stats:"
+
+    def __init__(self):
+        with open("main_config.toml", "rb") as f:
+            main_config = tomllib.load(f)
+        self.flush_interval = main_config.get("XYBot", {}).get("stats-flush-interval", 10)
+
+        self._db = KeyvalDB()
+        self._saved: Dict[str, int] = {}  # 已经写入数据库的值
+        self._delta: Dict[str, int] = {}  # 还没写入数据库的增量
+        self._lock = threading.Lock()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def incr(self, name: str, amount: int = 1):
+        """计数器加上 amount，不访问数据库"""
+        with self._lock:
+            self._delta[name] = self._delta.get(name, 0) + amount
+        self._ensure_flusher()
+
+    async def get(self, name: str) -> int:
+        """获取计数器的值，只有第一次读取时访问数据库"""
+        if name not in self._saved:
+            await self._load(name)
+        with self._lock:
+            return self._saved.get(name, 0) + self._delta.get(name, 0)
+
+    def get_loaded(self, prefix: str = "") -> Dict[str, int]:
+        """获取已经在内存中的计数器，不访问数据库"""
+        with self._lock:
+            names = set(self._saved) | set(self._delta)
+            return {name: self._saved.get(name, 0) + self._delta.get(name, 0)
+                    for name in names if name.startswith(prefix)}
+
+    async def _load(self, name: str):
+        value = await self._db.get(self.KEY_PREFIX + name)
+        try:
+            value = int(value) if value is not None else 0
+        except ValueError:
+            logger.warning("统计计数 {} 的值 {} 不是整数，从0开始计数", name, value)
+            value = 0
+        with self._lock:
+            self._saved.setdefault(name, value)
+
+    def _ensure_flusher(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # 不在事件循环中，等下次 flush
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_lock = asyncio.Lock()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self):
+        """停止后台写入任务，写入剩下的增量，机器人关闭时调用"""
+        task, self._flush_task = self._flush_task, None
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+    async def flush(self) -> int:
+        """把增量写入数据库，返回写入的计数器数量"""
+        if not self._delta:
+            return 0
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            with self._lock:
+                delta, self._delta = self._delta, {}
+            if not delta:
+                return 0
+            try:
+                # 所有计数器的增量在一个事务中用 incrby 原子地加到数据库中
+                async with self._db.pipeline() as pipe:
+                    for name, amount in delta.items():
+                        pipe.incrby(self.KEY_PREFIX + name, amount)
+                    values = await pipe.execute()
+            except asyncio.CancelledError:
+                # 关闭时被取消，增量放回去，由最后一次 flush 写入
+                self._merge_back(delta)
+                raise
+            except Exception as e:
+                # 写入失败的增量放回去，下次再写
+                logger.error("写入统计计数失败: {}", e)
+                self._merge_back(delta)
+                return 0
+
+            with self._lock:
+                for name, value in zip(delta, values):
+                    self._saved[name] = value
+            return len(delta)
+
+    def _merge_back(self, delta: Dict[str, int]):
+        with self._lock:
+            for name, amount in delta.items():
+                self._delta[name] = self._delta.get(name, 0) + amount
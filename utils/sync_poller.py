@@ -0,0 +1,68 @@
+import asyncio
+import time
+from typing import List, Optional
+
+from .handler_stats import LatencyHistogram
+
+
+class SyncPoller:
+    """自适应的收消息轮询间隔
+
+    - 上一次同步拿到了消息时立即再次同步
+    - 没有消息时从 min_interval 开始按 backoff 倍数增加等待时间，最多等待 max_interval
+    - 一有新消息就恢复立即同步
+
+    Args:
+        min_interval (float): 空闲时的最短等待时间（秒）
+        max_interval (float): 空闲时的最长等待时间（秒）
+        backoff (float): 每次空轮询后等待时间的增长倍数
+    """
+
+    def __init__(self, min_interval: float = 0.1, max_interval: float = 2.0, backoff: float = 2.0):
+        self.min_interval = max(min_interval, 0.0)
+        self.max_interval = max(max_interval, self.min_interval)
+        self.backoff = max(backoff, 1.0)
+        self.interval = 0.0
+
+        # 统计
+        self.polls = 0
+        self.empty_polls = 0
+        self.messages = 0
+        self.message_age = LatencyHistogram()  # 消息从发出到被同步到的时间（毫秒）
+
+    def record(self, messages: Optional[List[dict]]):
+        """记录一次同步的结果并计算下一次的等待时间"""
+        self.polls += 1
+        if not messages:
+            self.empty_polls += 1
+            if self.interval == 0:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+            return
+
+        self.interval = 0.0
+        self.messages += len(messages)
+        now = time.time()
+        for message in messages:
+            create_time = message.get("CreateTime")
+            if isinstance(create_time, (int, float)) and create_time > 0:
+                self.message_age.record(max(now - create_time, 0) * 1000)
+
+    async def wait(self):
+        """等待到下一次同步"""
+        # 立即同步时也让出一次控制权，让 worker 有机会运行
+        await asyncio.sleep(self.interval)
+
+    def get_metrics(self) -> dict:
+        age = self.message_age
+        return {
+            "polls": self.polls,
+            "empty_polls": self.empty_polls,
+            "empty_ratio": round(self.empty_polls / self.polls, 4) if self.polls else 0.0,
+            "messages": self.messages,
+            "interval": round(self.interval, 3),
+            "message_age_p50_ms": round(age.percentile(0.50), 1),
+            "message_age_p95_ms": round(age.percentile(0.95), 1),
+            "message_age_max_ms": round(age.max, 1),
+        }
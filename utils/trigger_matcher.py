@@ -0,0 +1,194 @@
+import re
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+# 可以用内联作用域标记 (?imsx:...) 表示的正则标记
+_SCOPED_FLAGS = {re.IGNORECASE: "i", re.MULTILINE: "m", re.DOTALL: "s", re.VERBOSE: "x"}
+
+# 带反向引用的正则合并后组号会变，只能单独扫描
+_BACKREF = re.compile(r"\\[1-9]|\(\?P=")
+
+
+class TriggerMatch(NamedTuple):
+    """触发器在消息中的一次匹配
+
+    Attributes:
+        trigger (str): 命中的关键词或正则表达式
+        start (int): 匹配起始位置
+        end (int): 匹配结束位置（不含）
+        text (str): 匹配到的文本
+    """
+    trigger: str
+    start: int
+    end: int
+    text: str
+
+
+class AhoCorasick:
+    """Aho-Corasick 多模式字符串匹配自动机，一次扫描找出所有（可重叠的）关键词
+
+    Args:
+        words (Iterable[str]): 关键词
+    """
+
+    def __init__(self, words: Iterable[str]):
+        self.words: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for word in words:
+            if word:
+                self._insert(word)
+        self._build()
+
+    def _insert(self, word: str):
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(len(self.words))
+        self.words.append(word)
+
+    def _build(self):
+        # 广度优先计算失败指针，并把失败链上的输出合并到当前状态
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterable[Tuple[int, int, int]]:
+        """逐个返回 (关键词序号, 起始位置, 结束位置)"""
+        goto, fail, output, words = self._goto, self._fail, self._output, self.words
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                end = position + 1
+                yield index, end - len(words[index]), end
+
+
+class TriggerMatcher:
+    """把所有处理函数的关键词和正则触发器编译成一个匹配器
+
+    - 关键词编译成一个 Aho-Corasick 自动机
+    - 正则合并成一个由零宽断言组成的组合正则，由正则引擎一次扫描找到所有命中位置
+    - 带反向引用、或者有无法内联的标记的正则单独扫描
+
+    每条消息只扫描一次，返回每个处理函数（用添加时的编号表示）命中的匹配。
+    """
+
+    def __init__(self):
+        self._keyword_owners: Dict[str, List[int]] = {}
+        self._patterns: Dict[Tuple[str, int], re.Pattern] = {}
+        self._pattern_owners: Dict[Tuple[str, int], List[int]] = {}
+        self._automaton = None
+        self._combined = None
+        self._combined_keys: List[Tuple[str, int]] = []
+        self._separate_keys: List[Tuple[str, int]] = []
+
+    def add(self, owner: int, keywords: Iterable[str] = (), patterns: Iterable[Union[str, re.Pattern]] = ()):
+        """登记一个处理函数的触发器"""
+        for keyword in keywords:
+            self._keyword_owners.setdefault(keyword, []).append(owner)
+        for pattern in patterns:
+            compiled = pattern if isinstance(pattern, re.Pattern) else re.compile(pattern)
+            key = (compiled.pattern, compiled.flags)
+            self._patterns[key] = compiled
+            self._pattern_owners.setdefault(key, []).append(owner)
+
+    def compile(self):
+        """编译自动机和组合正则，插件加载/重载后调用"""
+        self._automaton = AhoCorasick(self._keyword_owners) if self._keyword_owners else None
+
+        self._combined_keys, self._separate_keys, parts = [], [], []
+        for key, compiled in self._patterns.items():
+            scoped = self._scoped(compiled)
+            if scoped is None:
+                self._separate_keys.append(key)
+                continue
+            parts.append(f"(?=(?P<_t{len(self._combined_keys)}>{scoped}))")
+            self._combined_keys.append(key)
+
+        self._combined = None
+        if parts:
+            try:
+                self._combined = re.compile("|".join(parts))
+            except re.error:
+                # 比如不同正则用了同名的命名组，退回到逐个扫描
+                self._separate_keys.extend(self._combined_keys)
+                self._combined_keys = []
+        return self
+
+    @staticmethod
+    def _scoped(compiled: re.Pattern):
+        """把正则的标记改写成内联作用域标记，无法合并时返回None"""
+        if isinstance(compiled.pattern, bytes) or _BACKREF.search(compiled.pattern):
+            return None
+        flags = compiled.flags & ~re.UNICODE
+        letters = ""
+        for flag, letter in _SCOPED_FLAGS.items():
+            if flags & flag:
+                letters += letter
+                flags &= ~flag
+        if flags:
+            return None
+        return f"(?{letters}:{compiled.pattern})" if letters else f"(?:{compiled.pattern})"
+
+    @property
+    def empty(self) -> bool:
+        return not self._keyword_owners and not self._patterns
+
+    def scan(self, text: str) -> Dict[int, List[TriggerMatch]]:
+        """扫描一次消息，返回 {处理函数编号: [匹配, ...]}"""
+        hits: Dict[int, List[TriggerMatch]] = {}
+
+        if self._automaton is not None:
+            words = self._automaton.words
+            for index, start, end in self._automaton.iter_matches(text):
+                match = TriggerMatch(words[index], start, end, words[index])
+                for owner in self._keyword_owners[words[index]]:
+                    hits.setdefault(owner, []).append(match)
+
+        if self._combined is not None:
+            # 同一个正则的匹配不重叠，和 finditer 的行为保持一致
+            last_end = [0] * len(self._combined_keys)
+            for found in self._combined.finditer(text):
+                position = found.start()
+                first = int(found.lastgroup[2:])
+                for index in range(first, len(self._combined_keys)):
+                    if position < last_end[index]:
+                        continue
+                    key = self._combined_keys[index]
+                    if index == first:
+                        start, end = found.span(found.lastgroup)
+                    else:
+                        match = self._patterns[key].match(text, position)
+                        if match is None:
+                            continue
+                        start, end = match.span()
+                    last_end[index] = max(end, start + 1)
+                    self._record(hits, key, start, end, text)
+
+        for key in self._separate_keys:
+            for match in self._patterns[key].finditer(text):
+                self._record(hits, key, match.start(), match.end(), text)
+
+        return hits
+
+    def _record(self, hits: dict, key: Tuple[str, int], start: int, end: int, text: str):
+        match = TriggerMatch(key[0], start, end, text[start:end])
+        for owner in self._pattern_owners[key]:
+            hits.setdefault(owner, []).append(match)
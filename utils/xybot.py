@@ -1,14 +1,18 @@
+import asyncio
 import tomllib
-import xml.etree.ElementTree as ET
 from typing import Dict, Any
 
 from loguru import logger
 
 from WechatAPI import WechatAPIClient
+from WechatAPI.Client.media_stream import MediaFile
 from WechatAPI.Client.protect import protector
 from database.keyvalDB import KeyvalDB
 from database.messsagDB import MessageDB
 from utils.event_manager import EventManager
+from utils.lazy_media import LazyMedia, MediaStats
+from utils.message_xml import AppMsgXml, ImageXml, MsgSourceXml, SysMsgXml, VideoXml, VoiceXml
+from utils.stats_counter import StatsCounter
 
 
 class XYBot:
@@ -30,7 +34,8 @@ class XYBot:
 
         self.msg_db = MessageDB()
         self.key_db = KeyvalDB()
-
+        self.stats = StatsCounter()
+        self.media_stats = MediaStats()
 
     def update_profile(self, wxid: str, nickname: str, alias: str, phone: str):
         """更新机器人信息"""
@@ -39,12 +44,16 @@ class XYBot:
         self.alias = alias
         self.phone = phone
 
+    def conversation_of(self, message: Dict[str, Any]) -> str:
+        """原始消息所属的会话，自己发出的消息归到接收方的会话"""
+        from_wxid = message.get("FromUserName", {}).get("string", "")
+        if from_wxid == self.wxid:
+            return message.get("ToWxid", {}).get("string", "")
+        return from_wxid
+
     async def process_message(self, message: Dict[str, Any]):
         """处理接收到的消息"""
 
-        # 数据库消息数+1先
-        await self.key_db.set("messages", str(int(await self.key_db.get("messages") or 0) + 1))
-
         msg_type = message.get("MsgType")
 
         # 预处理消息
@@ -57,6 +66,10 @@ class XYBot:
             # 由于是自己发送的消息，所以对于自己来说，From和To是反的
             message["FromWxid"], message["ToWxid"] = message["ToWxid"], message["FromWxid"]
 
+        # 消息计数只在内存中累加，定期写入数据库
+        self.stats.incr("message_count")
+        self.stats.incr(f"message_count:type:{msg_type}")
+        self.stats.incr(f"message_count:chat:{message['FromWxid']}")
 
         # 根据消息类型触发不同的事件
         if msg_type == 1:  # 文本消息
@@ -113,8 +126,8 @@ class XYBot:
             message["IsGroup"] = False
 
         try:
-            root = ET.fromstring(message["MsgSource"])
-            ats = root.find("atuserlist").text if root.find("atuserlist") is not None else ""
+            # 没有 @ 任何人时 MsgSource 中没有 atuserlist，不需要解析
+            ats = MsgSourceXml(message["MsgSource"]).atuserlist
         except Exception as e:
             logger.error("解析文本消息失败: {}", e)
             return
@@ -199,23 +212,20 @@ class XYBot:
         )
 
         # 解析图片消息
-        aeskey, cdnmidimgurl = None, None
+        message["Xml"] = xml = ImageXml(message["Content"])
         try:
-            root = ET.fromstring(message["Content"])
-            img_element = root.find('img')
-            if img_element is not None:
-                aeskey = img_element.get('aeskey')
-                cdnmidimgurl = img_element.get('cdnmidimgurl')
+            aeskey, cdnmidimgurl, md5 = xml.aeskey, xml.cdnmidimgurl, xml.md5
         except Exception as e:
             logger.error("解析图片消息失败: {}", e)
             return
 
-        # 下载图片
+        # 图片在插件第一次读取时才下载
         if aeskey and cdnmidimgurl:
-            message["Content"] = await self.bot.download_image(aeskey, cdnmidimgurl)
+            message["Media"] = self._lazy_media("image", lambda: self.bot.download_image(aeskey, cdnmidimgurl, md5))
 
-        if self.ignore_check(message["FromWxid"], message["SenderWxid"]):
+        if self._wants_media(message, "image_message"):
             if self.ignore_protection or not protector.check(14400):
+                await self._prefetch_media(message, "image_message", "Content")
                 await EventManager.emit("image_message", self.bot, message)
             else:
                 logger.warning("风控保护: 新设备登录后4小时内请挂机")
@@ -257,27 +267,29 @@ class XYBot:
 
         if message["IsGroup"] or not message.get("ImgBuf", {}).get("buffer", ""):
             # 解析语音消息
-            voiceurl, length = None, None
+            message["Xml"] = xml = VoiceXml(message["Content"])
             try:
-                root = ET.fromstring(message["Content"])
-                voicemsg_element = root.find('voicemsg')
-                if voicemsg_element is not None:
-                    voiceurl = voicemsg_element.get('voiceurl')
-                    length = int(voicemsg_element.get('length'))
+                voiceurl, length = xml.voiceurl, xml.length
             except Exception as e:
                 logger.error("解析语音消息失败: {}", e)
                 return
 
-            # 下载语音
+            # 语音在插件第一次读取时才下载并转换为 wav
             if voiceurl and length:
-                silk_base64 = await self.bot.download_voice(message["MsgId"], voiceurl, length)
-                message["Content"] = await self.bot.silk_base64_to_wav_byte(silk_base64)
+                msg_id = message["MsgId"]
+
+                async def fetch_voice():
+                    silk_base64 = await self.bot.download_voice(msg_id, voiceurl, length)
+                    return await self.bot.silk_base64_to_wav_byte(silk_base64)
+
+                message["Media"] = self._lazy_media("voice", fetch_voice)
         else:
             silk_base64 = message["ImgBuf"]["buffer"]
-            message["Content"] = await self.bot.silk_base64_to_wav_byte(silk_base64)
+            message["Media"] = self._lazy_media("voice", lambda: self.bot.silk_base64_to_wav_byte(silk_base64))
 
-        if self.ignore_check(message["FromWxid"], message["SenderWxid"]):
+        if self._wants_media(message, "voice_message"):
             if self.ignore_protection or not protector.check(14400):
+                await self._prefetch_media(message, "voice_message", "Content")
                 await EventManager.emit("voice_message", self.bot, message)
             else:
                 logger.warning("风控保护: 新设备登录后4小时内请挂机")
@@ -310,9 +322,10 @@ class XYBot:
             is_group=message["IsGroup"]
         )
 
+        # 解析一次，引用消息和文件消息直接使用
+        message["Xml"] = xml = AppMsgXml(message["Content"])
         try:
-            root = ET.fromstring(message["Content"])
-            type = int(root.find("appmsg").find("type").text)
+            type = xml.type
         except Exception as e:
             logger.error(f"解析xml消息失败: {e}")
             return
@@ -329,90 +342,15 @@ class XYBot:
 
     async def process_quote_message(self, message: Dict[str, Any]):
         """处理引用消息"""
-        quote_messsage = {}
+        xml: AppMsgXml = message["Xml"]
         try:
-            root = ET.fromstring(message["Content"])
-            appmsg = root.find("appmsg")
-            text = appmsg.find("title").text
-            refermsg = appmsg.find("refermsg")
-
-            quote_messsage["MsgType"] = int(refermsg.find("type").text)
-
-            if quote_messsage["MsgType"] == 1:  # 文本消息
-                quote_messsage["NewMsgId"] = refermsg.find("svrid").text
-                quote_messsage["ToWxid"] = refermsg.find("fromusr").text
-                quote_messsage["FromWxid"] = refermsg.find("chatusr").text
-                quote_messsage["Nickname"] = refermsg.find("displayname").text
-                quote_messsage["MsgSource"] = refermsg.find("msgsource").text
-                quote_messsage["Content"] = refermsg.find("content").text
-                quote_messsage["Createtime"] = refermsg.find("createtime").text
-
-            elif quote_messsage["MsgType"] == 49:  # 引用消息
-                quote_messsage["NewMsgId"] = refermsg.find("svrid").text
-                quote_messsage["ToWxid"] = refermsg.find("fromusr").text
-                quote_messsage["FromWxid"] = refermsg.find("chatusr").text
-                quote_messsage["Nickname"] = refermsg.find("displayname").text
-                quote_messsage["MsgSource"] = refermsg.find("msgsource").text
-                quote_messsage["Createtime"] = refermsg.find("createtime").text
-
-                quote_messsage["Content"] = refermsg.find("content").text
-
-                quote_root = ET.fromstring(quote_messsage["Content"])
-                quote_appmsg = quote_root.find("appmsg")
-
-                quote_messsage["Content"] = quote_appmsg.find("title").text if isinstance(quote_appmsg.find("title"),
-                                                                                          ET.Element) else ""
-                quote_messsage["destination"] = quote_appmsg.find("des").text if isinstance(quote_appmsg.find("des"),
-                                                                                            ET.Element) else ""
-                quote_messsage["action"] = quote_appmsg.find("action").text if isinstance(quote_appmsg.find("action"),
-                                                                                          ET.Element) else ""
-                quote_messsage["XmlType"] = int(quote_appmsg.find("type").text) if isinstance(quote_appmsg.find("type"),
-                                                                                              ET.Element) else 0
-                quote_messsage["showtype"] = int(quote_appmsg.find("showtype").text) if isinstance(
-                    quote_appmsg.find("showtype"), ET.Element) else 0
-                quote_messsage["soundtype"] = int(quote_appmsg.find("soundtype").text) if isinstance(
-                    quote_appmsg.find("soundtype"), ET.Element) else 0
-                quote_messsage["url"] = quote_appmsg.find("url").text if isinstance(quote_appmsg.find("url"),
-                                                                                    ET.Element) else ""
-                quote_messsage["lowurl"] = quote_appmsg.find("lowurl").text if isinstance(quote_appmsg.find("lowurl"),
-                                                                                          ET.Element) else ""
-                quote_messsage["dataurl"] = quote_appmsg.find("dataurl").text if isinstance(
-                    quote_appmsg.find("dataurl"), ET.Element) else ""
-                quote_messsage["lowdataurl"] = quote_appmsg.find("lowdataurl").text if isinstance(
-                    quote_appmsg.find("lowdataurl"), ET.Element) else ""
-                quote_messsage["songlyric"] = quote_appmsg.find("songlyric").text if isinstance(
-                    quote_appmsg.find("songlyric"), ET.Element) else ""
-                quote_messsage["appattach"] = {}
-                quote_messsage["appattach"]["totallen"] = int(
-                    quote_appmsg.find("appattach").find("totallen").text) if isinstance(
-                    quote_appmsg.find("appattach").find("totallen"), ET.Element) else 0
-                quote_messsage["appattach"]["attachid"] = quote_appmsg.find("appattach").find(
-                    "attachid").text if isinstance(quote_appmsg.find("appattach").find("attachid"), ET.Element) else ""
-                quote_messsage["appattach"]["emoticonmd5"] = quote_appmsg.find("appattach").find(
-                    "emoticonmd5").text if isinstance(quote_appmsg.find("appattach").find("emoticonmd5"),
-                                                      ET.Element) else ""
-                quote_messsage["appattach"]["fileext"] = quote_appmsg.find("appattach").find(
-                    "fileext").text if isinstance(quote_appmsg.find("appattach").find("fileext"), ET.Element) else ""
-                quote_messsage["appattach"]["cdnthumbaeskey"] = quote_appmsg.find("appattach").find(
-                    "cdnthumbaeskey").text if isinstance(quote_appmsg.find("appattach").find("cdnthumbaeskey"),
-                                                         ET.Element) else ""
-                quote_messsage["appattach"]["aeskey"] = quote_appmsg.find("appattach").find(
-                    "aeskey").text if isinstance(quote_appmsg.find("appattach").find("aeskey"), ET.Element) else ""
-                quote_messsage["extinfo"] = quote_appmsg.find("extinfo").text if isinstance(
-                    quote_appmsg.find("extinfo"), ET.Element) else ""
-                quote_messsage["sourceusername"] = quote_appmsg.find("sourceusername").text if isinstance(
-                    quote_appmsg.find("sourceusername"), ET.Element) else ""
-                quote_messsage["sourcedisplayname"] = quote_appmsg.find("sourcedisplayname").text if isinstance(
-                    quote_appmsg.find("sourcedisplayname"), ET.Element) else ""
-                quote_messsage["thumburl"] = quote_appmsg.find("thumburl").text if isinstance(
-                    quote_appmsg.find("thumburl"), ET.Element) else ""
-                quote_messsage["md5"] = quote_appmsg.find("md5").text if isinstance(quote_appmsg.find("md5"),
-                                                                                    ET.Element) else ""
-                quote_messsage["statextstr"] = quote_appmsg.find("statextstr").text if isinstance(
-                    quote_appmsg.find("statextstr"), ET.Element) else ""
-                quote_messsage["directshare"] = int(quote_appmsg.find("directshare").text) if isinstance(
-                    quote_appmsg.find("directshare"), ET.Element) else 0
-
+            text = xml.title
+            refermsg = xml.refermsg
+            if refermsg.root is None:
+                raise ValueError("没有 refermsg")
+            # 插件拿到的是普通字典，和以前一样可以修改、序列化
+            quote_messsage = refermsg.to_dict()
+            quote_type = quote_messsage["MsgType"]
         except Exception as e:
             logger.error(f"解析引用消息失败: {e}")
             return
@@ -420,12 +358,12 @@ class XYBot:
         message["Content"] = text
         message["Quote"] = quote_messsage
 
-        logger.info("收到引用消息: 消息ID:{} 来自:{} 发送人:{}  内容:{} 引用:{}",
+        logger.info("收到引用消息: 消息ID:{} 来自:{} 发送人:{}  内容:{} 引用类型:{}",
                     message.get("Msgid", ""),
                     message["FromWxid"],
                     message["SenderWxid"],
                     message["Content"],
-                    message["Quote"])
+                    quote_type)
 
         if self.ignore_check(message["FromWxid"], message["SenderWxid"]):
             if self.ignore_protection or not protector.check(14400):
@@ -467,21 +405,32 @@ class XYBot:
             is_group=message["IsGroup"]
         )
 
-        message["Video"] = await self.bot.download_video(message["MsgId"])
+        # md5 用于在媒体缓存中认出转发的同一个视频，length 用于分段下载，解析失败也照常下载
+        message["Xml"] = xml = VideoXml(message["Content"])
+        try:
+            md5, length = xml.md5, xml.length
+        except Exception:
+            md5, length = "", 0
 
-        if self.ignore_check(message["FromWxid"], message["SenderWxid"]):
+        msg_id = message["MsgId"]
+        message["Media"] = self._lazy_media("video", lambda: self.bot.download_video_file(msg_id, md5, length))
+
+        if self._wants_media(message, "video_message"):
             if self.ignore_protection or not protector.check(14400):
+                await self._prefetch_media(message, "video_message", "Video")
                 await EventManager.emit("video_message", self.bot, message)
             else:
                 logger.warning("风控保护: 新设备登录后4小时内请挂机")
 
     async def process_file_message(self, message: Dict[str, Any]):
         """处理文件消息"""
+        xml: AppMsgXml = message["Xml"]
         try:
-            root = ET.fromstring(message["Content"])
-            filename = root.find("appmsg").find("title").text
-            attach_id = root.find("appmsg").find("appattach").find("attachid").text
-            file_extend = root.find("appmsg").find("appattach").find("fileext").text
+            filename = xml.title
+            attach_id = xml.appattach.attachid
+            file_extend = xml.appattach.fileext
+            md5 = xml.md5
+            total_len = xml.appattach.totallen
         except Exception as error:
             logger.error(f"解析文件消息失败: {error}")
             return
@@ -504,10 +453,11 @@ class XYBot:
             is_group=message["IsGroup"]
         )
 
-        message["File"] = await self.bot.download_attach(attach_id)
+        message["Media"] = self._lazy_media("file", lambda: self.bot.download_attach_file(attach_id, md5, total_len))
 
-        if self.ignore_check(message["FromWxid"], message["SenderWxid"]):
+        if self._wants_media(message, "file_message"):
             if self.ignore_protection or not protector.check(14400):
+                await self._prefetch_media(message, "file_message", "File")
                 await EventManager.emit("file_message", self.bot, message)
             else:
                 logger.warning("风控保护: 新设备登录后4小时内请挂机")
@@ -532,9 +482,10 @@ class XYBot:
                 message["FromWxid"] = message["ToWxid"]
             message["IsGroup"] = False
 
+        # 解析一次，拍一拍和插件（例如 GroupWelcome）直接使用
+        message["Xml"] = xml = SysMsgXml(message["Content"])
         try:
-            root = ET.fromstring(message["Content"])
-            msg_type = root.attrib["type"]
+            msg_type = xml.type
         except Exception as e:
             logger.error(f"解析系统消息失败: {e}")
             return
@@ -553,12 +504,9 @@ class XYBot:
 
     async def process_pat_message(self, message: Dict[str, Any]):
         """处理拍一拍请求消息"""
+        xml: SysMsgXml = message["Xml"]
         try:
-            root = ET.fromstring(message["Content"])
-            pat = root.find("pat")
-            patter = pat.find("fromusername").text
-            patted = pat.find("pattedusername").text
-            pat_suffix = pat.find("patsuffix").text
+            patter, patted, pat_suffix = xml.patter, xml.patted, xml.pat_suffix
         except Exception as e:
             logger.error(f"解析拍一拍消息失败: {e}")
             return
@@ -590,6 +538,36 @@ class XYBot:
             else:
                 logger.warning("风控保护: 新设备登录后4小时内请挂机")
 
+    def _lazy_media(self, kind: str, fetch) -> LazyMedia:
+        self.media_stats.record_message(kind)
+        return LazyMedia(kind, fetch, self.media_stats)
+
+    def _wants_media(self, message: Dict[str, Any], event_type: str) -> bool:
+        """是否触发媒体消息事件，被过滤或者没有插件处理时记录省掉的下载"""
+        if not self.ignore_check(message["FromWxid"], message["SenderWxid"]):
+            reason = "filtered"
+        elif not EventManager.has_handlers(event_type):
+            reason = "unhandled"
+        else:
+            return True
+
+        media = message.get("Media")
+        if media is not None:
+            self.media_stats.record_skip(media.kind, reason)
+        return False
+
+    async def _prefetch_media(self, message: Dict[str, Any], event_type: str, key: str):
+        """有没设置 lazy_media 的插件处理这种消息时，照旧下载好放在 message[key] 中
+
+        视频和文件下载为 MediaFile，旧插件需要的是 base64 字符串
+        """
+        media = message.get("Media")
+        if media is not None and EventManager.needs_media(event_type):
+            value = await media
+            if isinstance(value, MediaFile):
+                value = await asyncio.to_thread(value.to_base64)
+            message[key] = value
+
     def ignore_check(self, FromWxid: str, SenderWxid: str):
         if self.ignore_mode == "Whitelist":
             return (FromWxid in self.whitelist) or (SenderWxid in self.whitelist)